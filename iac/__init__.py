@@ -1,44 +1,21 @@
-import logging.config
+"""
+Importing iac has no side effects: logging is configured by iac.logs.setup_logging and CONFIG is built on
+first access, so a bare import doesn't pay for botocore.
+"""
 
-from botocore.config import Config
 
-log_config = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'formatters': {
-        'simple': {
-            'format': '%(asctime)s %(levelname)s %(threadName)s %(filename)s:%(lineno)d - %(message)s'
-        },
-    },
-    'handlers': {
-        'console': {
-            'level': 'INFO',
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
-        },
-        'file': {
-            'level': 'INFO',
-            'class': 'logging.handlers.RotatingFileHandler',
-            'formatter': 'simple',
-            'filename': '/Users/mtlion/workspace/aws/iac/iac.log',
-            'encoding': 'utf-8',
-        },
-    },
-    'loggers': {
-        '': {
-            'handlers': ['file', 'console'],
-            'level': 'DEBUG',
-        },
-    },
-}
+def __getattr__(name):
+    if name == 'CONFIG':
+        from botocore.config import Config
 
-logging.config.dictConfig(log_config)
-
-CONFIG = Config(
-    region_name='ap-east-1',
-    signature_version='v4',
-    retries={
-        'max_attempts': 10,
-        'mode': 'standard'
-    }
-)
+        global CONFIG
+        CONFIG = Config(
+            region_name='ap-east-1',
+            signature_version='v4',
+            retries={
+                'max_attempts': 10,
+                'mode': 'standard'
+            }
+        )
+        return CONFIG
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
@@ -0,0 +1,418 @@
+"""
+asyncio backend: many stacks on one event loop, instead of one thread per running or waiting task.
+
+run_all drives the execution graph taskflow compiles for each flow, with the same requires, rebind and provides, and
+runs every atom as a coroutine once its predecessors are done. Atoms with an async implementation, see implements,
+await their AWS calls and their waits, the others run on the worker pool. A wait is a future of the shared poller,
+so a waiting task costs a coroutine instead of a thread. There is no persistence and no revert, a failed stack
+stops at its failed atom.
+
+A task and its async implementation share one body, see drive: a generator yielding its client calls, with the
+client as an argument, so the two only differ in the client they pass.
+
+AWS calls go through aiobotocore when it is installed, its clients get the hooks of iac.clients, the rate limiter
+and telemetry among them. Otherwise each call runs the shared botocore client of iac.clients on the worker pool.
+"""
+import contextlib
+import contextvars
+import importlib
+import importlib.util
+import inspect
+import logging
+from concurrent import futures
+
+from iac import clients, poller, settings, utils, waiter
+
+asyncio = utils.lazy_import('asyncio')
+timeline = utils.lazy_import('iac.timeline')
+
+logger = logging.getLogger(__name__)
+
+AIOBOTOCORE = 'aiobotocore'
+THREADS = 'threads'
+
+# {FunctorTask function | task class: coroutine function}
+_implementations = {}
+
+_provider = contextvars.ContextVar('iac_aio_provider', default=None)
+_region = contextvars.ContextVar('iac_aio_region', default=None)
+_task = contextvars.ContextVar('iac_aio_task', default=None)
+
+
+def implements(target):
+    """
+    Register the decorated coroutine function as the async version of a task.
+    :param target: function of a FunctorTask or task class, the coroutine takes the arguments of its execute
+    """
+    def decorator(func):
+        _implementations[target] = func
+        return func
+
+    return decorator
+
+
+def implementation(atom):
+    """
+    :return: coroutine function registered for the function or class of the atom, see spec.SpecTask, None when it
+             only has a blocking execute
+    """
+    return _implementations.get(getattr(atom, 'target', None) or getattr(atom, '_execute', None) or type(atom))
+
+
+def default_backend():
+    return AIOBOTOCORE if importlib.util.find_spec('aiobotocore') else THREADS
+
+
+class AsyncClientProvider(object):
+    """
+    Async clients of one event loop, one per (service, region), and the worker pool of the blocking calls.
+    """
+
+    def __init__(self, backend=None, max_workers=settings.MAX_WORKERS):
+        """
+        :param backend: AIOBOTOCORE or THREADS, defaults to aiobotocore when it is installed
+        :param max_workers: int, size of the worker pool and of the connection pools, bounds the calls in flight
+        """
+        self.backend = backend or default_backend()
+        self.max_workers = max_workers
+        self.executor = futures.ThreadPoolExecutor(max_workers, thread_name_prefix='iac-aio')
+        self._clients = {}
+        self._shared = {}
+        self._session = None
+        self._exit_stack = contextlib.AsyncExitStack()
+
+    async def get(self, service, region=None):
+        """
+        :param service: str, like 'rds'
+        :param region: str, defaults to the region of iac.CONFIG
+        :return: client whose operations are coroutine functions
+        """
+        key = (service, region or clients.get_provider().config.region_name)
+        if key not in self._clients:
+            # A task, so that the concurrent first callers share one client.
+            self._clients[key] = asyncio.ensure_future(self._create(*key))
+        return await self._clients[key]
+
+    async def _create(self, service, region):
+        if self.backend == THREADS:
+            return _ThreadedClient(clients.get(service, region))
+        from botocore.config import Config
+
+        if self._session is None:
+            self._session = importlib.import_module('aiobotocore.session').get_session()
+        config = clients.get_provider().config.merge(Config(
+            region_name=region,
+            max_pool_connections=self.max_workers,
+            tcp_keepalive=True,
+        ))
+        client = await self._exit_stack.enter_async_context(self._session.create_client(service, config=config))
+        clients.get_provider().apply_hooks(client)
+        return client
+
+    async def shared(self, key, factory):
+        """
+        :param key: hashable
+        :param factory: coroutine function, called once per key for every caller
+        :return: result of factory
+        """
+        if key not in self._shared:
+            self._shared[key] = asyncio.ensure_future(factory())
+        # A cancelled caller must not cancel the load the others wait for.
+        return await asyncio.shield(self._shared[key])
+
+    async def close(self):
+        await self._exit_stack.aclose()
+        self.executor.shutdown()
+
+
+class _ThreadedClient(object):
+    """
+    Async facade of a botocore client, each operation runs on the worker pool, see run_sync.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name in ('exceptions', 'meta', 'get_paginator') or not callable(attr):
+            return attr
+
+        async def operation(**kwargs):
+            return await run_sync(attr, **kwargs)
+
+        return operation
+
+
+def _current_provider():
+    provider = _provider.get()
+    if provider is None:
+        raise RuntimeError('No async client provider, run the coroutine through iac.aio.run_all.')
+    return provider
+
+
+def current_task():
+    """
+    :return: str, name of the atom the running coroutine belongs to, None outside of run
+    """
+    return _task.get()
+
+
+def current_region():
+    """
+    :return: str, region of the running flow, None for the default region of iac.CONFIG
+    """
+    return _region.get()
+
+
+async def client(service):
+    """
+    :return: async client of the service in the region of the running flow
+    """
+    return await _current_provider().get(service, _region.get())
+
+
+async def run_sync(func, *args, **kwargs):
+    """
+    Run a blocking function on the worker pool, as the current task and in its region, see utils.in_task.
+    """
+    name, region = _task.get(), _region.get()
+
+    def call():
+        with utils.in_task(name, region):
+            return func(*args, **kwargs)
+
+    return await asyncio.get_running_loop().run_in_executor(_current_provider().executor, call)
+
+
+async def shared(key, factory):
+    """
+    Run factory once per key for every flow of run_all, like a process-wide cache load.
+    """
+    return await _current_provider().shared(key, factory)
+
+
+async def paginate(client, operation, key, page_size=None, **params):
+    """
+    Async generator of the items of a paginated call, see utils.paginate.
+    :param client: client of aio.client
+    """
+    if page_size is not None:
+        params['PaginationConfig'] = {'PageSize': page_size}
+    if isinstance(client, _ThreadedClient):
+        pages = iter(client.get_paginator(operation).paginate(**params))
+        while True:
+            page = await run_sync(next, pages, None)
+            if page is None:
+                return
+            for item in page.get(key, []):
+                yield item
+    else:
+        async for page in client.get_paginator(operation).paginate(**params):
+            for item in page.get(key, []):
+                yield item
+
+
+async def first(items):
+    """
+    :param items: async generator, closed after its first item
+    :return: the first item, None when there is none
+    """
+    try:
+        async for item in items:
+            return item
+    finally:
+        await items.aclose()
+    return None
+
+
+async def collect(items):
+    """
+    :return: list of the items of an async generator
+    """
+    return [item async for item in items]
+
+
+async def wait(kind, key, condition, **kwargs):
+    """
+    Wait on the shared poller without holding a thread, see poller.submit.
+    :return: item
+    """
+    with utils.in_region(_region.get()):
+        future = poller.submit(kind, key, condition, **kwargs)
+    # The poller resolves the future on its own, cancelling the wait only stops waiting for it.
+    return await asyncio.shield(asyncio.wrap_future(future))
+
+
+class Wait(object):
+    """
+    Step of a body waiting on the shared poller, see drive.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: poller.wait arguments
+        """
+        self.kwargs = kwargs
+
+
+class Paginate(object):
+    """
+    Step of a body listing the items of a paginated call, see drive and utils.paginate.
+    """
+
+    def __init__(self, client, operation, key, **params):
+        self.client = client
+        self.operation = operation
+        self.key = key
+        self.params = params
+
+
+class Blocking(object):
+    """
+    Step of a body calling a blocking function, on the worker pool under drive_async.
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+
+def drive(body):
+    """
+    Run a body in the calling thread. A body is a generator that yields what its client calls return, the response
+    of a botocore client, or the coroutine of an async client under drive_async, and Wait, Paginate and Blocking
+    steps, and gets their results back. A failed call or step is raised at its yield, so the body handles the
+    errors of both the same way. It reads its region with current_region, None in a thread of a taskflow engine
+    leaves it to inventory and the lazy clients.
+    :param body: generator
+    :return: what the body returns
+    """
+    result, error = None, None
+    while True:
+        try:
+            step = body.send(result) if error is None else body.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            result, error = _resolve(step), None
+        except Exception as e:
+            result, error = None, e
+
+
+def _resolve(step):
+    if isinstance(step, Wait):
+        return poller.wait(**step.kwargs)
+    if isinstance(step, Paginate):
+        return list(utils.paginate(step.client, step.operation, step.key, **step.params))
+    if isinstance(step, Blocking):
+        return step.func(*step.args, **step.kwargs)
+    return step
+
+
+async def drive_async(body):
+    """
+    drive on the event loop, the calls of the body are awaited and its waits cost no thread.
+    """
+    result, error = None, None
+    while True:
+        try:
+            step = body.send(result) if error is None else body.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            result, error = await _resolve_async(step), None
+        except Exception as e:
+            result, error = None, e
+
+
+async def _resolve_async(step):
+    if isinstance(step, Wait):
+        return await wait(**step.kwargs)
+    if isinstance(step, Paginate):
+        return await collect(paginate(step.client, step.operation, step.key, **step.params))
+    if isinstance(step, Blocking):
+        return await run_sync(step.func, *step.args, **step.kwargs)
+    if inspect.isawaitable(step):
+        return await step
+    return step
+
+
+async def run(flow, store, region=None):
+    """
+    Run the flow, every atom as soon as the atoms it depends on are done.
+    :param flow: taskflow flow, see stack.flow_provision
+    :param store: dict, see the requires of the flow
+    :param region: str, defaults to the region of iac.CONFIG
+    :return: dict, the store and the results of the atoms
+    """
+    compiler = importlib.import_module('taskflow.engines.action_engine.compiler')
+    exceptions = importlib.import_module('taskflow.exceptions')
+    graph = compiler.PatternCompiler(flow).compile().execution_graph
+    results = dict(store)
+    runs = {}
+    _region.set(region)
+
+    async def _run_atom(atom):
+        await asyncio.gather(*(runs[p] for p in timeline.atom_predecessors(graph, atom)))
+        if graph.nodes[atom]['kind'] != compiler.TASK:
+            # Retry controllers have nothing to run, a failure fails the flow.
+            return
+        kwargs = {}
+        for arg, name in atom.rebind.items():
+            if atom.inject and name in atom.inject:
+                kwargs[arg] = atom.inject[name]
+            elif name in results:
+                kwargs[arg] = results[name]
+            elif arg not in atom.optional:
+                raise exceptions.MissingDependencies(atom, [name])
+        _task.set(atom.name)
+        func = implementation(atom)
+        result = await (func(**kwargs) if func is not None else run_sync(atom.execute, **kwargs))
+        for name, index in atom.save_as.items():
+            results[name] = result if index is None else result[index]
+
+    for atom in graph.nodes:
+        if graph.nodes[atom]['kind'] in (compiler.TASK, compiler.RETRY):
+            runs[atom] = asyncio.ensure_future(_run_atom(atom))
+    try:
+        await asyncio.gather(*runs.values())
+    except BaseException:
+        for r in runs.values():
+            r.cancel()
+        await asyncio.gather(*runs.values(), return_exceptions=True)
+        raise
+    return results
+
+
+async def run_all(jobs, region=None, backend=None, max_workers=None):
+    """
+    Run many flows at once on the running event loop, sharing one AsyncClientProvider. A failed flow does not stop
+    the others.
+    :param jobs: {stack name: (flow, store)}
+    :param region: str, region of the stacks
+    :param backend: see AsyncClientProvider
+    :param max_workers: int, defaults to settings.MAX_WORKERS
+    :return: {stack name: {'state': 'SUCCESS' or 'FAILURE', 'duration': seconds, 'results' or 'error'}}
+    """
+    provider = AsyncClientProvider(backend, max_workers or settings.MAX_WORKERS)
+    token = _provider.set(provider)
+    try:
+        statuses = await asyncio.gather(*(_run_job(name, flow, store, region)
+                                          for name, (flow, store) in jobs.items()))
+    finally:
+        _provider.reset(token)
+        await provider.close()
+    return dict(zip(jobs, statuses))
+
+
+async def _run_job(name, flow, store, region):
+    started = waiter.clock.monotonic()
+    try:
+        results = await run(flow, store, region)
+    except Exception as e:
+        logger.exception('Stack [%s] %s failed.', name, flow.name)
+        return {'state': 'FAILURE', 'duration': waiter.clock.monotonic() - started, 'error': repr(e)}
+    logger.info('Stack [%s] %s done.', name, flow.name)
+    return {'state': 'SUCCESS', 'duration': waiter.clock.monotonic() - started, 'results': results}
@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from iac import utils
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache(object):
+    """
+    Thread-safe key -> JSON value cache with expiry, kept in memory and optionally on disk
+    as one file per key under `directory`.
+    """
+
+    def __init__(self, name, ttl, directory=None):
+        self.name = name
+        self.ttl = ttl
+        self.directory = directory
+        self._entries = {}
+        self._lock = threading.RLock()
+        # One lock per key being loaded, a cold key does not hold up the others.
+        self._load_locks = {}
+
+    def _path(self, key):
+        return os.path.join(self.directory, '%s-%s.json' % (self.name, key))
+
+    def get(self, key):
+        """
+        :return: value, or None when missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self.directory:
+                entry = self._read(key)
+                if entry is not None:
+                    self._entries[key] = entry
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                self.invalidate(key)
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            entry = (time.time() + self.ttl, value)
+            self._entries[key] = entry
+            if self.directory:
+                self._write(key, entry)
+
+    def get_or_load(self, key, loader):
+        """
+        Return the cached value, or call loader() once and cache its result. Concurrent callers of a cold key
+        wait for the first loader instead of loading again, the other keys are served and loaded meanwhile.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            value = self.get(key)
+            if value is None:
+                value = loader()
+                self.set(key, value)
+            return value
+
+    def invalidate(self, key=None):
+        """
+        :param key: str, None drops every key
+        """
+        with self._lock:
+            keys = list(self._entries) if key is None else [key]
+            if key is None and self.directory and os.path.isdir(self.directory):
+                keys += [f[len(self.name) + 1:-len('.json')] for f in os.listdir(self.directory)
+                         if f.startswith(self.name + '-') and f.endswith('.json')]
+            for k in set(keys):
+                self._entries.pop(k, None)
+                if self.directory and os.path.exists(self._path(k)):
+                    os.remove(self._path(k))
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                data = json.load(f)
+            return data['expires'], data['value']
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError):
+            logger.info('Cache file [%s] is corrupted, ignore it.', self._path(key), exc_info=True)
+            return None
+
+    def _write(self, key, entry):
+        # The region threads and processes sharing the directory may write the same key at once.
+        utils.write_atomic(self._path(key), json.dumps({'expires': entry[0], 'value': entry[1]}))
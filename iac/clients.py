@@ -0,0 +1,122 @@
+"""
+Lazily created boto3 clients shared by every flow and stack of the process.
+
+Clients are built on first use, one per (service, region), from iac.CONFIG with a connection pool sized to the
+engine worker count, so parallel tasks don't queue for connections and unused services cost nothing.
+"""
+import threading
+
+import iac
+from iac import settings, utils
+
+
+class ClientProvider(object):
+
+    def __init__(self, config=None, max_workers=settings.MAX_WORKERS):
+        self._config = config
+        self.max_workers = max_workers
+        self.hooks = []
+        self._clients = {}
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def config(self):
+        return self._config or iac.CONFIG
+
+    def configure(self, max_workers=None):
+        """
+        Resize the connection pool of the clients created from now on.
+        :param max_workers: int, worker count of the engines sharing the clients
+        """
+        with self._lock:
+            if max_workers is not None and max_workers != self.max_workers:
+                self.max_workers = max_workers
+                self._clients.clear()
+
+    def add_hook(self, hook):
+        """
+        :param hook: client -> None, applied to the current clients and to every client created later
+        """
+        with self._lock:
+            self.hooks.append(hook)
+            for client in self._clients.values():
+                hook(client)
+
+    def apply_hooks(self, client):
+        """
+        Apply the hooks to a client created elsewhere, like the aiobotocore clients of iac.aio.
+        """
+        with self._lock:
+            hooks = list(self.hooks)
+        for hook in hooks:
+            hook(client)
+
+    def get(self, service, region=None):
+        """
+        :param service: str, like 'rds'
+        :param region: str, defaults to the region of iac.CONFIG
+        :return: botocore client
+        """
+        key = (service, region or self.config.region_name)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._create(*key)
+                    self._clients[key] = client
+        return client
+
+    def _create(self, service, region):
+        import boto3
+        from botocore.config import Config
+
+        if self._session is None:
+            # boto3's default session is not thread-safe, build clients from a private one under the lock.
+            self._session = boto3.session.Session()
+        config = self.config.merge(Config(
+            region_name=region,
+            max_pool_connections=self.max_workers,
+            tcp_keepalive=True,
+        ))
+        client = self._session.client(service, config=config)
+        # botocore builds the exception classes on first access without a lock, threads racing on it would catch
+        # and raise different classes.
+        client.exceptions
+        for hook in self.hooks:
+            hook(client)
+        return client
+
+
+class LazyClient(object):
+    """
+    Module level stand-in for a client, resolving to the shared client of the service on attribute access, in the
+    region of the calling task, see utils.in_region.
+    """
+
+    def __init__(self, service, provider=None):
+        self._service = service
+        self._provider = provider
+
+    def __getattr__(self, name):
+        return getattr((self._provider or _provider).get(self._service, utils.current_region()), name)
+
+
+_provider = ClientProvider()
+
+
+def get_provider():
+    return _provider
+
+
+def get(service, region=None):
+    return _provider.get(service, region)
+
+
+def lazy(service):
+    return LazyClient(service)
+
+
+def configure(max_workers=None):
+    _provider.configure(max_workers)
@@ -0,0 +1,241 @@
+"""
+CodeDeploy blue/green deployments of the ECS services.
+
+The services run under the CODE_DEPLOY deployment controller, a new task definition, network configuration or
+platform version only reaches a running service through a deployment of its deployment group, see
+ecs.deploy_service. The application is created with the stack, the deployment group once its service exists. The
+group swaps the listener between the target group of the service and its green twin, the old tasks stop once the
+traffic moved.
+"""
+import json
+import logging
+
+from iac import clients, poller, utils
+
+botocore_exceptions = utils.lazy_import('botocore.exceptions')
+
+logger = logging.getLogger(__name__)
+
+client = clients.lazy('codedeploy')
+
+# Deployment statuses after which nothing changes anymore.
+FAILED_STATUSES = ('Failed', 'Stopped')
+
+
+class DeploymentFailed(Exception):
+
+    def __init__(self, deploymentId, status, error=None):
+        super(DeploymentFailed, self).__init__('CodeDeploy deployment [%s] %s: %s.'
+                                               % (deploymentId, status.lower(), error or 'no error information'))
+        self.deploymentId = deploymentId
+        self.status = status
+
+
+def create_application(codeDeployApplication):
+    try:
+        client.create_application(applicationName=codeDeployApplication, computePlatform='ECS')
+        logger.info('CodeDeploy application [%s] created successfully.', codeDeployApplication)
+    except client.exceptions.ApplicationAlreadyExistsException:
+        logger.info('CodeDeploy application [%s] already exists, do nothing.', codeDeployApplication)
+    except botocore_exceptions.ClientError:
+        logger.info('CodeDeploy application [%s] created failed.', codeDeployApplication, exc_info=True)
+        raise
+
+
+def delete_application(codeDeployApplication):
+    """
+    Delete the application and its deployment groups.
+    """
+    try:
+        client.delete_application(applicationName=codeDeployApplication)
+        logger.info('CodeDeploy application [%s] deleted successfully.', codeDeployApplication)
+    except botocore_exceptions.ClientError:
+        logger.info('CodeDeploy application [%s] deleted failed.', codeDeployApplication, exc_info=True)
+        raise
+
+
+def create_deployment_group(codeDeployApplication, codeDeployDeploymentGroup, clusterName, serviceName,
+                            TargetGroupName, GreenTargetGroupName, ListenerArn,
+                            codeDeployServiceRole='ecsCodeDeployRole'):
+    """
+    Blue/green deployment group of the service, swapping the listener between TargetGroupName and
+    GreenTargetGroupName.
+    :param ListenerArn: str, production listener of the service
+    :param codeDeployServiceRole: str, name or ARN of the role CodeDeploy assumes, with AWSCodeDeployRoleForECS
+    """
+    try:
+        client.get_deployment_group(applicationName=codeDeployApplication,
+                                    deploymentGroupName=codeDeployDeploymentGroup)
+        logger.info('CodeDeploy deployment group [%s] already exists, do nothing.', codeDeployDeploymentGroup)
+        return
+    except client.exceptions.DeploymentGroupDoesNotExistException:
+        pass
+    params = deployment_group_params(codeDeployApplication, codeDeployDeploymentGroup, clusterName, serviceName,
+                                     TargetGroupName, GreenTargetGroupName, ListenerArn,
+                                     role_arn(codeDeployServiceRole))
+    try:
+        client.create_deployment_group(**params)
+        logger.info('CodeDeploy deployment group [%s] created successfully.', codeDeployDeploymentGroup)
+    except client.exceptions.DeploymentGroupAlreadyExistsException:
+        logger.info('CodeDeploy deployment group [%s] already exists, do nothing.', codeDeployDeploymentGroup)
+    except botocore_exceptions.ClientError:
+        logger.info('CodeDeploy deployment group [%s] created failed.', codeDeployDeploymentGroup, exc_info=True)
+        raise
+
+
+def role_arn(role):
+    """
+    :param role: str, role name or ARN
+    :return: ARN of the role in the account of the credentials
+    """
+    if role.startswith('arn:'):
+        return role
+    return 'arn:aws:iam::%s:role/%s' % (clients.get('sts').get_caller_identity()['Account'], role)
+
+
+def deployment_group_params(applicationName, deploymentGroupName, clusterName, serviceName, TargetGroupName,
+                            GreenTargetGroupName, ListenerArn, serviceRoleArn):
+    """
+    :return: create_deployment_group arguments
+    """
+    return dict(
+        applicationName=applicationName,
+        deploymentGroupName=deploymentGroupName,
+        serviceRoleArn=serviceRoleArn,
+        deploymentConfigName='CodeDeployDefault.ECSAllAtOnce',
+        deploymentStyle={
+            'deploymentType': 'BLUE_GREEN',
+            'deploymentOption': 'WITH_TRAFFIC_CONTROL',
+        },
+        blueGreenDeploymentConfiguration={
+            'terminateBlueInstancesOnDeploymentSuccess': {
+                'action': 'TERMINATE',
+                'terminationWaitTimeInMinutes': 0,
+            },
+            'deploymentReadyOption': {
+                'actionOnTimeout': 'CONTINUE_DEPLOYMENT',
+            },
+        },
+        autoRollbackConfiguration={
+            'enabled': True,
+            'events': ['DEPLOYMENT_FAILURE'],
+        },
+        ecsServices=[
+            {
+                'serviceName': serviceName,
+                'clusterName': clusterName,
+            },
+        ],
+        loadBalancerInfo={
+            'targetGroupPairInfoList': [
+                {
+                    'targetGroups': [
+                        {'name': TargetGroupName},
+                        {'name': GreenTargetGroupName},
+                    ],
+                    'prodTrafficRoute': {
+                        'listenerArns': [ListenerArn],
+                    },
+                },
+            ],
+        },
+    )
+
+
+def deployment_params(applicationName, deploymentGroupName, spec, taskDefinitionArn):
+    """
+    :param spec: create_service arguments of the service, see ecs.service_spec
+    :param taskDefinitionArn: str, ARN of spec['taskDefinition']
+    :return: create_deployment arguments rolling the service to the task definition, the network configuration
+             and the platform version of the spec
+    """
+    lb = spec['loadBalancers'][0]
+    awsvpc = spec['networkConfiguration']['awsvpcConfiguration']
+    app_spec = {
+        'version': 1,
+        'Resources': [
+            {
+                'TargetService': {
+                    'Type': 'AWS::ECS::Service',
+                    'Properties': {
+                        'TaskDefinition': taskDefinitionArn,
+                        'LoadBalancerInfo': {
+                            'ContainerName': lb['containerName'],
+                            'ContainerPort': lb['containerPort'],
+                        },
+                        'PlatformVersion': spec['platformVersion'],
+                        'NetworkConfiguration': {
+                            'AwsvpcConfiguration': {
+                                'Subnets': awsvpc['subnets'],
+                                'SecurityGroups': awsvpc['securityGroups'],
+                                'AssignPublicIp': awsvpc['assignPublicIp'],
+                            },
+                        },
+                    },
+                },
+            },
+        ],
+    }
+    return dict(
+        applicationName=applicationName,
+        deploymentGroupName=deploymentGroupName,
+        revision={
+            'revisionType': 'AppSpecContent',
+            'appSpecContent': {
+                'content': json.dumps(app_spec),
+            },
+        },
+    )
+
+
+def create_deployment(applicationName, deploymentGroupName, spec, taskDefinitionArn):
+    """
+    See deployment_params.
+    :return: deploymentId
+    """
+    response = client.create_deployment(**deployment_params(applicationName, deploymentGroupName, spec,
+                                                             taskDefinitionArn))
+    logger.info('Service [%s] CodeDeploy deployment [%s] created successfully.',
+                spec['serviceName'], response['deploymentId'])
+    return response['deploymentId']
+
+
+def get_deployments_batch(deploymentIds):
+    """
+    :param deploymentIds: [str]
+    :return: {deploymentId: deploymentInfo}
+    """
+    response = client.batch_get_deployments(deploymentIds=deploymentIds)
+    return {info['deploymentId']: info for info in response.get('deploymentsInfo', [])}
+
+
+poller.register_kind('codedeploy.deployment', get_deployments_batch, batch_size=25)
+
+
+def wait_deployment(deploymentId):
+    """
+    Block until the deployment succeeded, raise DeploymentFailed when it failed or was stopped.
+    """
+    poller.wait(**deployment_done(deploymentId))
+
+
+def deployment_done(deploymentId):
+    """
+    :return: poller.wait arguments
+    """
+    def _status(info):
+        return info.get('status') if info else None
+
+    def _check(info):
+        status = _status(info)
+        if status in FAILED_STATUSES:
+            raise DeploymentFailed(deploymentId, status, info.get('errorInformation', {}).get('message'))
+        if status != 'Succeeded':
+            logger.info('Waiting for the CodeDeploy deployment [%s] to succeed, current status: [%s].',
+                        deploymentId, status)
+            return False
+        logger.info('CodeDeploy deployment [%s] succeeded.', deploymentId)
+        return True
+
+    return dict(kind='codedeploy.deployment', key=deploymentId, condition=_check,
+                resource='CodeDeploy deployment [%s]' % deploymentId, state=_status)
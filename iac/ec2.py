@@ -1,14 +1,29 @@
-import boto3
-from taskflow import task
-from taskflow.patterns import linear_flow
+import functools
 
-from iac import CONFIG
+from iac import aio, cache, clients, settings, state, utils
 
-client = boto3.client('ec2', config=CONFIG)
+asyncio = utils.lazy_import('asyncio')
+task = utils.lazy_import('taskflow.task')
+linear_flow = utils.lazy_import('taskflow.patterns.linear_flow')
+
+client = clients.lazy('ec2')
+
+vpc_cache = cache.TTLCache('vpc', settings.VPC_CACHE_TTL, directory=settings.CACHE_DIR)
+
+
+# Items per discovery call, filters are applied server side so pages stay small in any account.
+PAGE_SIZE = 100
 
 
 def get_default_vpc():
-    response = client.describe_vpcs(
+    vpc = next(utils.paginate(client, 'describe_vpcs', 'Vpcs', **_default_vpc_filters()), None)
+    if vpc is None:
+        raise ValueError('No default VPC in region [%s].' % client.meta.region_name)
+    return vpc.get('VpcId')
+
+
+def _default_vpc_filters():
+    return dict(
         Filters=[
             {
                 'Name': 'is-default',
@@ -20,12 +35,18 @@ def get_default_vpc():
         ],
         DryRun=False,
     )
-    vpc = response.get('Vpcs').pop()
-    return vpc.get('VpcId')
 
 
 def get_default_subnet_ids(VpcId):
-    response = client.describe_subnets(
+    """
+    :return: [SubnetId], the default subnet of each availability zone, over every page
+    """
+    return [sn['SubnetId'] for sn in utils.paginate(client, 'describe_subnets', 'Subnets', page_size=PAGE_SIZE,
+                                                    **_default_subnet_filters(VpcId))]
+
+
+def _default_subnet_filters(VpcId):
+    return dict(
         Filters=[
             {
                 'Name': 'vpc-id',
@@ -42,11 +63,19 @@ def get_default_subnet_ids(VpcId):
         ],
         DryRun=False,
     )
-    return [sn['SubnetId'] for sn in response['Subnets']]
 
 
 def get_default_security_group_ids(VpcId):
-    response = client.describe_security_groups(
+    """
+    :return: [GroupId], a VPC has exactly one default group, discovery stops at the first page holding it
+    """
+    sg = next(utils.paginate(client, 'describe_security_groups', 'SecurityGroups', page_size=PAGE_SIZE,
+                             **_default_security_group_filters(VpcId)), None)
+    return [sg['GroupId']] if sg else []
+
+
+def _default_security_group_filters(VpcId):
+    return dict(
         Filters=[
             {
                 'Name': 'vpc-id',
@@ -54,24 +83,95 @@ def get_default_security_group_ids(VpcId):
                     VpcId,
                 ]
             },
-        ],
-        GroupNames=[
-            'default',
+            {
+                'Name': 'group-name',
+                'Values': [
+                    'default',
+                ]
+            },
         ],
         DryRun=False,
     )
-    return [sg['GroupId'] for sg in response['SecurityGroups']]
 
 
-def flow_load_default_vpc_info() -> linear_flow.Flow:
+@functools.lru_cache()
+def _account_id():
+    return clients.get('sts').get_caller_identity()['Account']
+
+
+def _vpc_cache_key():
+    region = client.meta.region_name
+    if vpc_cache.directory is None:
+        return region
+    return '%s-%s' % (_account_id(), region)
+
+
+def _discover_default_vpc_info():
+    vpc_id = get_default_vpc()
+    return {
+        'VpcId': vpc_id,
+        'SubnetIds': get_default_subnet_ids(vpc_id),
+        'VpcSecurityGroupIds': get_default_security_group_ids(vpc_id),
+    }
+
+
+@state.always_run
+def load_default_vpc_info():
+    """
+    Cached discovery of the default VPC, shared by every flow of the process and, when settings.CACHE_DIR is
+    set, across runs.
+    :return: VpcId, SubnetIds, VpcSecurityGroupIds
+    """
+    info = vpc_cache.get_or_load(_vpc_cache_key(), _discover_default_vpc_info)
+    return info['VpcId'], info['SubnetIds'], info['VpcSecurityGroupIds']
+
+
+def invalidate_default_vpc_info():
+    vpc_cache.invalidate(_vpc_cache_key())
+
+
+async def _discover_default_vpc_info_async():
+    ec2 = await aio.client('ec2')
+    vpc = await aio.first(aio.paginate(ec2, 'describe_vpcs', 'Vpcs', **_default_vpc_filters()))
+    if vpc is None:
+        raise ValueError('No default VPC in region [%s].' % ec2.meta.region_name)
+    subnets, security_group = await asyncio.gather(
+        aio.collect(aio.paginate(ec2, 'describe_subnets', 'Subnets', page_size=PAGE_SIZE,
+                                 **_default_subnet_filters(vpc['VpcId']))),
+        aio.first(aio.paginate(ec2, 'describe_security_groups', 'SecurityGroups', page_size=PAGE_SIZE,
+                               **_default_security_group_filters(vpc['VpcId']))),
+    )
+    return {
+        'VpcId': vpc['VpcId'],
+        'SubnetIds': [sn['SubnetId'] for sn in subnets],
+        'VpcSecurityGroupIds': [security_group['GroupId']] if security_group else [],
+    }
+
+
+@aio.implements(load_default_vpc_info)
+async def load_default_vpc_info_async():
+    """
+    load_default_vpc_info, the flows of one aio.run_all share a single discovery per cache key.
+    """
+    key = await aio.run_sync(_vpc_cache_key)
+    info = vpc_cache.get(key)
+    if info is None:
+        async def _load():
+            loaded = await _discover_default_vpc_info_async()
+            vpc_cache.set(key, loaded)
+            return loaded
+
+        info = await aio.shared(('vpc', key), _load)
+    return info['VpcId'], info['SubnetIds'], info['VpcSecurityGroupIds']
+
+
+def flow_load_default_vpc_info() -> 'linear_flow.Flow':
     """
     requires:
     provides: VpcId, SubnetIds, VpcSecurityGroupIds
     """
     flow = linear_flow.Flow('load_default_vpc_info')
     flow.add(
-        task.FunctorTask(execute=get_default_vpc, provides='VpcId'),
-        task.FunctorTask(execute=get_default_subnet_ids, provides='SubnetIds'),
-        task.FunctorTask(execute=get_default_security_group_ids, provides='VpcSecurityGroupIds'),
+        task.FunctorTask(execute=load_default_vpc_info, provides=('VpcId', 'SubnetIds', 'VpcSecurityGroupIds')),
     )
     return flow
@@ -1,30 +1,71 @@
 import logging
 
-import boto3
-from botocore.exceptions import ClientError
-from taskflow import task
+from iac import aio, clients, inventory, state, utils
 
-from iac import CONFIG
+botocore_exceptions = utils.lazy_import('botocore.exceptions')
 
 logger = logging.getLogger(__name__)
 
-client = boto3.client('ecr', config=CONFIG)
+client = clients.lazy('ecr')
 
 
-class ECRRepositoryCreate(task.Task):
+def create_repository(repositoryName, imageTagMutability='MUTABLE') -> str:
+    """
+    :return: repositoryUri, like '123456789012.dkr.ecr.ap-east-1.amazonaws.com/mypoc'
+    """
+    return aio.drive(_create_repository(client, repositoryName, imageTagMutability))
 
-    def __init__(self, name=None, inject=None):
-        super(ECRRepositoryCreate, self).__init__(name=name, inject=inject)
 
-    def execute(self, repositoryName, imageTagMutability='MUTABLE'):
-        try:
-            client.create_repository(
-                repositoryName=repositoryName,
-                imageTagMutability=imageTagMutability,
-            )
-            logger.info('Repository [%s] created successfully.', repositoryName)
-        except client.exceptions.RepositoryAlreadyExistsException:
-            logger.info('Repository [%s] already exists, do nothing.', repositoryName)
-        except ClientError:
-            logger.info('Repository [%s] created failed.', repositoryName, exc_info=True)
-            raise
+def delete_repository(repositoryName):
+    aio.drive(_delete_repository(client, repositoryName))
+
+
+@state.drift_check(create_repository)
+def _repository_exists(arguments, outputs):
+    repo = inventory.find(inventory.REPOSITORY, arguments['repositoryName'])
+    return repo is not None and repo['repositoryUri'] == outputs
+
+
+@aio.implements(create_repository)
+async def create_repository_async(repositoryName, imageTagMutability='MUTABLE'):
+    return await aio.drive_async(_create_repository(await aio.client('ecr'), repositoryName, imageTagMutability))
+
+
+@aio.implements(delete_repository)
+async def delete_repository_async(repositoryName):
+    await aio.drive_async(_delete_repository(await aio.client('ecr'), repositoryName))
+
+
+def _create_repository(ecr, repositoryName, imageTagMutability):
+    repo = inventory.find(inventory.REPOSITORY, repositoryName, aio.current_region())
+    if repo is not None:
+        logger.info('Repository [%s] already exists, do nothing.', repositoryName)
+        return repo['repositoryUri']
+    try:
+        response = yield ecr.create_repository(
+            repositoryName=repositoryName,
+            imageTagMutability=imageTagMutability,
+        )
+        logger.info('Repository [%s] created successfully.', repositoryName)
+        return response['repository']['repositoryUri']
+    except ecr.exceptions.RepositoryAlreadyExistsException:
+        logger.info('Repository [%s] already exists, do nothing.', repositoryName)
+        response = yield ecr.describe_repositories(repositoryNames=[repositoryName])
+        return response['repositories'][0]['repositoryUri']
+    except botocore_exceptions.ClientError:
+        logger.info('Repository [%s] created failed.', repositoryName, exc_info=True)
+        raise
+
+
+def _delete_repository(ecr, repositoryName):
+    try:
+        yield ecr.delete_repository(
+            repositoryName=repositoryName,
+            force=True,
+        )
+        logger.info('Repository [%s] deleted successfully.', repositoryName)
+    except ecr.exceptions.RepositoryNotFoundException:
+        logger.info('Repository [%s] does not exist, do nothing.', repositoryName)
+    except botocore_exceptions.ClientError:
+        logger.info('Repository [%s] deleted failed.', repositoryName, exc_info=True)
+        raise
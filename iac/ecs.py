@@ -1,171 +1,305 @@
+import hashlib
+import json
 import logging
 
-import boto3
-from botocore.exceptions import ClientError
-from taskflow import task
+from iac import aio, clients, codedeploy, inventory, poller, state, utils
 
-from iac import CONFIG, utils
+botocore_exceptions = utils.lazy_import('botocore.exceptions')
 
 logger = logging.getLogger(__name__)
 
-client = boto3.client('ecs', config=CONFIG)
+client = clients.lazy('ecs')
 
 
-class ECSClusterCreate(task.Task):
+def create_cluster(clusterName):
+    aio.drive(_create_cluster(client, clusterName))
 
-    def __init__(self, name=None, inject=None):
-        super(ECSClusterCreate, self).__init__(name=name, inject=inject)
 
-    def execute(self, clusterName):
-        client.create_cluster(
-            clusterName=clusterName,
-            settings=[
-                {
-                    'name': 'containerInsights',
-                    'value': 'disabled'
-                },
-            ],
-            configuration={
-                'executeCommandConfiguration': {
-                    'logging': 'DEFAULT',
-                }
+def _cluster_active(cluster):
+    return cluster is not None and cluster.get('status') == 'ACTIVE'
+
+
+def cluster_params(clusterName):
+    """
+    :return: create_cluster arguments
+    """
+    return dict(
+        clusterName=clusterName,
+        settings=[
+            {
+                'name': 'containerInsights',
+                'value': 'disabled'
             },
-            capacityProviders=[
-                'FARGATE',
-                'FARGATE_SPOT',
-            ],
-        )
-        logger.info('Cluster [%s] created successfully.', clusterName)
+        ],
+        configuration={
+            'executeCommandConfiguration': {
+                'logging': 'DEFAULT',
+            }
+        },
+        capacityProviders=[
+            'FARGATE',
+            'FARGATE_SPOT',
+        ],
+    )
 
 
-class ECSRegisterTaskDefinition(task.Task):
+def register_task_definition(family, SQLALCHEMY_DATABASE_URI, repositoryUri, imageTag='v1.0', containerName='mypoc',
+                             containerPort=80) -> str:
+    """
+    Register a revision only when its content differs from the latest ACTIVE revision of the family, an
+    unchanged revision would roll the service for nothing.
+    :return: taskDefinitionArn
+    """
+    return aio.drive(_register_task_definition(client, family, SQLALCHEMY_DATABASE_URI, repositoryUri, imageTag,
+                                               containerName, containerPort))
 
-    def __init__(self, name=None, provides=None, requires=None, auto_extract=True, rebind=None, inject=None,
-                 ignore_list=None, revert_rebind=None, revert_requires=None):
-        super(ECSRegisterTaskDefinition, self).__init__(name, provides, requires, auto_extract, rebind, inject,
-                                                        ignore_list, revert_rebind, revert_requires)
 
-    def execute(self, family, SQLALCHEMY_DATABASE_URI):
-        try:
-            client.register_task_definition(
-                family=family,
-                taskRoleArn='ecsTaskExecutionRole',
-                executionRoleArn='ecsTaskExecutionRole',
-                networkMode='awsvpc',
-                containerDefinitions=[
+# Tag of a revision registered by register_task_definition, the hash of its register_task_definition arguments.
+CONTENT_HASH_TAG = 'iac:content-hash'
+
+
+def task_definition_hash(params):
+    """
+    :param params: register_task_definition arguments, without tags
+    :return: str, sha256 of their canonical JSON
+    """
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _revision_with_hash(response, content_hash):
+    """
+    :param response: describe_task_definition response with TAGS, or None
+    :return: taskDefinitionArn of the revision when its content hash tag matches, else None
+    """
+    if not response:
+        return None
+    tags = {t['key']: t['value'] for t in response.get('tags', [])}
+    if tags.get(CONTENT_HASH_TAG) != content_hash:
+        return None
+    return response['taskDefinition']['taskDefinitionArn']
+
+
+def task_definition_params(family, SQLALCHEMY_DATABASE_URI, repositoryUri, imageTag, region, containerName='mypoc',
+                           containerPort=80):
+    """
+    :param region: str, region of the awslogs log group
+    :param containerName: str, the container the load balancer sends to, see service_spec
+    :param containerPort: int
+    :return: register_task_definition arguments
+    """
+    return dict(
+        family=family,
+        taskRoleArn='ecsTaskExecutionRole',
+        executionRoleArn='ecsTaskExecutionRole',
+        networkMode='awsvpc',
+        containerDefinitions=[
+            {
+                'name': containerName,
+                'image': '%s:%s' % (repositoryUri, imageTag),
+                'cpu': 0,
+                'portMappings': [
                     {
-                        'name': 'mypoc',
-                        'image': '835751565277.dkr.ecr.ap-east-1.amazonaws.com/mypoc:v1.0',
-                        'cpu': 0,
-                        'portMappings': [
-                            {
-                                'containerPort': 80,
-                                'hostPort': 80,
-                                'protocol': 'tcp'
-                            },
-                        ],
-                        'essential': True,
-                        'environment': [
-                            {
-                                'name': 'SQLALCHEMY_DATABASE_URI',
-                                'value': SQLALCHEMY_DATABASE_URI
-                            }
-                        ],
-                        'startTimeout': 20,
-                        'stopTimeout': 20,
-                        'readonlyRootFilesystem': False,
-                        'logConfiguration': {
-                            'logDriver': 'awslogs',
-                            'options': {
-                                'awslogs-group': '/ecs/%s' % family,
-                                'awslogs-region': 'ap-east-1',
-                                'awslogs-stream-prefix': 'ecs'
-                            },
-                        },
-                        # 'healthCheck': {
-                        #     'command': [
-                        #         'curl -f http://localhost/health || exit 1',
-                        #     ],
-                        #     'interval': 5,
-                        #     'timeout': 3,
-                        #     'retries': 3,
-                        #     'startPeriod': 20
-                        # },
+                        'containerPort': containerPort,
+                        'hostPort': containerPort,
+                        'protocol': 'tcp'
                     },
                 ],
-                volumes=[],
-                placementConstraints=[],
-                requiresCompatibilities=[
-                    'FARGATE',
-                ],
-                cpu='256',
-                memory='512',
-                runtimePlatform={
-                    'cpuArchitecture': 'X86_64',
-                    'operatingSystemFamily': 'LINUX'
-                }
-            )
-            logger.info('TaskDefinition [%s] registered successfully.', family)
-        except ClientError:
-            logger.info('TaskDefinition [%s] registered failed.', family, exc_info=True)
-            raise
-
-
-class ECSServiceCreate(task.Task):
-
-    def __init__(self, name=None, provides=None, requires=None, auto_extract=True, rebind=None, inject=None,
-                 ignore_list=None, revert_rebind=None, revert_requires=None):
-        super(ECSServiceCreate, self).__init__(name, provides, requires, auto_extract, rebind, inject, ignore_list,
-                                               revert_rebind, revert_requires)
-
-    def execute(self, cluster, serviceName, taskDefinition, SubnetIds, VpcSecurityGroupIds, TargetGroupArn):
-        try:
-            r = describe_service(cluster, serviceName)
-            if r.get('services'):
-                logger.info('Service [%s] already exists, delete it.', serviceName)
-                delete_service(cluster, serviceName)
-                wait_service_deleted(cluster, serviceName)
-            client.create_service(
-                cluster=cluster,
-                serviceName=serviceName,
-                taskDefinition=taskDefinition,
-                loadBalancers=[
+                'essential': True,
+                'environment': [
                     {
-                        'targetGroupArn': TargetGroupArn,
-                        'containerName': 'mypoc',
-                        'containerPort': 80,
+                        'name': 'SQLALCHEMY_DATABASE_URI',
+                        'value': SQLALCHEMY_DATABASE_URI
                     }
                 ],
-                desiredCount=1,
-                launchType='FARGATE',
-                platformVersion='LATEST',
-                deploymentConfiguration={
-                    'deploymentCircuitBreaker': {
-                        'enable': False,
-                        'rollback': False
+                'startTimeout': 20,
+                'stopTimeout': 20,
+                'readonlyRootFilesystem': False,
+                'logConfiguration': {
+                    'logDriver': 'awslogs',
+                    'options': {
+                        'awslogs-group': '/ecs/%s' % family,
+                        'awslogs-region': region,
+                        'awslogs-stream-prefix': 'ecs'
                     },
-                    'maximumPercent': 200,
-                    'minimumHealthyPercent': 100
                 },
-                networkConfiguration={
-                    'awsvpcConfiguration': {
-                        'subnets': SubnetIds,
-                        'securityGroups': VpcSecurityGroupIds,
-                        'assignPublicIp': 'ENABLED'
-                    }
-                },
-                schedulingStrategy='REPLICA',
-                enableECSManagedTags=True,
-                propagateTags='NONE',
-                enableExecuteCommand=False,
-                deploymentController={
-                    'type': 'CODE_DEPLOY'
-                },
-            )
-            logger.info('Service [%s] created successfully.', serviceName)
-        except ClientError:
-            logger.info('Service [%s] created failed.', serviceName, exc_info=True)
-            raise
+                # 'healthCheck': {
+                #     'command': [
+                #         'curl -f http://localhost/health || exit 1',
+                #     ],
+                #     'interval': 5,
+                #     'timeout': 3,
+                #     'retries': 3,
+                #     'startPeriod': 20
+                # },
+            },
+        ],
+        volumes=[],
+        placementConstraints=[],
+        requiresCompatibilities=[
+            'FARGATE',
+        ],
+        cpu='256',
+        memory='512',
+        runtimePlatform={
+            'cpuArchitecture': 'X86_64',
+            'operatingSystemFamily': 'LINUX'
+        }
+    )
+
+
+# Fields update_service can't change, a change in one of them recreates the service.
+IMMUTABLE_SERVICE_FIELDS = ('launchType', 'loadBalancers', 'schedulingStrategy', 'deploymentController')
+UPDATABLE_SERVICE_FIELDS = ('taskDefinition', 'desiredCount', 'platformVersion', 'deploymentConfiguration',
+                            'networkConfiguration', 'propagateTags', 'enableECSManagedTags', 'enableExecuteCommand')
+# Under the CODE_DEPLOY controller, the fields only a CodeDeploy deployment changes, see codedeploy.create_deployment.
+CODE_DEPLOY_SERVICE_FIELDS = ('taskDefinition', 'networkConfiguration', 'platformVersion')
+# Under the CODE_DEPLOY controller, the only fields update_service takes, a change of any other one, like
+# enableExecuteCommand, recreates the service.
+CODE_DEPLOY_UPDATABLE_FIELDS = ('desiredCount', 'deploymentConfiguration', 'propagateTags', 'enableECSManagedTags')
+
+
+def deploy_service(cluster, serviceName, taskDefinition, SubnetIds, VpcSecurityGroupIds, TargetGroupArn,
+                   codeDeployApplication=None, codeDeployDeploymentGroup=None, containerName='mypoc', containerPort=80):
+    """
+    Create the service, or bring an existing ACTIVE one to the wanted spec in place, through a CodeDeploy
+    deployment for a new task definition, see plan_changes. Only a change of an immutable field deletes and
+    recreates it.
+    :param codeDeployApplication: str, application of the deployment group of the service, see
+                                  codedeploy.create_deployment_group, required to roll an existing service
+    :param codeDeployDeploymentGroup: str
+    """
+    spec = service_spec(cluster, serviceName, taskDefinition, SubnetIds, VpcSecurityGroupIds, TargetGroupArn,
+                        containerName, containerPort)
+    aio.drive(_deploy_service(client, spec, codeDeployApplication, codeDeployDeploymentGroup))
+
+
+def service_spec(cluster, serviceName, taskDefinition, SubnetIds, VpcSecurityGroupIds, TargetGroupArn,
+                 containerName='mypoc', containerPort=80):
+    """
+    :param containerName: str, container of the task definition the target group sends to
+    :param containerPort: int
+    :return: create_service arguments
+    """
+    return dict(
+        cluster=cluster,
+        serviceName=serviceName,
+        taskDefinition=taskDefinition,
+        loadBalancers=[
+            {
+                'targetGroupArn': TargetGroupArn,
+                'containerName': containerName,
+                'containerPort': containerPort,
+            }
+        ],
+        desiredCount=1,
+        launchType='FARGATE',
+        platformVersion='LATEST',
+        deploymentConfiguration={
+            'deploymentCircuitBreaker': {
+                'enable': False,
+                'rollback': False
+            },
+            'maximumPercent': 200,
+            'minimumHealthyPercent': 100
+        },
+        networkConfiguration={
+            'awsvpcConfiguration': {
+                'subnets': SubnetIds,
+                'securityGroups': VpcSecurityGroupIds,
+                'assignPublicIp': 'ENABLED'
+            }
+        },
+        schedulingStrategy='REPLICA',
+        enableECSManagedTags=True,
+        propagateTags='NONE',
+        enableExecuteCommand=False,
+        deploymentController={
+            'type': 'CODE_DEPLOY'
+        },
+    )
+
+
+def service_changes(service, spec):
+    """
+    :param service: service as returned by describe_services
+    :param spec: create_service arguments
+    :return: set of the spec fields the service differs in
+    """
+    changes = set()
+    for field in IMMUTABLE_SERVICE_FIELDS + UPDATABLE_SERVICE_FIELDS:
+        if field == 'taskDefinition':
+            if service.get('taskDefinition') != task_definition_arn(spec['taskDefinition']):
+                changes.add(field)
+        elif _differs(service.get(field), spec[field]):
+            changes.add(field)
+    return changes
+
+
+def plan_changes(spec, changes):
+    """
+    Split the changed fields of a service by how they reach it.
+    :param spec: create_service arguments
+    :param changes: set, see service_changes
+    :return: sets of the fields that recreate the service, that a CodeDeploy deployment rolls out and that
+             update_service changes
+    """
+    if spec['deploymentController']['type'] != 'CODE_DEPLOY':
+        return changes & set(IMMUTABLE_SERVICE_FIELDS), set(), changes - set(IMMUTABLE_SERVICE_FIELDS)
+    deployed = changes & set(CODE_DEPLOY_SERVICE_FIELDS)
+    updated = changes & set(CODE_DEPLOY_UPDATABLE_FIELDS)
+    return changes - deployed - updated, deployed, updated
+
+
+def _check_code_deploy(serviceName, fields, codeDeployApplication, codeDeployDeploymentGroup):
+    if not (codeDeployApplication and codeDeployDeploymentGroup):
+        raise ValueError('Fields %s of service [%s] only change through a CodeDeploy deployment, give its '
+                         'codeDeployApplication and codeDeployDeploymentGroup.' % (sorted(fields), serviceName))
+
+
+def _differs(current, desired):
+    """
+    Compare only what the spec sets, describe calls return extra keys and unordered lists.
+    """
+    if isinstance(desired, dict):
+        current = current or {}
+        return any(_differs(current.get(k), v) for k, v in desired.items())
+    if isinstance(desired, list):
+        current = current or []
+        if len(current) != len(desired):
+            return True
+        if all(isinstance(v, str) for v in desired):
+            return sorted(current) != sorted(desired)
+        return any(_differs(c, d) for c, d in zip(current, desired))
+    return current != desired
+
+
+def task_definition_arn(taskDefinition):
+    """
+    :param taskDefinition: family, family:revision or ARN
+    :return: ARN of the task definition, the latest ACTIVE revision for a family
+    """
+    return aio.drive(_task_definition_arn(client, taskDefinition))
+
+
+def create_service(spec):
+    aio.drive(_create_service(client, spec))
+
+
+def recreate_service(spec):
+    aio.drive(_recreate_service(client, spec))
+
+
+def update_service(cluster, serviceName, changes):
+    aio.drive(_update_service(client, cluster, serviceName, changes))
+
+
+def _service_found(cluster, serviceName):
+    """
+    :return: poller.wait arguments of a single describe
+    """
+    return dict(kind='ecs.service', key=(cluster, serviceName), condition=lambda service: True,
+                resource='Service [%s]' % serviceName)
 
 
 def describe_service(cluster, serviceName):
@@ -178,28 +312,242 @@ def describe_service(cluster, serviceName):
 
 
 def delete_service(cluster, serviceName):
+    aio.drive(_delete_service(client, cluster, serviceName))
+
+
+def describe_services_batch(keys):
+    """
+    :param keys: [(cluster, serviceName)]
+    :return: {(cluster, serviceName): service}
+    """
+    by_cluster = {}
+    for cluster, serviceName in keys:
+        by_cluster.setdefault(cluster, []).append(serviceName)
+    items = {}
+    for cluster, names in by_cluster.items():
+        try:
+            response = client.describe_services(cluster=cluster, services=names)
+        except client.exceptions.ClusterNotFoundException:
+            # A deleted cluster has no service left, the keys are reported as missing.
+            continue
+        for svc in response.get('services'):
+            items[(cluster, svc['serviceName'])] = svc
+    return items
+
+
+poller.register_kind('ecs.service', describe_services_batch, batch_size=10)
+
+
+def wait_service_deleted(cluster, serviceName):
+    poller.wait(**_service_deleted(cluster, serviceName))
+
+
+def _service_deleted(cluster, serviceName):
+    """
+    :return: poller.wait arguments
+    """
+    def _status(service):
+        return service.get('status') if service else None
+
+    def _check(service):
+        status = _status(service)
+        if status is None or status == 'INACTIVE':
+            return True
+        logger.info('Service [%s] deletion is not complete, waiting...', serviceName)
+        return False
+
+    return dict(kind='ecs.service', key=(cluster, serviceName), condition=_check,
+                resource='Service [%s]' % serviceName, state=_status)
+
+
+def delete_cluster(clusterName):
+    aio.drive(_delete_cluster(client, clusterName))
+
+
+def deregister_task_definitions(family):
+    paginator = client.get_paginator('list_task_definitions')
+    for page in paginator.paginate(familyPrefix=family, status='ACTIVE'):
+        for arn in page['taskDefinitionArns']:
+            client.deregister_task_definition(taskDefinition=arn)
+            logger.info('TaskDefinition [%s] deregistered successfully.', arn)
+
+
+@state.drift_check(create_cluster)
+def _cluster_exists(arguments, outputs):
+    return _cluster_active(inventory.find(inventory.CLUSTER, arguments['clusterName']))
+
+
+@state.drift_check(deploy_service)
+def _service_unchanged(arguments, outputs):
+    # Only what the template decides, a service updated by hand is not rolled back.
+    service = inventory.find(inventory.SERVICE, (arguments['cluster'], arguments['serviceName']))
+    return (service is not None and service.get('status') == 'ACTIVE'
+            and service.get('taskDefinition') == arguments['taskDefinition'])
+
+
+@aio.implements(create_cluster)
+async def create_cluster_async(clusterName):
+    await aio.drive_async(_create_cluster(await aio.client('ecs'), clusterName))
+
+
+@aio.implements(register_task_definition)
+async def register_task_definition_async(family, SQLALCHEMY_DATABASE_URI, repositoryUri, imageTag='v1.0',
+                                         containerName='mypoc', containerPort=80):
+    return await aio.drive_async(_register_task_definition(await aio.client('ecs'), family, SQLALCHEMY_DATABASE_URI,
+                                                           repositoryUri, imageTag, containerName, containerPort))
+
+
+@aio.implements(deploy_service)
+async def deploy_service_async(cluster, serviceName, taskDefinition, SubnetIds, VpcSecurityGroupIds, TargetGroupArn,
+                               codeDeployApplication=None, codeDeployDeploymentGroup=None, containerName='mypoc',
+                               containerPort=80):
+    spec = service_spec(cluster, serviceName, taskDefinition, SubnetIds, VpcSecurityGroupIds, TargetGroupArn,
+                        containerName, containerPort)
+    await aio.drive_async(_deploy_service(await aio.client('ecs'), spec, codeDeployApplication,
+                                          codeDeployDeploymentGroup))
+
+
+@aio.implements(delete_service)
+async def delete_service_async(cluster, serviceName):
+    await aio.drive_async(_delete_service(await aio.client('ecs'), cluster, serviceName))
+
+
+@aio.implements(wait_service_deleted)
+async def wait_service_deleted_async(cluster, serviceName):
+    await aio.wait(**_service_deleted(cluster, serviceName))
+
+
+@aio.implements(delete_cluster)
+async def delete_cluster_async(clusterName):
+    await aio.drive_async(_delete_cluster(await aio.client('ecs'), clusterName))
+
+
+def _create_cluster(ecs, clusterName):
+    if _cluster_active(inventory.find(inventory.CLUSTER, clusterName, aio.current_region())):
+        logger.info('Cluster [%s] already exists, do nothing.', clusterName)
+        return
+    yield ecs.create_cluster(**cluster_params(clusterName))
+    logger.info('Cluster [%s] created successfully.', clusterName)
+
+
+def _register_task_definition(ecs, family, SQLALCHEMY_DATABASE_URI, repositoryUri, imageTag, containerName,
+                              containerPort):
+    params = task_definition_params(family, SQLALCHEMY_DATABASE_URI, repositoryUri, imageTag, ecs.meta.region_name,
+                                    containerName, containerPort)
+    content_hash = task_definition_hash(params)
+    try:
+        latest = yield ecs.describe_task_definition(taskDefinition=family, include=['TAGS'])
+    except ecs.exceptions.ClientException:
+        # The family has no ACTIVE revision.
+        latest = None
+    arn = _revision_with_hash(latest, content_hash)
+    if arn is not None:
+        logger.info('TaskDefinition [%s] is up to date, reuse [%s].', family, arn)
+        return arn
     try:
-        client.delete_service(
+        response = yield ecs.register_task_definition(tags=[{'key': CONTENT_HASH_TAG, 'value': content_hash}],
+                                                      **params)
+        logger.info('TaskDefinition [%s] registered successfully.', family)
+    except botocore_exceptions.ClientError:
+        logger.info('TaskDefinition [%s] registered failed.', family, exc_info=True)
+        raise
+    return response['taskDefinition']['taskDefinitionArn']
+
+
+def _deploy_service(ecs, spec, codeDeployApplication, codeDeployDeploymentGroup):
+    """
+    :param spec: create_service arguments, see service_spec
+    """
+    cluster, serviceName = spec['cluster'], spec['serviceName']
+    try:
+        service = yield from _find_service(cluster, serviceName)
+        if service is None or service.get('status') == 'INACTIVE':
+            yield from _create_service(ecs, spec)
+            return
+        if service.get('status') == 'DRAINING':
+            logger.info('Service [%s] is draining, wait for it to be deleted.', serviceName)
+            yield aio.Wait(**_service_deleted(cluster, serviceName))
+            yield from _create_service(ecs, spec)
+            return
+
+        # Resolved once, comparing the spec with the service and deploying it make no more call.
+        spec['taskDefinition'] = yield from _task_definition_arn(ecs, spec['taskDefinition'])
+        changes = service_changes(service, spec)
+        if not changes:
+            logger.info('Service [%s] is up to date, do nothing.', serviceName)
+            return
+        recreated, deployed, updated = plan_changes(spec, changes)
+        if recreated:
+            logger.info('Fields %s of service [%s] can not change in place, recreate it.', sorted(recreated),
+                        serviceName)
+            yield from _recreate_service(ecs, spec)
+            return
+        if deployed:
+            _check_code_deploy(serviceName, deployed, codeDeployApplication, codeDeployDeploymentGroup)
+            deploymentId = yield aio.Blocking(codedeploy.create_deployment, codeDeployApplication,
+                                              codeDeployDeploymentGroup, spec, spec['taskDefinition'])
+            yield aio.Wait(**codedeploy.deployment_done(deploymentId))
+        if updated:
+            yield from _update_service(ecs, cluster, serviceName, {f: spec[f] for f in updated})
+    except botocore_exceptions.ClientError:
+        logger.info('Service [%s] created failed.', serviceName, exc_info=True)
+        raise
+
+
+def _task_definition_arn(ecs, taskDefinition):
+    if taskDefinition.startswith('arn:'):
+        return taskDefinition
+    response = yield ecs.describe_task_definition(taskDefinition=taskDefinition)
+    return response['taskDefinition']['taskDefinitionArn']
+
+
+def _find_service(cluster, serviceName):
+    """
+    :return: service of the inventory snapshot, or of describe_services without one, None when there is none
+    """
+    if inventory.current(aio.current_region()) is not None:
+        return inventory.find(inventory.SERVICE, (cluster, serviceName), aio.current_region())
+    # One poll of the shared poller, the services looked up at the same time are described 10 per call.
+    return (yield aio.Wait(**_service_found(cluster, serviceName)))
+
+
+def _create_service(ecs, spec):
+    yield ecs.create_service(**spec)
+    logger.info('Service [%s] created successfully.', spec['serviceName'])
+
+
+def _recreate_service(ecs, spec):
+    yield from _delete_service(ecs, spec['cluster'], spec['serviceName'])
+    yield aio.Wait(**_service_deleted(spec['cluster'], spec['serviceName']))
+    yield from _create_service(ecs, spec)
+
+
+def _update_service(ecs, cluster, serviceName, changes):
+    yield ecs.update_service(cluster=cluster, service=serviceName, **changes)
+    logger.info('Service [%s] updated in place, changed fields: %s.', serviceName, sorted(changes))
+
+
+def _delete_service(ecs, cluster, serviceName):
+    try:
+        yield ecs.delete_service(
             cluster=cluster,
             service=serviceName,
             force=True
         )
-
         logger.info('Service [%s] deletion request was submitted successfully.', serviceName)
-    except ClientError:
+    except (ecs.exceptions.ServiceNotFoundException, ecs.exceptions.ClusterNotFoundException):
+        logger.info('Service [%s] does not exist, do nothing.', serviceName)
+    except botocore_exceptions.ClientError:
         logger.info('Service [%s] deleted failed.', serviceName, exc_info=True)
         raise
 
 
-def wait_service_deleted(cluster, serviceName):
-    def _check(response):
-        services = response.get('services')
-        if not services:
-            return True
-        status = services.pop().get('status')
-        if status == 'INACTIVE':
-            return True
-        logger.info('Service [%s] deletion is not complete, waiting...', serviceName)
-        return False
-
-    utils.blocked_until(lambda: describe_service(cluster, serviceName), _check, sleep_time=20, timeout=300)
+def _delete_cluster(ecs, clusterName):
+    try:
+        yield ecs.delete_cluster(cluster=clusterName)
+        logger.info('Cluster [%s] deleted successfully.', clusterName)
+    except ecs.exceptions.ClusterNotFoundException:
+        logger.info('Cluster [%s] does not exist, do nothing.', clusterName)
+    except botocore_exceptions.ClientError:
+        logger.info('Cluster [%s] deleted failed.', clusterName, exc_info=True)
+        raise
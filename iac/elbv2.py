@@ -1,50 +1,60 @@
 import logging
 
-import boto3
-from botocore.exceptions import ClientError
+from iac import aio, clients, inventory, poller, state, utils
 
-from iac import CONFIG, utils
+botocore_exceptions = utils.lazy_import('botocore.exceptions')
+task = utils.lazy_import('taskflow.task')
+graph_flow = utils.lazy_import('taskflow.patterns.graph_flow')
 
 logger = logging.getLogger(__name__)
 
-client = boto3.client('elbv2', config=CONFIG)
+client = clients.lazy('elbv2')
 
 
 def create_load_balancer(LBName, Subnets, SecurityGroups) -> str:
     """
     :return: LoadBalancerArn
     """
-    try:
-        client.create_load_balancer(
-            Name=LBName,
-            Subnets=Subnets,
-            SecurityGroups=SecurityGroups,
-            Scheme='internet-facing',
-            Type='application',
-            IpAddressType='ipv4',
-        )
-        logger.info('LoadBalancer [%s] created successfully.', LBName)
-    except client.exceptions.DuplicateLoadBalancerNameException:
-        logger.info('LoadBalancer [%s] already exists, do nothing.', LBName)
-    except ClientError:
-        logger.info('LoadBalancer [%s] created failed.', LBName, exc_info=True)
-        raise
-    return describe_load_balancer(LBName).get('LoadBalancerArn')
+    return aio.drive(_create_load_balancer(client, LBName, Subnets, SecurityGroups))
 
 
 def describe_load_balancer(LBName):
-    response = client.describe_load_balancers(
-        Names=[
-            LBName,
-        ]
-    )
-    lbs = response.get('LoadBalancers')
-    return lbs.pop() if lbs else None
+    return next(utils.paginate(client, 'describe_load_balancers', 'LoadBalancers', Names=[LBName]), None)
+
+
+def describe_load_balancers_batch(LBNames):
+    """
+    :return: {LBName: LoadBalancer}
+    """
+    try:
+        lbs = list(utils.paginate(client, 'describe_load_balancers', 'LoadBalancers', Names=LBNames))
+    except client.exceptions.LoadBalancerNotFoundException:
+        if len(LBNames) == 1:
+            return {}
+        # One unknown name fails the whole call, fall back to one call per name.
+        items = {}
+        for name in LBNames:
+            items.update(describe_load_balancers_batch([name]))
+        return items
+    return {lb['LoadBalancerName']: lb for lb in lbs}
+
+
+poller.register_kind('elbv2.load_balancer', describe_load_balancers_batch, batch_size=20)
 
 
 def wait_lb_active(LBName):
+    aio.drive(_wait_lb_active(LBName))
+
+
+def _lb_active(LBName):
+    """
+    :return: poller.wait arguments
+    """
+    def _status(lb):
+        return lb.get('State').get('Code') if lb else None
+
     def _check(lb):
-        status = lb.get('State').get('Code')
+        status = _status(lb)
         if status != 'active':
             logger.info('Waiting for the LB [%s] to become active, current status: [%s].',
                         LBName, status)
@@ -52,15 +62,283 @@ def wait_lb_active(LBName):
         logger.info('LB [%s] is now available.', LBName)
         return True
 
-    utils.blocked_until(lambda: describe_load_balancer(LBName), _check)
+    return dict(kind='elbv2.load_balancer', key=LBName, condition=_check, resource='LB [%s]' % LBName,
+                state=_status)
 
 
 def create_target_group(TargetGroupName, TargetGroupPort, VpcId) -> str:
     """
     :return: TargetGroupArn
     """
+    return aio.drive(_create_target_group(client, TargetGroupName, TargetGroupPort, VpcId))
+
+
+def describe_target_group(TargetGroupName):
+    return next(utils.paginate(client, 'describe_target_groups', 'TargetGroups', Names=[TargetGroupName]), None)
+
+
+def create_listener(LoadBalancerArn, TargetGroupArn) -> str:
+    """
+    HTTP listener of an ALB serving a single service.
+    :return: ListenerArn
+    """
+    return aio.drive(_create_listener(client, listener_params(LoadBalancerArn, TargetGroupArn)))
+
+
+def listener_params(LoadBalancerArn, TargetGroupArn):
+    """
+    :return: create_listener arguments
+    """
+    return dict(
+        LoadBalancerArn=LoadBalancerArn,
+        Protocol='HTTP',
+        Port=80,
+        DefaultActions=[
+            {
+                'Type': 'forward',
+                'TargetGroupArn': TargetGroupArn,
+                'Order': 1,
+                'ForwardConfig': {
+                    'TargetGroups': [
+                        {
+                            'TargetGroupArn': TargetGroupArn,
+                            'Weight': 1
+                        },
+                    ],
+                    'TargetGroupStickinessConfig': {
+                        'Enabled': False,
+                        'DurationSeconds': 3600
+                    }
+                }
+            },
+        ],
+    )
+
+
+def create_routing_listener(LoadBalancerArn) -> str:
+    """
+    HTTP listener of an ALB shared by several services, each routed by its own rule, see create_listener_rule.
+    :return: ListenerArn
+    """
+    return aio.drive(_create_listener(client, routing_listener_params(LoadBalancerArn)))
+
+
+def routing_listener_params(LoadBalancerArn):
+    """
+    :return: create_listener arguments, a request no rule matches gets a 404
+    """
+    return dict(
+        LoadBalancerArn=LoadBalancerArn,
+        Protocol='HTTP',
+        Port=80,
+        DefaultActions=[
+            {
+                'Type': 'fixed-response',
+                'Order': 1,
+                'FixedResponseConfig': {
+                    'StatusCode': '404',
+                    'ContentType': 'text/plain',
+                    'MessageBody': 'Not Found',
+                },
+            },
+        ],
+    )
+
+
+def create_listener_rule(ListenerArn, TargetGroupArn, pathPattern, priority, GreenTargetGroupArn=None):
+    """
+    Forward the requests of the path pattern to the target group, a rule already at the priority is brought to it.
+    :param pathPattern: str, like '/api/*'
+    :param priority: int, 1 to 50000, unique per listener
+    :param GreenTargetGroupArn: str, twin of the target group a CodeDeploy deployment swaps the rule to, a rule
+                                forwarding to it is left as is
+    """
+    aio.drive(_create_listener_rule(client, ListenerArn, TargetGroupArn, pathPattern, priority,
+                                    GreenTargetGroupArn))
+
+
+def listener_rule_params(ListenerArn, TargetGroupArn, pathPattern, priority):
+    """
+    :return: create_rule arguments
+    """
+    return dict(
+        ListenerArn=ListenerArn,
+        Priority=priority,
+        Conditions=[
+            {
+                'Field': 'path-pattern',
+                'PathPatternConfig': {'Values': [pathPattern]},
+            },
+        ],
+        Actions=[
+            {
+                'Type': 'forward',
+                'TargetGroupArn': TargetGroupArn,
+                'Order': 1,
+            },
+        ],
+    )
+
+
+def _rule_matches(rule, params, GreenTargetGroupArn=None):
+    """
+    :param rule: rule as returned by describe_rules
+    :param params: create_rule arguments
+    :param GreenTargetGroupArn: str, target group the rule may forward to instead, see create_listener_rule
+    :return: bool, the rule routes the same paths to the same target group
+    """
+    def _paths(conditions):
+        return sorted(v for c in conditions if c.get('Field') == 'path-pattern'
+                      for v in (c.get('PathPatternConfig') or {}).get('Values') or c.get('Values') or [])
+
+    def _targets(actions):
+        return sorted(a.get('TargetGroupArn') or '' for a in actions)
+
+    if _paths(rule.get('Conditions', [])) != _paths(params['Conditions']):
+        return False
+    targets = _targets(rule.get('Actions', []))
+    return targets == _targets(params['Actions']) or (GreenTargetGroupArn is not None
+                                                      and targets == [GreenTargetGroupArn])
+
+
+def delete_listeners(LBName):
+    aio.drive(_delete_listeners(client, LBName))
+
+
+def delete_load_balancer(LBName):
+    aio.drive(_delete_load_balancer(client, LBName))
+
+
+def delete_target_group(TargetGroupName):
+    aio.drive(_delete_target_group(client, TargetGroupName))
+
+
+@state.drift_check(create_load_balancer)
+def _load_balancer_exists(arguments, outputs):
+    lb = inventory.find(inventory.LOAD_BALANCER, arguments['LBName'])
+    return lb is not None and lb['LoadBalancerArn'] == outputs
+
+
+@state.drift_check(create_target_group)
+def _target_group_exists(arguments, outputs):
+    tg = inventory.find(inventory.TARGET_GROUP, arguments['TargetGroupName'])
+    return tg is not None and tg['TargetGroupArn'] == outputs
+
+
+@state.drift_check(create_listener)
+def _listener_exists(arguments, outputs):
+    params = listener_params(arguments['LoadBalancerArn'], arguments['TargetGroupArn'])
+    listener = inventory.find(inventory.LISTENER, (arguments['LoadBalancerArn'], params['Port']))
+    return listener is not None and listener['ListenerArn'] == outputs
+
+
+@state.drift_check(create_routing_listener)
+def _routing_listener_exists(arguments, outputs):
+    params = routing_listener_params(arguments['LoadBalancerArn'])
+    listener = inventory.find(inventory.LISTENER, (arguments['LoadBalancerArn'], params['Port']))
+    return listener is not None and listener['ListenerArn'] == outputs
+
+
+@aio.implements(create_load_balancer)
+async def create_load_balancer_async(LBName, Subnets, SecurityGroups) -> str:
+    return await aio.drive_async(_create_load_balancer(await aio.client('elbv2'), LBName, Subnets, SecurityGroups))
+
+
+@aio.implements(wait_lb_active)
+async def wait_lb_active_async(LBName):
+    await aio.drive_async(_wait_lb_active(LBName))
+
+
+@aio.implements(create_target_group)
+async def create_target_group_async(TargetGroupName, TargetGroupPort, VpcId) -> str:
+    return await aio.drive_async(_create_target_group(await aio.client('elbv2'), TargetGroupName, TargetGroupPort,
+                                                      VpcId))
+
+
+@aio.implements(create_listener)
+async def create_listener_async(LoadBalancerArn, TargetGroupArn) -> str:
+    return await aio.drive_async(_create_listener(await aio.client('elbv2'),
+                                                  listener_params(LoadBalancerArn, TargetGroupArn)))
+
+
+@aio.implements(create_routing_listener)
+async def create_routing_listener_async(LoadBalancerArn) -> str:
+    return await aio.drive_async(_create_listener(await aio.client('elbv2'),
+                                                  routing_listener_params(LoadBalancerArn)))
+
+
+@aio.implements(create_listener_rule)
+async def create_listener_rule_async(ListenerArn, TargetGroupArn, pathPattern, priority, GreenTargetGroupArn=None):
+    await aio.drive_async(_create_listener_rule(await aio.client('elbv2'), ListenerArn, TargetGroupArn, pathPattern,
+                                                priority, GreenTargetGroupArn))
+
+
+@aio.implements(delete_listeners)
+async def delete_listeners_async(LBName):
+    await aio.drive_async(_delete_listeners(await aio.client('elbv2'), LBName))
+
+
+@aio.implements(delete_load_balancer)
+async def delete_load_balancer_async(LBName):
+    await aio.drive_async(_delete_load_balancer(await aio.client('elbv2'), LBName))
+
+
+@aio.implements(delete_target_group)
+async def delete_target_group_async(TargetGroupName):
+    await aio.drive_async(_delete_target_group(await aio.client('elbv2'), TargetGroupName))
+
+
+def _create_load_balancer(elbv2, LBName, Subnets, SecurityGroups):
+    lb = inventory.find(inventory.LOAD_BALANCER, LBName, aio.current_region())
+    if lb is not None:
+        logger.info('LoadBalancer [%s] already exists, do nothing.', LBName)
+        return lb['LoadBalancerArn']
+    try:
+        response = yield elbv2.create_load_balancer(
+            Name=LBName,
+            Subnets=Subnets,
+            SecurityGroups=SecurityGroups,
+            Scheme='internet-facing',
+            Type='application',
+            IpAddressType='ipv4',
+        )
+        logger.info('LoadBalancer [%s] created successfully.', LBName)
+    except elbv2.exceptions.DuplicateLoadBalancerNameException:
+        logger.info('LoadBalancer [%s] already exists, do nothing.', LBName)
+        return (yield from _describe_load_balancer(elbv2, LBName))['LoadBalancerArn']
+    except botocore_exceptions.ClientError:
+        logger.info('LoadBalancer [%s] created failed.', LBName, exc_info=True)
+        raise
+    lb = response['LoadBalancers'][0]
+    inventory.record(inventory.LOAD_BALANCER, LBName, lb, lb['LoadBalancerArn'], aio.current_region())
+    return lb['LoadBalancerArn']
+
+
+def _describe_load_balancer(elbv2, LBName):
+    """
+    :return: LoadBalancer, None when it does not exist
+    """
     try:
-        client.create_target_group(
+        lbs = yield aio.Paginate(elbv2, 'describe_load_balancers', 'LoadBalancers', Names=[LBName])
+    except elbv2.exceptions.LoadBalancerNotFoundException:
+        return None
+    return lbs[0] if lbs else None
+
+
+def _wait_lb_active(LBName):
+    wait = _lb_active(LBName)
+    lb = inventory.find(inventory.LOAD_BALANCER, LBName, aio.current_region())
+    if lb is None or not wait['condition'](lb):
+        yield aio.Wait(**wait)
+
+
+def _create_target_group(elbv2, TargetGroupName, TargetGroupPort, VpcId):
+    tg = inventory.find(inventory.TARGET_GROUP, TargetGroupName, aio.current_region())
+    if tg is not None:
+        logger.info('TargetGroup [%s] already exists, do nothing.', TargetGroupName)
+        return tg['TargetGroupArn']
+    try:
+        response = yield elbv2.create_target_group(
             Name=TargetGroupName,
             Protocol='HTTP',
             ProtocolVersion='HTTP1',
@@ -70,53 +348,131 @@ def create_target_group(TargetGroupName, TargetGroupPort, VpcId) -> str:
             TargetType='ip',
         )
         logger.info('TargetGroup [%s] created successfully.', TargetGroupName)
-    except client.exceptions.DuplicateTargetGroupNameException:
+    except elbv2.exceptions.DuplicateTargetGroupNameException:
         logger.info('TargetGroup [%s] already exists, do nothing.', TargetGroupName)
-    except ClientError:
+        return (yield from _describe_target_group(elbv2, TargetGroupName))['TargetGroupArn']
+    except botocore_exceptions.ClientError:
         logger.info('TargetGroup [%s] created failed.', TargetGroupName, exc_info=True)
         raise
-    return describe_target_group(TargetGroupName).get('TargetGroupArn')
+    tg = response['TargetGroups'][0]
+    inventory.record(inventory.TARGET_GROUP, TargetGroupName, tg, tg['TargetGroupArn'], aio.current_region())
+    return tg['TargetGroupArn']
 
 
-def describe_target_group(TargetGroupName):
-    response = client.describe_target_groups(
-        Names=[
-            TargetGroupName,
-        ]
-    )
-    tgs = response.get('TargetGroups')
-    return tgs.pop() if tgs else None
+def _describe_target_group(elbv2, TargetGroupName):
+    tgs = yield aio.Paginate(elbv2, 'describe_target_groups', 'TargetGroups', Names=[TargetGroupName])
+    return tgs[0] if tgs else None
 
 
-def create_listener(LoadBalancerArn, TargetGroupArn):
+def _create_listener(elbv2, params):
+    """
+    :param params: create_listener arguments, see listener_params and routing_listener_params
+    """
+    listener = inventory.find(inventory.LISTENER, (params['LoadBalancerArn'], params['Port']), aio.current_region())
+    if listener is not None:
+        logger.info('Listener already exists, do nothing.')
+        return listener['ListenerArn']
     try:
-        client.create_listener(
-            LoadBalancerArn=LoadBalancerArn,
-            Protocol='HTTP',
-            Port=80,
-            DefaultActions=[
-                {
-                    'Type': 'forward',
-                    'TargetGroupArn': TargetGroupArn,
-                    'Order': 1,
-                    'ForwardConfig': {
-                        'TargetGroups': [
-                            {
-                                'TargetGroupArn': TargetGroupArn,
-                                'Weight': 1
-                            },
-                        ],
-                        'TargetGroupStickinessConfig': {
-                            'Enabled': False,
-                            'DurationSeconds': 3600
-                        }
-                    }
-                },
-            ],
-        )
+        response = yield elbv2.create_listener(**params)
         logger.info('Listener created successfully.')
-    except client.exceptions.DuplicateListenerException:
+    except elbv2.exceptions.DuplicateListenerException:
         logger.info('Listener already exists, do nothing.')
-    except ClientError:
+        listeners = yield aio.Paginate(elbv2, 'describe_listeners', 'Listeners',
+                                       LoadBalancerArn=params['LoadBalancerArn'])
+        return next(l for l in listeners if l['Port'] == params['Port'])['ListenerArn']
+    except botocore_exceptions.ClientError:
         logger.info('Listener created failed.', exc_info=True)
         raise
+    listener = response['Listeners'][0]
+    inventory.record(inventory.LISTENER, (params['LoadBalancerArn'], params['Port']), listener,
+                     listener['ListenerArn'], aio.current_region())
+    return listener['ListenerArn']
+
+
+def _create_listener_rule(elbv2, ListenerArn, TargetGroupArn, pathPattern, priority, GreenTargetGroupArn):
+    params = listener_rule_params(ListenerArn, TargetGroupArn, pathPattern, priority)
+    try:
+        yield elbv2.create_rule(**params)
+        logger.info('Listener rule [%s] created successfully.', pathPattern)
+        return
+    except elbv2.exceptions.PriorityInUseException:
+        rules = yield aio.Paginate(elbv2, 'describe_rules', 'Rules', ListenerArn=ListenerArn)
+        rule = next(r for r in rules if r['Priority'] == str(priority))
+    except botocore_exceptions.ClientError:
+        logger.info('Listener rule [%s] created failed.', pathPattern, exc_info=True)
+        raise
+    if _rule_matches(rule, params, GreenTargetGroupArn):
+        logger.info('Listener rule [%s] already exists, do nothing.', pathPattern)
+        return
+    yield elbv2.modify_rule(RuleArn=rule['RuleArn'], Conditions=params['Conditions'], Actions=params['Actions'])
+    logger.info('Listener rule [%s] at priority [%s] modified successfully.', pathPattern, priority)
+
+
+def _delete_listeners(elbv2, LBName):
+    lb = yield from _describe_load_balancer(elbv2, LBName)
+    if lb is None:
+        logger.info('LoadBalancer [%s] does not exist, no listener to delete.', LBName)
+        return
+    # Listed before deleting, deletions would shift the pages.
+    listeners = yield aio.Paginate(elbv2, 'describe_listeners', 'Listeners', LoadBalancerArn=lb['LoadBalancerArn'])
+    for listener in listeners:
+        try:
+            yield elbv2.delete_listener(ListenerArn=listener['ListenerArn'])
+            logger.info('Listener [%s] deleted successfully.', listener['ListenerArn'])
+        except elbv2.exceptions.ListenerNotFoundException:
+            logger.info('Listener [%s] does not exist, do nothing.', listener['ListenerArn'])
+
+
+def _delete_load_balancer(elbv2, LBName):
+    lb = yield from _describe_load_balancer(elbv2, LBName)
+    if lb is None:
+        logger.info('LoadBalancer [%s] does not exist, do nothing.', LBName)
+        return
+    yield elbv2.delete_load_balancer(LoadBalancerArn=lb['LoadBalancerArn'])
+    logger.info('LoadBalancer [%s] deleted successfully.', LBName)
+
+
+def _delete_target_group(elbv2, TargetGroupName):
+    try:
+        tg = yield from _describe_target_group(elbv2, TargetGroupName)
+    except elbv2.exceptions.TargetGroupNotFoundException:
+        logger.info('TargetGroup [%s] does not exist, do nothing.', TargetGroupName)
+        return
+    try:
+        yield elbv2.delete_target_group(TargetGroupArn=tg['TargetGroupArn'])
+        logger.info('TargetGroup [%s] deleted successfully.', TargetGroupName)
+    except botocore_exceptions.ClientError:
+        logger.info('TargetGroup [%s] deleted failed.', TargetGroupName, exc_info=True)
+        raise
+
+
+def flow_create_alb() -> 'graph_flow.Flow':
+    """
+    The target group and the load balancer are created in parallel, the listener waits for both.
+    requires: TargetGroupName, TargetGroupPort, VpcId, LBName, SubnetIds, VpcSecurityGroupIds
+    provides: TargetGroupArn, LoadBalancerArn
+    """
+    flow = graph_flow.Flow('create_alb')
+    flow.add(
+        task.FunctorTask(execute=create_target_group, provides='TargetGroupArn'),
+        task.FunctorTask(execute=create_load_balancer, provides='LoadBalancerArn',
+                         rebind=['LBName', 'SubnetIds', 'VpcSecurityGroupIds']),
+        task.FunctorTask(execute=create_listener),
+    )
+    return flow
+
+
+def flow_delete_alb() -> 'graph_flow.Flow':
+    """
+    The listener goes first, then the load balancer and the target group in parallel.
+    requires: LBName, TargetGroupName
+    provides:
+    """
+    task_delete_listeners = task.FunctorTask(execute=delete_listeners)
+    task_delete_lb = task.FunctorTask(execute=delete_load_balancer)
+    task_delete_tg = task.FunctorTask(execute=delete_target_group)
+    flow = graph_flow.Flow('delete_alb')
+    flow.add(task_delete_listeners, task_delete_lb, task_delete_tg)
+    flow.link(task_delete_listeners, task_delete_lb)
+    flow.link(task_delete_listeners, task_delete_tg)
+    return flow
@@ -0,0 +1,200 @@
+"""
+Snapshot of the resources of a region, loaded in bulk once at the start of a run.
+
+A few paginated calls per service list every ECR repository, ECS cluster and service, ELBv2 load balancer, target
+group and listener, RDS instance and subnet group of the region. While the snapshot is active, see snapshot, the
+create tasks look resources up in it instead of describing them one by one, and skip the creates of the ones that
+already exist. Without a snapshot, find returns None and the tasks fall back to their own calls. A lazy snapshot
+is loaded by its first lookup instead, a run whose tasks are all skipped, see iac.state, then makes no call.
+"""
+import contextlib
+import logging
+import threading
+from concurrent import futures
+
+from iac import clients, settings, utils
+
+logger = logging.getLogger(__name__)
+
+REPOSITORY = 'ecr.repository'
+CLUSTER = 'ecs.cluster'
+# Named (clusterName, serviceName).
+SERVICE = 'ecs.service'
+LOAD_BALANCER = 'elbv2.load_balancer'
+TARGET_GROUP = 'elbv2.target_group'
+# Named (LoadBalancerArn, Port).
+LISTENER = 'elbv2.listener'
+DB_INSTANCE = 'rds.db_instance'
+DB_SUBNET_GROUP = 'rds.db_subnet_group'
+
+
+class Inventory(object):
+    """
+    Thread-safe index of the resources of one region by (kind, name) and by ARN.
+    """
+
+    def __init__(self, region=None):
+        self.region = region
+        self._by_name = {}
+        self._by_arn = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """
+        List the resources of the region, one thread per service, once.
+        :return: self
+        """
+        with self._load_lock:
+            if not self._loaded:
+                with futures.ThreadPoolExecutor(len(LOADERS), thread_name_prefix='iac-inventory') as executor:
+                    for f in [executor.submit(loader, self, self.region) for loader in LOADERS]:
+                        f.result()
+                self._loaded = True
+                logger.info('Inventory of region [%s] loaded, %d resources.', self.region or 'default', len(self))
+        return self
+
+    def add(self, kind, name, item, arn=None):
+        """
+        :param kind: str, like LOAD_BALANCER
+        :param name: str or tuple, see the kinds
+        :param item: dict, as returned by the describe call
+        :param arn: str
+        """
+        with self._lock:
+            self._by_name[(kind, name)] = item
+            if arn:
+                self._by_arn[arn] = item
+
+    def get(self, kind, name):
+        """
+        :return: item, None when the region has no such resource
+        """
+        self.load()
+        with self._lock:
+            return self._by_name.get((kind, name))
+
+    def get_arn(self, arn):
+        """
+        :return: item, None when the region has no such resource
+        """
+        self.load()
+        with self._lock:
+            return self._by_arn.get(arn)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_name)
+
+
+def _load_ecr(inventory, region):
+    ecr = clients.get('ecr', region)
+    for repo in utils.paginate(ecr, 'describe_repositories', 'repositories'):
+        inventory.add(REPOSITORY, repo['repositoryName'], repo, repo['repositoryArn'])
+
+
+def _load_ecs(inventory, region):
+    ecs = clients.get('ecs', region)
+    arns = list(utils.paginate(ecs, 'list_clusters', 'clusterArns'))
+    for chunk in _chunks(arns, 100):
+        for cluster in ecs.describe_clusters(clusters=chunk).get('clusters', []):
+            inventory.add(CLUSTER, cluster['clusterName'], cluster, cluster['clusterArn'])
+            if cluster.get('status') != 'ACTIVE':
+                continue
+            services = list(utils.paginate(ecs, 'list_services', 'serviceArns', cluster=cluster['clusterArn']))
+            # describe_services takes at most 10 services.
+            for names in _chunks(services, 10):
+                for service in ecs.describe_services(cluster=cluster['clusterArn'], services=names)['services']:
+                    inventory.add(SERVICE, (cluster['clusterName'], service['serviceName']), service,
+                                  service['serviceArn'])
+
+
+def _load_elbv2(inventory, region):
+    elbv2 = clients.get('elbv2', region)
+    for tg in utils.paginate(elbv2, 'describe_target_groups', 'TargetGroups'):
+        inventory.add(TARGET_GROUP, tg['TargetGroupName'], tg, tg['TargetGroupArn'])
+    for lb in list(utils.paginate(elbv2, 'describe_load_balancers', 'LoadBalancers')):
+        inventory.add(LOAD_BALANCER, lb['LoadBalancerName'], lb, lb['LoadBalancerArn'])
+        for listener in utils.paginate(elbv2, 'describe_listeners', 'Listeners', LoadBalancerArn=lb['LoadBalancerArn']):
+            inventory.add(LISTENER, (lb['LoadBalancerArn'], listener['Port']), listener, listener['ListenerArn'])
+
+
+def _load_rds(inventory, region):
+    rds = clients.get('rds', region)
+    for instance in utils.paginate(rds, 'describe_db_instances', 'DBInstances'):
+        inventory.add(DB_INSTANCE, instance['DBInstanceIdentifier'], instance, instance.get('DBInstanceArn'))
+    for group in utils.paginate(rds, 'describe_db_subnet_groups', 'DBSubnetGroups'):
+        inventory.add(DB_SUBNET_GROUP, group['DBSubnetGroupName'], group, group.get('DBSubnetGroupArn'))
+
+
+LOADERS = (_load_ecr, _load_ecs, _load_elbv2, _load_rds)
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def load(region=None) -> Inventory:
+    """
+    :param region: str, defaults to the region of iac.CONFIG
+    :return: Inventory of the region, loaded
+    """
+    return Inventory(region).load()
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def snapshot(region=None, lazy=False):
+    """
+    Load the inventory of the region and make it the one find consults in the block, a no-op when
+    settings.INVENTORY is off.
+    :param region: str, region of the tasks of the block, see utils.current_region
+    :param lazy: bool, load it on the first lookup instead
+    :return: Inventory, None when disabled
+    """
+    if not settings.INVENTORY:
+        yield None
+        return
+    inventory = Inventory(region) if lazy else load(region)
+    with _snapshots_lock:
+        previous = _snapshots.get(region)
+        _snapshots[region] = inventory
+    try:
+        yield inventory
+    finally:
+        with _snapshots_lock:
+            if previous is None:
+                _snapshots.pop(region, None)
+            else:
+                _snapshots[region] = previous
+
+
+def current(region=None):
+    """
+    :param region: str, defaults to the region of the current task, see utils.current_region
+    :return: Inventory of the active snapshot of the region, None when there is none
+    """
+    region = region if region is not None else utils.current_region()
+    with _snapshots_lock:
+        return _snapshots.get(region)
+
+
+def find(kind, name, region=None):
+    """
+    :return: item of the active snapshot, None when it has no such resource or when there is no snapshot
+    """
+    inventory = current(region)
+    return inventory.get(kind, name) if inventory is not None else None
+
+
+def record(kind, name, item, arn=None, region=None):
+    """
+    Add a resource created or waited for during the run to the active snapshot, if any.
+    """
+    inventory = current(region)
+    if inventory is not None and item is not None:
+        inventory.add(kind, name, item, arn)
@@ -0,0 +1,109 @@
+"""
+Logging off the hot path: loggers only put records on a queue, the formatting and the console and file I/O run on
+the thread of a QueueListener. Records below settings.LOG_LEVEL are dropped by the logger before any work, the
+chatty AWS SDK loggers are held at settings.SDK_LOG_LEVEL.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+
+from iac import settings, utils
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(threadName)s %(task)s %(filename)s:%(lineno)d - %(message)s'
+
+# Loggers held at settings.SDK_LOG_LEVEL, botocore logs every request and response at DEBUG.
+SDK_LOGGERS = ('botocore', 'boto3', 'urllib3', 's3transfer', 'aiobotocore')
+
+_listener = None
+_lock = threading.Lock()
+
+
+class ContextFilter(logging.Filter):
+    """
+    Stamp records with the task and region of the thread that logs them, the listener thread formats them later.
+    """
+
+    def filter(self, record):
+        record.task = utils.current_task() or '-'
+        record.region = utils.current_region() or '-'
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, thread, task, region, location, message and exception.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'task': getattr(record, 'task', '-'),
+            'region': getattr(record, 'region', '-'),
+            'location': '%s:%d' % (record.filename, record.lineno),
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(level=None, fmt=None, log_file=None):
+    """
+    Route every record through a queue to the console handler and, when a log file is set, the rotating file
+    handler. Call it once from the entry point, importing iac never touches logging. Calling it again replaces the
+    previous setup.
+    :param level: str, like 'DEBUG', defaults to settings.LOG_LEVEL
+    :param fmt: 'text' or 'json', defaults to settings.LOG_FORMAT
+    :param log_file: str, defaults to settings.LOG_FILE, empty disables file logging
+    :return: logging.handlers.QueueListener
+    """
+    global _listener
+    level = level or settings.LOG_LEVEL
+    fmt = fmt or settings.LOG_FORMAT
+    log_file = settings.LOG_FILE if log_file is None else log_file
+    if fmt not in ('text', 'json'):
+        raise ValueError('Unknown log format [%s], expected text or json.' % fmt)
+
+    formatter = JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(ContextFilter())
+    with _lock:
+        shutdown_logging()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level.upper())
+        for name in SDK_LOGGERS:
+            logging.getLogger(name).setLevel(settings.SDK_LOG_LEVEL.upper())
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """
+    Write the queued records out and stop the listener thread, registered to run at exit.
+    """
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(shutdown_logging)
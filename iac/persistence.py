@@ -0,0 +1,121 @@
+"""
+Optional taskflow persistence, so a run that died or failed midway resumes from the failure point.
+
+settings.PERSISTENCE selects the backend: 'dir:///path/to/dir' (no extra dependency) or any taskflow connection
+URI such as 'sqlite:////path/to/iac.db' (needs SQLAlchemy). Task results, including the DB URI with the master
+password, are stored in the backend in clear text.
+"""
+import contextlib
+import logging
+import time
+import uuid
+from urllib import parse
+
+from taskflow import engines, exceptions, states
+from taskflow.listeners import base
+from taskflow.persistence import backends, models
+
+from iac import settings
+
+logger = logging.getLogger(__name__)
+
+# Atom metadata key set once the atom executed successfully, it survives the revert of a failed run.
+COMPLETED = 'iac_completed'
+
+
+def fetch_backend(uri):
+    """
+    :param uri: str, like 'dir:///var/lib/iac' or 'sqlite:////var/lib/iac/iac.db'
+    :return: taskflow persistence backend, upgraded
+    """
+    parsed = parse.urlparse(uri)
+    if parsed.scheme in ('dir', 'file'):
+        conf = {'connection': 'dir', 'path': parsed.path}
+    else:
+        conf = {'connection': uri}
+    backend = backends.fetch(conf)
+    with contextlib.closing(backend.get_connection()) as conn:
+        conn.upgrade()
+    return backend
+
+
+def load(flow, store, book_name, backend_uri=None, **options):
+    """
+    Load an engine for the flow, resuming the last unfinished run of the flow in the named logbook.
+    :param flow: taskflow flow
+    :param store: dict
+    :param book_name: str, one logbook per stack
+    :param backend_uri: str, defaults to settings.PERSISTENCE, persistence is disabled when empty
+    :param options: extra taskflow engine options
+    :return: taskflow engine
+    """
+    backend_uri = backend_uri or settings.PERSISTENCE
+    if not backend_uri:
+        return engines.load(flow, store=store, **options)
+
+    backend = fetch_backend(backend_uri)
+    with contextlib.closing(backend.get_connection()) as conn:
+        book_uuid = str(uuid.uuid5(uuid.NAMESPACE_URL, 'iac:%s' % book_name))
+        try:
+            book = conn.get_logbook(book_uuid)
+        except exceptions.NotFound:
+            book = models.LogBook(book_name, uuid=book_uuid)
+        flow_detail = _resumable_flow_detail(book, flow.name)
+        if flow_detail is None:
+            flow_detail = models.FlowDetail(flow.name, uuid=str(uuid.uuid4()))
+            flow_detail.meta = {'created_at': time.time()}
+            book.add(flow_detail)
+        else:
+            restored = _restore_completed(flow_detail)
+            logger.info('Resume flow [%s] of book [%s], reuse the results of %s.', flow.name, book_name, restored)
+        conn.save_logbook(book)
+
+    engine = engines.load(flow, store=store, book=book, flow_detail=flow_detail, backend=backend, **options)
+    CompletionListener(engine).register()
+    return engine
+
+
+def _resumable_flow_detail(book, flow_name):
+    details = sorted((fd for fd in book if fd.name == flow_name),
+                     key=lambda fd: (fd.meta or {}).get('created_at', 0))
+    if details and details[-1].state != states.SUCCESS:
+        return details[-1]
+    return None
+
+
+def _restore_completed(flow_detail):
+    """
+    A failed run reverts every atom, bring the ones that had completed back to SUCCESS so they are not run
+    again, and the others back to PENDING so they run again.
+    :return: names of the restored atoms
+    """
+    restored = []
+    for atom_detail in flow_detail:
+        if atom_detail.state == states.SUCCESS:
+            continue
+        if (atom_detail.meta or {}).get(COMPLETED):
+            atom_detail.state = states.SUCCESS
+            restored.append(atom_detail.name)
+        else:
+            atom_detail.state = states.PENDING
+            atom_detail.failure = None
+            atom_detail.revert_results = None
+            atom_detail.revert_failure = None
+        atom_detail.intention = states.EXECUTE
+    if flow_detail.state == states.REVERTED:
+        # The engine resets a REVERTED flow back to PENDING on load, which would drop the restored atoms.
+        flow_detail.state = states.RESUMING
+    return sorted(restored)
+
+
+class CompletionListener(base.Listener):
+    """
+    Marks the atoms that executed successfully in their metadata.
+    """
+
+    def __init__(self, engine):
+        super(CompletionListener, self).__init__(engine, task_listen_for=[states.SUCCESS], flow_listen_for=[],
+                                                 retry_listen_for=[])
+
+    def _task_receiver(self, state, details):
+        self._engine.storage.update_atom_metadata(details['task_name'], {COMPLETED: True})
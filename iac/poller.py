@@ -0,0 +1,218 @@
+"""
+A single background poller shared by every wait of the process.
+
+Modules register a batch describe function per resource kind, waits register a (kind, key, condition) and get a
+future back. On each tick the poller issues one batched describe call per due kind covering every pending key of that
+kind, so API calls grow with the number of kinds instead of the number of waiting tasks. A batch that fails with a
+throttle, a 5xx or a connection error is polled again later, any other error fails the waits of the batch.
+"""
+import logging
+import threading
+from concurrent import futures
+
+from iac import utils, waiter
+
+botocore_exceptions = utils.lazy_import('botocore.exceptions')
+telemetry = utils.lazy_import('iac.telemetry')
+
+logger = logging.getLogger(__name__)
+
+
+class _Kind(object):
+
+    def __init__(self, name, describe, batch_size):
+        self.name = name
+        self.describe = describe
+        self.batch_size = batch_size
+
+
+class _Wait(object):
+
+    def __init__(self, key, condition, profile, resource, state, deadline, now):
+        self.key = key
+        self.region = utils.current_region()
+        self.condition = condition
+        self.profile = profile
+        self.resource = resource
+        self.state = state
+        self.deadline = profile.deadline if deadline is None else deadline
+        self.start = now
+        self.next_poll = now
+        self.attempt = 0
+        self.future = futures.Future()
+
+
+class Poller(object):
+
+    def __init__(self):
+        self._kinds = {}
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def register_kind(self, name, describe, batch_size=10):
+        """
+        :param name: str, also the name of the waiter profile used by default
+        :param describe: [key] -> {key: item}, keys missing from the result are reported as None
+        :param batch_size: int, max number of keys per describe call
+        """
+        with self._cond:
+            self._kinds[name] = _Kind(name, describe, batch_size)
+            self._pending.setdefault(name, [])
+
+    def submit(self, kind, key, condition, profile=None, resource=None, state=None, deadline=None):
+        """
+        :param kind: str
+        :param key: hashable, resource key understood by the describe function of the kind
+        :param condition: item | None -> bool
+        :param profile: str | BackoffProfile, defaults to the profile named after the kind
+        :param resource: str, name used in logs and the timeout error
+        :param state: item | None -> object, extracts the state reported by the timeout error
+        :param deadline: float, seconds, overrides the deadline of the profile
+        :return: Future resolved with the item once the condition holds
+        """
+        profile = waiter.get_profile(profile or kind)
+        with self._cond:
+            if kind not in self._kinds:
+                raise ValueError('Unknown poller kind [%s].' % kind)
+            w = _Wait(key, condition, profile, resource or '%s [%s]' % (kind, key), state, deadline,
+                      waiter.clock.monotonic())
+            self._pending[kind].append(w)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='iac-poller', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return w.future
+
+    def wait(self, kind, key, condition, **kwargs):
+        """
+        Block until the condition holds for the resource, see submit. The calling task gives its slot back meanwhile.
+        :return: item
+        """
+        future = self.submit(kind, key, condition, **kwargs)
+        with utils.idle():
+            return future.result()
+
+    def _due(self, now):
+        return {kind: list(waits) for kind, waits in self._pending.items()
+                if any(w.next_poll <= now for w in waits)}
+
+    def _next_due_in(self, now):
+        polls = [w.next_poll for waits in self._pending.values() for w in waits]
+        return max(0.0, min(polls) - now) if polls else None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = self._due(waiter.clock.monotonic())
+                while not due:
+                    waiter.clock.wait(self._cond, self._next_due_in(waiter.clock.monotonic()))
+                    due = self._due(waiter.clock.monotonic())
+            for kind, waits in due.items():
+                try:
+                    self._poll(self._kinds[kind], waits)
+                except Exception as e:
+                    # The thread serves every wait of the process, it must outlive a bad batch.
+                    logger.exception('Polling %s failed.', kind)
+                    self._finish(self._kinds[kind], waits, e)
+
+    def _poll(self, kind, waits):
+        # Each region is described by its own clients, in batches of its pending keys.
+        items = {}
+        for region in dict.fromkeys(w.region for w in waits):
+            keys = list(dict.fromkeys(w.key for w in waits if w.region == region))
+            for i in range(0, len(keys), kind.batch_size):
+                batch = keys[i:i + kind.batch_size]
+                try:
+                    with utils.in_region(region):
+                        items.update(((region, key), item) for key, item in kind.describe(batch).items())
+                except Exception as e:
+                    failed = [w for w in waits if w.region == region and w.key in batch]
+                    waits = [w for w in waits if w not in failed]
+                    if _retryable(e):
+                        logger.info('Batched describe of %s %s failed, retry it.', kind.name, batch, exc_info=True)
+                        self._retry(kind, failed, e)
+                    else:
+                        logger.info('Batched describe of %s %s failed.', kind.name, batch, exc_info=True)
+                        self._finish(kind, failed, e)
+        now = waiter.clock.monotonic()
+        done = []
+        for w in waits:
+            item = items.get((w.region, w.key))
+            try:
+                if w.condition(item):
+                    w.future.set_result(item)
+                    done.append(w)
+                    continue
+            except Exception as e:
+                w.future.set_exception(e)
+                done.append(w)
+                continue
+            elapsed = now - w.start
+            if elapsed >= w.deadline:
+                try:
+                    error = waiter.WaiterTimeout(w.resource, elapsed, w.state(item) if w.state else item)
+                except Exception as e:
+                    error = e
+                w.future.set_exception(error)
+                done.append(w)
+            else:
+                # Every polled wait just saw a fresh state, aligning their schedules keeps later ticks batched.
+                self._schedule(w, now, elapsed)
+        self._finish(kind, done)
+
+    def _schedule(self, w, now, elapsed):
+        w.next_poll = now + min(w.profile.delay(w.attempt, elapsed), w.deadline - elapsed)
+        w.attempt += 1
+
+    def _retry(self, kind, waits, exc):
+        """
+        Poll the waits again after their next delay, the ones past their deadline fail with exc.
+        """
+        now = waiter.clock.monotonic()
+        expired = []
+        for w in waits:
+            elapsed = now - w.start
+            if elapsed >= w.deadline:
+                expired.append(w)
+            else:
+                self._schedule(w, now, elapsed)
+        self._finish(kind, expired, exc)
+
+    def _finish(self, kind, waits, exc=None):
+        with self._cond:
+            for w in waits:
+                if exc is not None and not w.future.done():
+                    w.future.set_exception(exc)
+                if w in self._pending[kind.name]:
+                    self._pending[kind.name].remove(w)
+
+
+def _retryable(error):
+    """
+    :return: bool, the error is a throttle, a server error or a connection error a later poll may not get
+    """
+    if isinstance(error, botocore_exceptions.ClientError):
+        code = error.response.get('Error', {}).get('Code')
+        status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+        return code in telemetry.THROTTLING_CODES or status >= 500
+    return isinstance(error, (botocore_exceptions.ConnectionError, botocore_exceptions.HTTPClientError))
+
+
+_poller = Poller()
+
+
+def get_poller():
+    return _poller
+
+
+def register_kind(name, describe, batch_size=10):
+    _poller.register_kind(name, describe, batch_size)
+
+
+def submit(kind, key, condition, **kwargs):
+    return _poller.submit(kind, key, condition, **kwargs)
+
+
+def wait(kind, key, condition, **kwargs):
+    return _poller.wait(kind, key, condition, **kwargs)
@@ -0,0 +1,175 @@
+"""
+Client-side rate limiting of AWS API calls, shared by every client, task and stack of the process.
+
+Each (region, service, family) has its own token bucket, the families are 'describe' (Describe*, List*, Get*) and
+'mutate' (everything else), so waiters polling describe calls never eat the budget of create calls. Every HTTP
+attempt, retries included, takes a token. A throttling error halves the rate of its bucket, each successful call
+then adds back a twentieth of the configured rate until the budget is reached again.
+
+Budgets are 'service.family=rate/burst' pairs, for example
+IAC_RATE_LIMITS='ecs.describe=20/50,default.mutate=5/10', the 'default' service applies to the unlisted services.
+"""
+import inspect
+import logging
+import threading
+
+from iac import clients, settings, telemetry, utils, waiter
+
+asyncio = utils.lazy_import('asyncio')
+
+logger = logging.getLogger(__name__)
+
+DESCRIBE = 'describe'
+MUTATE = 'mutate'
+
+# {service | 'default': {family: (requests per second, burst)}}
+DEFAULT_LIMITS = {
+    'default': {DESCRIBE: (20.0, 40), MUTATE: (5.0, 10)},
+}
+
+# Lowest rate a bucket slows down to, as a fraction of its budget.
+MIN_RATE = 0.05
+
+
+def family(operation_name):
+    """
+    :param operation_name: str, like 'DescribeDBInstances'
+    :return: DESCRIBE or MUTATE
+    """
+    return DESCRIBE if operation_name.startswith(('Describe', 'List', 'Get')) else MUTATE
+
+
+def parse_limits(text):
+    """
+    :param text: str, like 'ecs.describe=20/50,default.mutate=5/10'
+    :return: {service: {family: (rate, burst)}}
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        try:
+            key, budget = item.split('=')
+            service, fam = key.strip().rsplit('.', 1)
+            rate, burst = budget.split('/')
+            limits.setdefault(service, {})[fam] = (float(rate), int(burst))
+        except ValueError:
+            raise ValueError('Invalid rate limit [%s], expected service.family=rate/burst.' % item)
+        if fam not in (DESCRIBE, MUTATE):
+            raise ValueError('Invalid rate limit family [%s], expected %s or %s.' % (fam, DESCRIBE, MUTATE))
+    return limits
+
+
+class TokenBucket(object):
+    """
+    Token bucket with an additive-increase, multiplicative-decrease rate.
+    """
+
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = None
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, sleeping on waiter.clock until it is available. Callers are served in arrival order.
+        :return: float, seconds slept
+        """
+        delay = self.reserve()
+        if delay:
+            waiter.clock.sleep(delay)
+        return delay
+
+    def reserve(self):
+        """
+        Take a token without waiting for it.
+        :return: float, seconds until it is available
+        """
+        with self._lock:
+            now = waiter.clock.monotonic()
+            if self.updated is not None:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # The token is reserved now, a negative balance is the queue of the callers ahead.
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.max_rate * MIN_RATE, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def succeeded(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class RateLimiter(object):
+
+    def __init__(self, limits=None):
+        """
+        :param limits: {service | 'default': {family: (rate, burst)}}, merged over DEFAULT_LIMITS
+        """
+        self.limits = {service: dict(families) for service, families in DEFAULT_LIMITS.items()}
+        for service, families in (limits or {}).items():
+            self.limits.setdefault(service, {}).update(families)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, service, operation_name, region=None):
+        """
+        :return: TokenBucket of the service and family of the operation, AWS budgets are per region
+        """
+        key = (region, service, family(operation_name))
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    budget = self.limits.get(service, {}).get(key[2]) or self.limits['default'][key[2]]
+                    bucket = self._buckets[key] = TokenBucket(*budget)
+        return bucket
+
+    def attach(self, client):
+        """
+        Register the event handlers on a botocore or aiobotocore client.
+        """
+        service = client.meta.service_model.service_name
+        region = client.meta.region_name
+        # aiobotocore awaits what its handlers return.
+        asynchronous = inspect.iscoroutinefunction(client.meta.events.emit)
+
+        def _request_created(operation_name, **kwargs):
+            bucket = self.bucket(service, operation_name, region)
+            delay = bucket.reserve() if asynchronous else bucket.acquire()
+            if delay > 1:
+                logger.debug('Rate limited %s.%s for %.1fs.', service, operation_name, delay)
+            if asynchronous and delay:
+                # Off the event loop, on whatever clock waiter.clock is.
+                return asyncio.get_running_loop().run_in_executor(None, waiter.clock.sleep, delay)
+
+        def _needs_retry(response=None, operation=None, **kwargs):
+            if response is not None and telemetry.is_throttling(response[1].get('Error', {}).get('Code')):
+                self.bucket(service, operation.name, region).throttled()
+
+        def _after_call(model, **kwargs):
+            self.bucket(service, model.name, region).succeeded()
+
+        events = client.meta.events
+        events.register('request-created', _request_created)
+        events.register('needs-retry', _needs_retry)
+        events.register('after-call', _after_call)
+
+
+def install(provider=None, limits=None):
+    """
+    Rate limit every current and future client of the provider.
+    :param provider: clients.ClientProvider, defaults to the shared one
+    :param limits: {service: {family: (rate, burst)}}, defaults to settings.RATE_LIMITS
+    :return: RateLimiter
+    """
+    limiter = RateLimiter(parse_limits(settings.RATE_LIMITS) if limits is None else limits)
+    (provider or clients.get_provider()).add_hook(limiter.attach)
+    return limiter
@@ -0,0 +1,60 @@
+"""
+Run the same stacks in several regions at once.
+
+Each region works with its own clients, rate limit buckets, cached default VPC and persistence logbooks. By default
+the regions run as threads of this process, with processes=True each region gets a worker process of its own, for
+fan-outs wide enough to be bound by the interpreter lock.
+"""
+import logging
+import multiprocessing
+from concurrent import futures
+
+from iac import logs, ratelimit, schedule, settings, stack, telemetry, waiter
+
+logger = logging.getLogger(__name__)
+
+
+def provision_regions(regions, stores, max_concurrency=None, processes=False, destroy=False):
+    """
+    :param regions: [str], like ['ap-east-1', 'ap-southeast-1']
+    :param stores: {stack name: store}, provisioned in every region
+    :param max_concurrency: int, tasks executing at once per region, see stack.provision_all
+    :param processes: bool, one worker process per region instead of one thread
+    :param destroy: bool, destroy the stacks instead
+    :return: {'duration': seconds, 'regions': {region: {stack name: status}}}
+    """
+    started = waiter.clock.monotonic()
+    if processes:
+        pool = futures.ProcessPoolExecutor(len(regions), mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=_init_process)
+    else:
+        pool = futures.ThreadPoolExecutor(len(regions), thread_name_prefix='iac-region')
+    with pool:
+        running = {region: pool.submit(_provision_region, region, stores, max_concurrency, processes, destroy)
+                   for region in regions}
+        results = {}
+        for region, future in running.items():
+            try:
+                results[region] = future.result()
+            except Exception as e:
+                # Only the worker process itself can fail here, stack failures are part of the statuses.
+                logger.exception('Region [%s] failed.', region)
+                results[region] = {name: {'state': 'FAILURE', 'duration': 0.0, 'error': repr(e)} for name in stores}
+    return {'duration': waiter.clock.monotonic() - started, 'regions': results}
+
+
+def _init_process():
+    logs.setup_logging()
+    if settings.RATE_LIMITS != 'off':
+        ratelimit.install()
+    schedule.install()
+
+
+def _provision_region(region, stores, max_concurrency, worker_process, destroy):
+    # A worker process reports its own telemetry, threads share the collector of the entry point.
+    collector = telemetry.install() if worker_process and settings.TELEMETRY_DIR else None
+    try:
+        return stack.provision_all(stores, max_concurrency=max_concurrency, region=region, destroy=destroy)
+    finally:
+        if collector is not None:
+            collector.export(settings.TELEMETRY_DIR, name='iac-%s' % region)
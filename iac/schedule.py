@@ -0,0 +1,154 @@
+"""
+Long-lead-first scheduling: when more tasks are ready than there are slots, see utils.tag_tasks, the task with the
+longest remaining path to the end of its flow goes first, so the RDS instance and the load balancer are never queued
+behind quick calls.
+
+The remaining path of a task is its duration plus the longest remaining path of the tasks that wait on it. Durations
+come from past runs, recorded by time_tasks into durations and kept in settings.DURATIONS_FILE once installed.
+"""
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+
+from iac import settings, utils, waiter
+
+compiler = utils.lazy_import('taskflow.engines.action_engine.compiler')
+timeline = utils.lazy_import('iac.timeline')
+
+logger = logging.getLogger(__name__)
+
+# Seconds assumed for a task without history, the priority then counts the tasks left on the path.
+DEFAULT_DURATION = 1.0
+# Weight of the latest run in the recorded duration of a task.
+ALPHA = 0.5
+
+
+class DurationStore(object):
+    """
+    Thread-safe {task name: seconds}, a moving average over the successful runs, optionally kept in a JSON file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._durations = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self._durations = {k: float(v) for k, v in json.load(f).items()}
+            except (OSError, ValueError, AttributeError):
+                logger.warning('Task durations [%s] unreadable, start without history.', path, exc_info=True)
+
+    def get(self, name, default=DEFAULT_DURATION):
+        with self._lock:
+            return self._durations.get(name, default)
+
+    def record(self, name, seconds):
+        with self._lock:
+            previous = self._durations.get(name)
+            self._durations[name] = seconds if previous is None else ALPHA * seconds + (1 - ALPHA) * previous
+
+    def save(self):
+        """
+        Write the durations to the file, a no-op without one.
+        """
+        if not self.path:
+            return
+        # Under the lock, like StateStore.save.
+        with self._lock:
+            utils.write_atomic(self.path, json.dumps(self._durations, indent=1, sort_keys=True))
+
+
+# Kept in memory until the entry points install the file of settings.DURATIONS_FILE, see install.
+durations = DurationStore()
+
+
+def install(path=None):
+    """
+    Keep the task durations across runs.
+    :param path: str, JSON file of the durations, defaults to settings.DURATIONS_FILE, kept in memory only when empty
+    :return: DurationStore
+    """
+    global durations
+    durations = DurationStore(settings.DURATIONS_FILE if path is None else path)
+    return durations
+
+
+def time_tasks(flow, store=None):
+    """
+    Record how long the execute of every task of the flow takes when it succeeds, waits included. Time spent
+    queued for a slot before it, see utils.tag_tasks, is not the task's own and is left out.
+    :param store: DurationStore, defaults to durations
+    :return: flow
+    """
+    for atom in utils.iter_atoms(flow):
+        if hasattr(atom, 'execute') and not getattr(atom, '_iac_timed', False):
+            atom.execute = _timed(atom.name, store, atom.execute)
+            atom._iac_timed = True
+    return flow
+
+
+def _timed(name, store, func):
+    def wrapper(*args, **kwargs):
+        started = waiter.clock.monotonic()
+        result = func(*args, **kwargs)
+        (store or durations).record(name, waiter.clock.monotonic() - started)
+        return result
+
+    return wrapper
+
+
+def priorities(flow, store=None):
+    """
+    :param flow: taskflow flow
+    :param store: DurationStore, defaults to durations
+    :return: {atom name: seconds of its longest remaining path}
+    """
+    store = store or durations
+    graph = compiler.PatternCompiler(flow).compile().execution_graph
+    atoms = [n for n in graph.nodes if graph.nodes[n]['kind'] in (compiler.TASK, compiler.RETRY)]
+    successors = {atom: [] for atom in atoms}
+    for atom in atoms:
+        for p in timeline.atom_predecessors(graph, atom):
+            successors[p].append(atom)
+    remaining = {}
+
+    def _remaining(atom):
+        if atom not in remaining:
+            remaining[atom] = store.get(atom.name) + max([_remaining(s) for s in successors[atom]], default=0.0)
+        return remaining[atom]
+
+    return {atom.name: _remaining(atom) for atom in atoms}
+
+
+class PrioritySlots(object):
+    """
+    Counting semaphore handing free slots to the waiter with the highest priority first, in arrival order among
+    equal priorities.
+    """
+
+    def __init__(self, value):
+        self._free = value
+        self._waiting = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, priority=0.0):
+        with self._cond:
+            entry = (-priority, next(self._order))
+            heapq.heappush(self._waiting, entry)
+            while self._free == 0 or self._waiting[0] != entry:
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._free -= 1
+            # The next waiter may take a slot that is still free.
+            self._cond.notify_all()
+        return True
+
+    def release(self):
+        with self._cond:
+            self._free += 1
+            self._cond.notify_all()
@@ -0,0 +1,62 @@
+"""
+Runtime settings, read from IAC_* environment variables.
+"""
+import os
+
+# Directory of the on-disk caches, disk caching is disabled when unset.
+CACHE_DIR = os.environ.get('IAC_CACHE_DIR') or None
+
+# Seconds a discovered default VPC (VpcId, SubnetIds, VpcSecurityGroupIds) is reused.
+VPC_CACHE_TTL = float(os.environ.get('IAC_VPC_CACHE_TTL', 24 * 3600))
+
+# Worker count of the parallel engine, also the connection pool size of every client.
+MAX_WORKERS = int(os.environ.get('IAC_MAX_WORKERS', 16))
+
+# Log file of iac.logs.setup_logging, empty disables file logging.
+LOG_FILE = os.environ.get('IAC_LOG_FILE', 'iac.log')
+
+# Level of the root logger, records below it cost nothing.
+LOG_LEVEL = os.environ.get('IAC_LOG_LEVEL', 'INFO')
+
+# 'text', or 'json' for one JSON object per line.
+LOG_FORMAT = os.environ.get('IAC_LOG_FORMAT', 'text')
+
+# Level of the botocore, boto3 and urllib3 loggers.
+SDK_LOG_LEVEL = os.environ.get('IAC_SDK_LOG_LEVEL', 'WARNING')
+
+# Taskflow persistence backend used to resume failed runs, like 'dir:///var/lib/iac', disabled when unset.
+PERSISTENCE = os.environ.get('IAC_PERSISTENCE') or None
+
+# Directory the API telemetry of a run is exported to (JSON report and Prometheus file), disabled when unset.
+TELEMETRY_DIR = os.environ.get('IAC_TELEMETRY_DIR') or None
+
+# Client-side API budgets over iac.ratelimit.DEFAULT_LIMITS, like 'ecs.describe=20/50,default.mutate=5/10',
+# 'off' disables rate limiting.
+RATE_LIMITS = os.environ.get('IAC_RATE_LIMITS', '')
+
+# Stack specs compiled by iac.spec into the provision and destroy flows, JSON or YAML, the bundled ones when unset.
+PROVISION_SPEC = os.environ.get('IAC_PROVISION_SPEC') or os.path.join(os.path.dirname(__file__), 'specs',
+                                                                         'provision.json')
+DESTROY_SPEC = os.environ.get('IAC_DESTROY_SPEC') or os.path.join(os.path.dirname(__file__), 'specs', 'destroy.json')
+
+# Specs of the stores declaring services, several services sharing the cluster and the ALB, see iac.spec.
+PROVISION_SERVICES_SPEC = os.environ.get('IAC_PROVISION_SERVICES_SPEC') or os.path.join(
+    os.path.dirname(__file__), 'specs', 'provision_services.json')
+DESTROY_SERVICES_SPEC = os.environ.get('IAC_DESTROY_SERVICES_SPEC') or os.path.join(
+    os.path.dirname(__file__), 'specs', 'destroy_services.json')
+
+# Bulk inventory of the region taken at the start of a provision run, see iac.inventory, 'off' disables it.
+INVENTORY = os.environ.get('IAC_INVENTORY', 'on') != 'off'
+
+# JSON file of the task durations of past runs, see iac.schedule, installed by main.py, empty keeps them in memory
+# only.
+DURATIONS_FILE = os.environ.get('IAC_DURATIONS_FILE', os.path.join(CACHE_DIR, 'durations.json') if CACHE_DIR
+                                else 'iac-durations.json')
+
+# JSON file of the fingerprints and results of the tasks of past runs, see iac.state, the runs of main.py are only
+# incremental when set.
+STATE_FILE = os.environ.get('IAC_STATE_FILE') or None
+
+# Check the resources of the unchanged tasks in the inventory snapshot before skipping them, see iac.state, 'off'
+# trusts the state file alone.
+DRIFT_CHECK = os.environ.get('IAC_DRIFT_CHECK', 'on') != 'off'
@@ -0,0 +1,173 @@
+"""
+Declarative stack specs, compiled into a graph_flow whose edges only come from the symbols the tasks require and
+provide, so the engine always runs every task the data dependencies allow at once.
+
+A spec is a JSON (or, with PyYAML installed, YAML) document:
+
+    {"name": "provision",
+     "tasks": [{"task": "iac.rds.create_db_instance", "requires": ["db_subnet_group_created"],
+                "provides": "db_instance_created"}, ...]}
+
+task is the dotted path of a function or of a taskflow task class. Its arguments are required under their own
+names, or under the symbols of rebind ({argument: symbol}). Extra requires are ordering-only symbols, they are
+never passed to the task, a task provides such a symbol to run before the tasks requiring it. name defaults to
+the dotted path for functions and is the persistence key of the task.
+
+An entry with "each": "services" runs once per item of the list services of the store, the items told apart by
+the key the spec gives the list:
+
+    {"collections": {"services": "serviceName"},
+     "tasks": [{"task": "iac.elbv2.create_target_group", "each": "services", "provides": "TargetGroupArn"}, ...]}
+
+The keys of an item are injected into its tasks over the store, and the symbols the each entries provide or
+require become per item, TargetGroupArn[api] for the item whose serviceName is api, so the instances of an
+entry for different items are independent and run at once.
+"""
+import importlib
+import inspect
+import json
+import os
+
+from taskflow import task
+from taskflow.patterns import graph_flow
+
+ENTRY_KEYS = ('task', 'name', 'provides', 'requires', 'rebind', 'each')
+
+
+class SpecTask(task.FunctorTask):
+    """
+    Task of a spec entry, calling its function, or the execute of its task class, with the arguments it takes.
+    """
+
+    def __init__(self, target, name=None, provides=None, requires=(), rebind=None, inject=None):
+        """
+        :param target: function or taskflow task class, see aio.implements
+        :param requires: [str], ordering-only symbols
+        :param inject: {symbol: value}, taken over the storage
+        """
+        self.target = target
+        if inspect.isclass(target):
+            name = name or '%s.%s' % (target.__module__, target.__name__)
+            execute = target(name=name).execute
+        else:
+            execute = target
+        super(SpecTask, self).__init__(execute, name=name, provides=provides, rebind=rebind, inject=inject)
+        self.ordering = frozenset(requires)
+        # Required from the storage, and linked by graph_flow, but missing from rebind so never passed on.
+        self.requires = self.requires.union(self.ordering)
+
+
+def read(path):
+    """
+    :param path: str, .json, or .yaml / .yml
+    :return: dict, the spec
+    """
+    with open(path, encoding='utf-8') as f:
+        if os.path.splitext(path)[1] in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError('Stack spec [%s] is YAML, which needs PyYAML installed.' % path)
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def build(spec, store=None) -> graph_flow.Flow:
+    """
+    :param spec: dict, see the module doc
+    :param store: dict, holds the lists the each entries run for
+    :return: graph_flow.Flow, linked by its requires and provides only
+    """
+    name = spec.get('name', 'stack')
+    entries = spec.get('tasks') or []
+    tasks, providers = [], {}
+    for entry in entries:
+        unknown = set(entry) - set(ENTRY_KEYS)
+        if unknown or 'task' not in entry:
+            raise ValueError('Stack spec [%s]: invalid task entry %s, expected the keys %s with task.'
+                             % (name, entry, list(ENTRY_KEYS)))
+    collections = {entry['each']: _items(name, spec, entry['each'], store) for entry in entries if 'each' in entry}
+    # Symbols of the each entries, one per item.
+    itemized = {symbol for entry in entries if 'each' in entry for symbol in _symbols(entry.get('provides'))}
+    for entry in entries:
+        target = _resolve(name, entry['task'])
+        if 'each' not in entry:
+            # A shared task requiring a symbol of the items waits for all of them.
+            requires = [item_symbol for symbol in entry.get('requires', ())
+                        for item_symbol in _per_item(symbol, entries, collections)]
+            atoms = [SpecTask(target, name=entry.get('name'), provides=entry.get('provides'), requires=requires,
+                              rebind=entry.get('rebind'))]
+        else:
+            atoms = [_item_task(target, entry, key, item, itemized) for key, item in collections[entry['each']]]
+        for atom in atoms:
+            for symbol in atom.provides:
+                if symbol in providers:
+                    raise ValueError('Stack spec [%s]: [%s] is provided by both [%s] and [%s].'
+                                     % (name, symbol, providers[symbol], atom.name))
+                providers[symbol] = atom.name
+            tasks.append(atom)
+    return graph_flow.Flow(name).add(*tasks)
+
+
+def load(path, store=None) -> graph_flow.Flow:
+    return build(read(path), store)
+
+
+def _symbols(provides):
+    if provides is None:
+        return []
+    return [provides] if isinstance(provides, str) else list(provides)
+
+
+def _items(spec_name, spec, collection, store):
+    """
+    :return: [(key, item)] of the list collection of the store
+    """
+    key_field = (spec.get('collections') or {}).get(collection)
+    if key_field is None:
+        raise ValueError('Stack spec [%s]: [%s] is not in its collections.' % (spec_name, collection))
+    items = (store or {}).get(collection)
+    if not items:
+        raise ValueError('Stack spec [%s]: the store has no [%s] to run for.' % (spec_name, collection))
+    keys = [item.get(key_field) for item in items]
+    if None in keys or len(set(keys)) != len(keys):
+        raise ValueError('Stack spec [%s]: every item of [%s] needs its own [%s].'
+                         % (spec_name, collection, key_field))
+    return list(zip(keys, items))
+
+
+def _per_item(symbol, entries, collections):
+    """
+    :return: [str], the symbol for every item when an each entry provides it, else [symbol]
+    """
+    for provider in entries:
+        if 'each' in provider and symbol in _symbols(provider.get('provides')):
+            return ['%s[%s]' % (symbol, key) for key, _ in collections[provider['each']]]
+    return [symbol]
+
+
+def _item_task(target, entry, key, item, itemized):
+    """
+    :return: SpecTask of the each entry for the item
+    """
+    def _symbol(symbol):
+        return '%s[%s]' % (symbol, key) if symbol in itemized else symbol
+
+    provides = entry.get('provides')
+    if provides is not None:
+        provides = _symbol(provides) if isinstance(provides, str) else [_symbol(s) for s in provides]
+    template = SpecTask(target, name=entry.get('name'), rebind=entry.get('rebind'))
+    # Optional arguments stay out of rebind, rebinding one makes it required.
+    rebind = {arg: _symbol(symbol) for arg, symbol in template.rebind.items()
+              if arg in (entry.get('rebind') or {}) or symbol in itemized}
+    return SpecTask(target, name='%s[%s]' % (template.name, key), provides=provides,
+                    requires=[_symbol(s) for s in entry.get('requires', ())], rebind=rebind or None,
+                    inject={symbol: item[symbol] for symbol in template.rebind.values() if symbol in item} or None)
+
+
+def _resolve(spec_name, path):
+    module, _, attr = path.rpartition('.')
+    try:
+        return getattr(importlib.import_module(module), attr)
+    except (ImportError, AttributeError, ValueError):
+        raise ValueError('Stack spec [%s]: unknown task [%s].' % (spec_name, path))
@@ -0,0 +1,211 @@
+import contextlib
+import logging
+import threading
+from concurrent import futures
+
+from iac import aio, clients, inventory, schedule, settings, state, utils, waiter
+
+asyncio = utils.lazy_import('asyncio')
+graph_flow = utils.lazy_import('taskflow.patterns.graph_flow')
+persistence = utils.lazy_import('iac.persistence')
+spec = utils.lazy_import('iac.spec')
+
+logger = logging.getLogger(__name__)
+
+
+def flow_provision(store=None) -> 'graph_flow.Flow':
+    """
+    The whole stack as one graph compiled from settings.PROVISION_SPEC, see iac.spec. Only the task definition and
+    the service wait for the DB endpoint, everything else overlaps with the RDS create.
+    A store declaring services gets settings.PROVISION_SERVICES_SPEC instead: the services share the DB, the
+    repository, the cluster and the ALB, whose listener routes to each by its path pattern, and their target
+    groups, rules, task definitions and services are created at once.
+    The services run under CodeDeploy, a redeploy rolls them through their deployment group, see
+    ecs.deploy_service.
+    requires: DBInstanceIdentifier, DBName, AllocatedStorage, DBInstanceClass, MasterUserPassword, DBSubnetGroupName,
+              MultiAZ, repositoryName, clusterName, family, serviceName, TargetGroupName, GreenTargetGroupName,
+              TargetGroupPort, LBName, codeDeployApplication, codeDeployDeploymentGroup, optionally
+              codeDeployServiceRole, or, instead of family to TargetGroupPort and codeDeployDeploymentGroup,
+              services: [{serviceName, family, TargetGroupName, GreenTargetGroupName, TargetGroupPort,
+              codeDeployDeploymentGroup, pathPattern, priority, and optionally imageTag, containerName,
+              containerPort}]
+    provides: VpcId, SubnetIds, VpcSecurityGroupIds, TargetGroupArn, GreenTargetGroupArn, LoadBalancerArn,
+              ListenerArn, SQLALCHEMY_DATABASE_URI, repositoryUri, taskDefinitionArn, per service
+              TargetGroupArn[serviceName], GreenTargetGroupArn[serviceName] and taskDefinitionArn[serviceName]
+    """
+    if store and store.get('services'):
+        return spec.load(settings.PROVISION_SERVICES_SPEC, store)
+    return spec.load(settings.PROVISION_SPEC)
+
+
+def flow_destroy(store=None) -> 'graph_flow.Flow':
+    """
+    flow_provision in reverse, compiled from settings.DESTROY_SPEC, or settings.DESTROY_SERVICES_SPEC for a store
+    declaring services. The service goes first, then the ALB, the task definitions and the cluster in parallel.
+    The DB and the repository do not depend on anything and are deleted from the start, so the teardown takes as
+    long as the DB deletion.
+    requires: DBInstanceIdentifier, DBSubnetGroupName, repositoryName, clusterName, family, serviceName,
+              TargetGroupName, GreenTargetGroupName, LBName, codeDeployApplication, or services instead of family,
+              serviceName, TargetGroupName and GreenTargetGroupName
+    provides:
+    """
+    if store and store.get('services'):
+        return spec.load(settings.DESTROY_SERVICES_SPEC, store)
+    return spec.load(settings.DESTROY_SPEC)
+
+
+def save():
+    """
+    Keep the task durations and the state of the runs, see iac.schedule and iac.state.
+    """
+    schedule.durations.save()
+    if state.store is not None:
+        state.store.save()
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(max_workers):
+    """
+    Process-wide worker pool shared by the engines. An engine that owns its pool spends about a second shutting
+    it down at the end of every run.
+    :param max_workers: int
+    :return: concurrent.futures.ThreadPoolExecutor
+    """
+    with _executors_lock:
+        if max_workers not in _executors:
+            _executors[max_workers] = futures.ThreadPoolExecutor(max_workers, thread_name_prefix='iac-worker')
+        return _executors[max_workers]
+
+
+def load(store, book_name='default', slots=None, region=None, destroy=False, **options):
+    """
+    Load flow_provision, or flow_destroy, on the parallel engine. With settings.PERSISTENCE set, a failed or
+    interrupted run of the same book resumes from the failure point and reuses the stored results of finished tasks.
+    With a state store installed, the provision tasks whose inputs did not change since the last run are skipped, see
+    iac.state, and a destroy drops the state of the book.
+    :param store: dict, see flow_provision requires
+    :param book_name: str, persistence logbook of the stack
+    :param slots: schedule.PrioritySlots, bounds the tasks executing at once, the ready task with the longest
+                  remaining path first, see utils.tag_tasks, defaults to max_workers slots of the stack's own
+    :param region: str, region of the stack, defaults to the region of iac.CONFIG
+    :param destroy: bool, load flow_destroy
+    :param options: extra taskflow engine options
+    :return: taskflow engine
+    """
+    options.setdefault('engine', 'parallel')
+    options.setdefault('max_workers', settings.MAX_WORKERS)
+    clients.configure(max_workers=options['max_workers'])
+    if region is not None:
+        book_name = '%s/%s' % (region, book_name)
+    flow = flow_destroy(store) if destroy else flow_provision(store)
+    workers = options['max_workers']
+    if slots is None:
+        # A stack of its own gets max_workers slots, the long lead tasks still go first, and one worker per task
+        # that may be running or waiting, like provision_all.
+        slots = schedule.PrioritySlots(options['max_workers'])
+        workers = max(workers, len(list(utils.iter_atoms(flow))))
+    options.setdefault('executor', get_executor(workers))
+    priorities = schedule.priorities(flow)
+    schedule.time_tasks(flow)
+    if destroy and state.store is not None:
+        state.store.forget(book_name)
+    elif not destroy:
+        # Over time_tasks, a skipped task records no duration.
+        state.track(flow, book_name)
+    return persistence.load(utils.tag_tasks(flow, slots, region, priorities), store, book_name, **options)
+
+
+def provision(store, book_name='default', **options):
+    """
+    Run flow_provision against an inventory snapshot of the region, loaded by the first lookup when the runs are
+    incremental, see load and iac.inventory.
+    :return: dict, the engine storage
+    """
+    engine = load(store, book_name, **options)
+    try:
+        with inventory.snapshot(options.get('region'), lazy=state.store is not None):
+            engine.run()
+    finally:
+        save()
+    return engine.storage.fetch_all()
+
+
+def destroy(store, book_name='default', **options):
+    """
+    Run flow_destroy, see load.
+    """
+    engine = load(store, book_name, destroy=True, **options)
+    try:
+        engine.run()
+    finally:
+        save()
+
+
+def provision_all(stores, max_concurrency=None, region=None, destroy=False, **options):
+    """
+    Provision, or destroy, many stacks at once. Every task of every stack shares one pool of max_concurrency slots, a
+    task waiting on a resource (DB available, LB active) gives its slot back, so the run takes about as long as the
+    slowest stack. A free slot goes to the ready task with the longest remaining path, see iac.schedule. The stacks
+    share the clients, the default VPC discovery and, when provisioning, one inventory snapshot of the region, see
+    iac.inventory. A failed stack does not stop the others.
+    :param stores: {stack name: store}, the name is also the persistence logbook of the stack
+    :param max_concurrency: int, defaults to settings.MAX_WORKERS
+    :param region: str, region of the stacks, see load
+    :param destroy: bool, destroy the stacks instead
+    :param options: extra taskflow engine options
+    :return: {stack name: {'state': 'SUCCESS' or 'FAILURE', 'duration': seconds, 'results' or 'error'}}
+    """
+    max_concurrency = max_concurrency or settings.MAX_WORKERS
+    slots = schedule.PrioritySlots(max_concurrency)
+    # One worker per task that may be running or waiting, threads are only started on demand.
+    atoms = sum(len(list(utils.iter_atoms(flow_destroy(store) if destroy else flow_provision(store))))
+                for store in stores.values())
+    executor = futures.ThreadPoolExecutor(max(1, atoms), thread_name_prefix='iac-worker')
+    action = 'Destroy' if destroy else 'Provision'
+
+    def _provision(name, store):
+        started = waiter.clock.monotonic()
+        try:
+            engine = load(store, name, slots=slots, region=region, destroy=destroy, max_workers=max_concurrency,
+                          executor=executor, **options)
+            engine.run()
+        except Exception as e:
+            logger.exception('%s stack [%s] failed.', action, name)
+            return {'state': 'FAILURE', 'duration': waiter.clock.monotonic() - started, 'error': repr(e)}
+        logger.info('%s stack [%s] done.', action, name)
+        return {'state': 'SUCCESS', 'duration': waiter.clock.monotonic() - started,
+                'results': engine.storage.fetch_all()}
+
+    snapshot = inventory.snapshot(region, lazy=state.store is not None) if not destroy else contextlib.nullcontext()
+    with snapshot, executor, futures.ThreadPoolExecutor(max(1, len(stores)), thread_name_prefix='iac-stack') as runner:
+        running = {name: runner.submit(_provision, name, store) for name, store in stores.items()}
+        statuses = {name: future.result() for name, future in running.items()}
+    save()
+    return statuses
+
+
+def provision_all_async(stores, max_workers=None, region=None, destroy=False, backend=None):
+    """
+    provision_all on the asyncio backend, see iac.aio. Every task of every stack is a coroutine of one event loop,
+    only the AWS calls in flight take one of the max_workers workers, so hundreds of stacks cost no more threads
+    than one. Runs are not persisted nor incremental, a destroy drops the state of the stacks, see iac.state.
+    :param stores: {stack name: store}
+    :param max_workers: int, AWS calls in flight at once, defaults to settings.MAX_WORKERS
+    :param region: str, region of the stacks
+    :param destroy: bool, destroy the stacks instead
+    :param backend: aio.AIOBOTOCORE or aio.THREADS, see aio.AsyncClientProvider
+    :return: {stack name: {'state': 'SUCCESS' or 'FAILURE', 'duration': seconds, 'results' or 'error'}}
+    """
+    max_workers = max_workers or settings.MAX_WORKERS
+    clients.configure(max_workers=max_workers)
+    jobs = {name: (flow_destroy(store) if destroy else flow_provision(store), store)
+            for name, store in stores.items()}
+    if destroy and state.store is not None:
+        for name in stores:
+            state.store.forget(name if region is None else '%s/%s' % (region, name))
+        state.store.save()
+    with inventory.snapshot(region) if not destroy else contextlib.nullcontext():
+        return asyncio.run(aio.run_all(jobs, region=region, backend=backend, max_workers=max_workers))
@@ -0,0 +1,179 @@
+"""
+Incremental apply: a task whose inputs did not change since its last successful run is skipped, see track.
+
+After a task succeeds its fingerprint, a hash of the arguments it was called with, and its result are kept in the
+store under the logbook of its stack. On the next run a task with the same fingerprint, none of whose predecessors
+had to run again, returns the stored result without any call, so a deploy where nothing changed only reads the
+store. A changed input reruns its task and every task after it, the creates then find their resources as usual.
+
+The state only knows what iac did. With settings.DRIFT_CHECK on, the default, a task about to be skipped first
+checks its resource in the inventory snapshot of the region, see drift_check, and runs again when it is gone or
+changed. Tasks marked always_run are never skipped.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from iac import settings, utils
+
+compiler = utils.lazy_import('taskflow.engines.action_engine.compiler')
+timeline = utils.lazy_import('iac.timeline')
+
+logger = logging.getLogger(__name__)
+
+_checks = {}
+_always = set()
+
+
+class StateStore(object):
+    """
+    Thread-safe {logbook: {task name: {'fingerprint', 'outputs'}}}, optionally kept in a JSON file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._books = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self._books = json.load(f)
+            except (OSError, ValueError):
+                logger.warning('State [%s] unreadable, every task runs.', path, exc_info=True)
+
+    def get(self, book_name, task_name):
+        """
+        :return: dict with the fingerprint and the outputs of the last successful run, None without one
+        """
+        with self._lock:
+            return self._books.get(book_name, {}).get(task_name)
+
+    def put(self, book_name, task_name, fingerprint, outputs):
+        with self._lock:
+            self._books.setdefault(book_name, {})[task_name] = {'fingerprint': fingerprint, 'outputs': outputs}
+
+    def discard(self, book_name, task_name):
+        with self._lock:
+            self._books.get(book_name, {}).pop(task_name, None)
+
+    def forget(self, book_name):
+        """
+        Drop the state of a stack, its next run runs every task.
+        """
+        with self._lock:
+            self._books.pop(book_name, None)
+
+    def save(self):
+        """
+        Write the state to the file, readable by the owner only as results may hold secrets, a no-op without one.
+        """
+        if not self.path:
+            return
+        # Under the lock, the regions of a run save at once and the last state written is the latest.
+        with self._lock:
+            utils.write_atomic(self.path, json.dumps(self._books, indent=1, sort_keys=True, default=str))
+
+
+# Installed by main.py when settings.STATE_FILE is set, see install, runs are not incremental without it.
+store = None
+
+
+def install(path=None):
+    """
+    Make the runs of iac.stack incremental.
+    :param path: str, JSON file of the state, defaults to settings.STATE_FILE, kept in memory only when empty
+    :return: StateStore
+    """
+    global store
+    store = StateStore(settings.STATE_FILE if path is None else path)
+    return store
+
+
+def drift_check(target):
+    """
+    Register the decorated function as the drift check of a task, called as check(arguments, outputs) with the
+    arguments and the stored result of the task while its region is current, see utils.current_region.
+    :param target: function of a FunctorTask or task class, like aio.implements
+    """
+    def decorator(func):
+        _checks[target] = func
+        return func
+
+    return decorator
+
+
+def always_run(target):
+    """
+    Never skip the decorated function of a FunctorTask, for a task without arguments to fingerprint that keeps its
+    own cache, like the default VPC discovery. Its result is part of the arguments of the tasks after it, which run
+    again when it changes.
+    :param target: function
+    :return: target
+    """
+    _always.add(target)
+    return target
+
+
+def fingerprint(name, arguments):
+    """
+    :param name: str, task name
+    :param arguments: dict, the arguments of its execute
+    :return: str, sha256 of the canonical JSON of both
+    """
+    data = json.dumps([name, arguments], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def track(flow, book_name, state=None, drift=None):
+    """
+    Make the tasks of the flow skip themselves when unchanged, see the module doc.
+    :param book_name: str, the logbook of the stack, the state is kept per stack
+    :param state: StateStore, defaults to store, the flow is returned as is without one
+    :param drift: bool, defaults to settings.DRIFT_CHECK
+    :return: flow
+    """
+    state = state if state is not None else store
+    if state is None:
+        return flow
+    drift = settings.DRIFT_CHECK if drift is None else drift
+    graph = compiler.PatternCompiler(flow).compile().execution_graph
+    ran = set()
+    for atom in utils.iter_atoms(flow):
+        if hasattr(atom, 'execute') and not getattr(atom, '_iac_tracked', False):
+            predecessors = frozenset(p.name for p in timeline.atom_predecessors(graph, atom))
+            target = getattr(atom, 'target', None)
+            if target in _always:
+                continue
+            check = _checks.get(target) if drift else None
+            atom.execute = _executing(atom.name, book_name, state, predecessors, ran, check, atom.execute)
+            atom.revert = _reverting(atom.name, book_name, state, atom.revert)
+            atom._iac_tracked = True
+    return flow
+
+
+def _executing(name, book_name, state, predecessors, ran, check, func):
+    def wrapper(**kwargs):
+        key = fingerprint(name, kwargs)
+        entry = state.get(book_name, name)
+        if entry is not None and entry['fingerprint'] == key and not predecessors & ran:
+            if check is None or check(kwargs, entry['outputs']):
+                logger.info('Task [%s] unchanged, skipped.', name)
+                return entry['outputs']
+            logger.info('Task [%s] drifted, running it again.', name)
+        # Marked before it runs, the tasks after it run again even if it fails.
+        ran.add(name)
+        result = func(**kwargs)
+        state.put(book_name, name, key, result)
+        return result
+
+    return wrapper
+
+
+def _reverting(name, book_name, state, func):
+    def wrapper(*args, **kwargs):
+        state.discard(book_name, name)
+        return func(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,171 @@
+"""
+Per-operation API telemetry collected from botocore client events.
+
+install() attaches the collector to every client of iac.clients. Each call is recorded with its latency, retries,
+throttling errors and payload sizes, tagged with the taskflow task that made it, and the collector exports a JSON run
+report and a Prometheus text-format file.
+"""
+import inspect
+import json
+import os
+import threading
+import time
+from urllib import parse
+
+from iac import aio, clients, utils
+
+THROTTLING_CODES = {'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottled',
+                    'RequestThrottledException', 'TooManyRequestsException', 'RequestLimitExceeded',
+                    'SlowDown', 'PriorRequestNotComplete', 'EC2ThrottledException', 'BandwidthLimitExceeded'}
+
+_METRICS = (
+    ('calls', 'iac_api_calls_total', 'counter', 'AWS API calls.'),
+    ('errors', 'iac_api_errors_total', 'counter', 'AWS API calls that failed.'),
+    ('retries', 'iac_api_retries_total', 'counter', 'Retries made by botocore.'),
+    ('throttles', 'iac_api_throttles_total', 'counter', 'Throttling errors received, retried or not.'),
+    ('request_bytes', 'iac_api_request_bytes_total', 'counter', 'Request payload bytes.'),
+    ('response_bytes', 'iac_api_response_bytes_total', 'counter', 'Response payload bytes.'),
+    ('latency_sum', 'iac_api_latency_seconds_sum', 'counter', 'Seconds spent in AWS API calls, retries included.'),
+    ('latency_max', 'iac_api_latency_seconds_max', 'gauge', 'Slowest AWS API call in seconds.'),
+)
+
+
+def is_throttling(code):
+    return code in THROTTLING_CODES
+
+
+class Collector(object):
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def attach(self, client):
+        """
+        Register the event handlers on a botocore or aiobotocore client.
+        """
+        events = client.meta.events
+        events.register('before-call', self._before_call)
+        events.register('needs-retry', self._needs_retry)
+        events.register('after-call', self._after_call)
+        events.register('after-call-error', self._after_call_error)
+
+    def _stat(self, context):
+        key = context['iac_key']
+        stat = self._stats.get(key)
+        if stat is None:
+            stat = self._stats[key] = {name: 0 for name, _, _, _ in _METRICS}
+        return stat
+
+    def _before_call(self, model, params, context, **kwargs):
+        task = utils.current_task() or aio.current_task() or threading.current_thread().name
+        context['iac_key'] = (model.service_model.service_name, model.name, task)
+        context['iac_started'] = time.monotonic()
+        context['iac_request_bytes'] = _size(params.get('body'))
+
+    def _needs_retry(self, response=None, request_dict=None, **kwargs):
+        # Emitted before every retry decision, only count, never answer.
+        context = (request_dict or {}).get('context', {})
+        if response is not None and 'iac_key' in context and is_throttling(response[1].get('Error', {}).get('Code')):
+            with self._lock:
+                self._stat(context)['throttles'] += 1
+
+    def _after_call(self, http_response, parsed, context, **kwargs):
+        failed = 'Error' in parsed
+        retries = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        content = getattr(http_response, 'content', None)
+        if inspect.isawaitable(content):
+            # aiobotocore response, awaited by the emitter.
+            return self._after_call_async(context, failed, retries, content)
+        self._record(context, failed, retries, _size(content))
+
+    async def _after_call_async(self, context, failed, retries, content):
+        self._record(context, failed, retries, _size(await content))
+
+    def _after_call_error(self, context, **kwargs):
+        self._record(context, True, 0, 0)
+
+    def _record(self, context, failed, retries, response_bytes):
+        if 'iac_key' not in context:
+            return
+        latency = time.monotonic() - context['iac_started']
+        with self._lock:
+            stat = self._stat(context)
+            stat['calls'] += 1
+            stat['errors'] += int(failed)
+            stat['retries'] += retries
+            stat['request_bytes'] += context['iac_request_bytes']
+            stat['response_bytes'] += response_bytes
+            stat['latency_sum'] += latency
+            stat['latency_max'] = max(stat['latency_max'], latency)
+
+    def report(self):
+        """
+        :return: dict, JSON-serializable run report
+        """
+        with self._lock:
+            operations = [dict(service=service, operation=operation, task=task, **stat)
+                          for (service, operation, task), stat in sorted(self._stats.items())]
+        totals = {name: sum(op[name] for op in operations) for name, _, _, _ in _METRICS if name != 'latency_max'}
+        return {
+            'started_at': self.started_at,
+            'duration': time.time() - self.started_at,
+            'totals': totals,
+            'operations': operations,
+        }
+
+    def prometheus(self):
+        """
+        :return: str, Prometheus text exposition format
+        """
+        operations = self.report()['operations']
+        lines = []
+        for name, metric, kind, help_text in _METRICS:
+            lines.append('# HELP %s %s' % (metric, help_text))
+            lines.append('# TYPE %s %s' % (metric, kind))
+            for op in operations:
+                labels = ','.join('%s="%s"' % (k, _escape(op[k])) for k in ('service', 'operation', 'task'))
+                lines.append('%s{%s} %s' % (metric, labels, op[name]))
+        return '\n'.join(lines) + '\n'
+
+    def export(self, directory, name='iac'):
+        """
+        Write <name>-telemetry.json and <name>.prom into the directory.
+        :return: (json path, prometheus path)
+        """
+        os.makedirs(directory, exist_ok=True)
+        json_path = os.path.join(directory, '%s-telemetry.json' % name)
+        prom_path = os.path.join(directory, '%s.prom' % name)
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        with open(prom_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        return json_path, prom_path
+
+
+def _size(body):
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    if isinstance(body, dict):
+        return len(parse.urlencode(body, doseq=True))
+    return 0
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def install(provider=None):
+    """
+    Attach a new collector to every current and future client of the provider.
+    :param provider: clients.ClientProvider, defaults to the shared one
+    :return: Collector
+    """
+    collector = Collector()
+    (provider or clients.get_provider()).add_hook(collector.attach)
+    return collector
@@ -0,0 +1,141 @@
+"""
+End-to-end provisioning benchmark on FakeAWS, offline.
+
+    python -m iac.tests.bench [--speedup 200] [--throttle 20] [--rate-limit] [--trace trace.json] [--stacks 50]
+
+Runs the main.py topology and reports the simulated wall-clock, the critical path and the API call counts.
+"""
+import argparse
+import json
+
+from iac import clients, ratelimit, stack, timeline
+from iac.tests.fake_aws import FakeAWS
+
+# Endpoint prefixes of the services throttled by --throttle.
+THROTTLED_SERVICES = ('ec2', 'rds', 'api.ecr', 'ecs', 'elasticloadbalancing')
+
+STORE = {
+    'DBInstanceIdentifier': 'my-db',
+    'DBName': 'mypoc',
+    'AllocatedStorage': 20,
+    'DBInstanceClass': 'db.t3.micro',
+    'MasterUserPassword': 'Admin123',
+    'DBSubnetGroupName': 'my-db-subnet-group',
+    'MultiAZ': False,
+
+    'repositoryName': 'mypoc',
+    'clusterName': 'my-cluster',
+    'family': 'mypoc-task-def',
+    'serviceName': 'mypoc-svc',
+
+    'TargetGroupName': 'mypoc-target-group',
+    'GreenTargetGroupName': 'mypoc-target-group-green',
+    'TargetGroupPort': 80,
+    'LBName': 'mypoc-alb',
+
+    'codeDeployApplication': 'mypoc',
+    'codeDeployDeploymentGroup': 'mypoc-deployment-group',
+}
+
+
+def run(speedup=200.0, throttle=None, store=None, fake=None, rate_limits=None):
+    """
+    :param speedup: float, simulated seconds per wall second
+    :param throttle: float, requests per second allowed per service, None disables throttling
+    :param rate_limits: {service: {family: (rate, burst)}}, client-side budgets, None disables ratelimit
+    :param store: dict, defaults to STORE
+    :param fake: FakeAWS, defaults to a fresh one
+    :return: dict, report with the simulated total, critical path, API call counts and the TimelineListener
+    """
+    if fake is None:
+        limits = None
+        if throttle:
+            limits = {s: (throttle, max(1.0, throttle)) for s in THROTTLED_SERVICES}
+        fake = FakeAWS(speedup=speedup, throttle=limits)
+    with fake.patch():
+        if rate_limits is not None:
+            ratelimit.install(clients.get_provider(), rate_limits)
+        engine = stack.load(dict(store or STORE))
+        recorder = timeline.TimelineListener(engine, fake.clock)
+        recorder.register()
+        engine.run()
+    return {
+        'total': recorder.finished,
+        'critical_path': recorder.critical_path(),
+        'timeline': recorder,
+        'calls': dict(fake.calls),
+        'api_calls': sum(fake.calls.values()),
+        'throttled': dict(fake.throttled),
+    }
+
+
+def stores(count):
+    """
+    :return: {stack name: store}, count tenants of STORE with their own resource names
+    """
+    names = ('DBInstanceIdentifier', 'DBSubnetGroupName', 'repositoryName', 'clusterName', 'family', 'serviceName',
+             'TargetGroupName', 'GreenTargetGroupName', 'LBName', 'codeDeployApplication')
+    return {'tenant-%d' % i: dict(STORE, **{k: '%s-%d' % (STORE[k], i) for k in names}) for i in range(count)}
+
+
+def run_all(count, speedup=200.0, max_concurrency=None, fake=None, rate_limits=None):
+    """
+    Provision count tenant stacks at once with stack.provision_all.
+    :return: dict, report with the simulated total, the per-stack states and API call counts
+    """
+    fake = fake or FakeAWS(speedup=speedup)
+    with fake.patch():
+        if rate_limits is not None:
+            ratelimit.install(clients.get_provider(), rate_limits)
+        start = fake.clock.monotonic()
+        statuses = stack.provision_all(stores(count), max_concurrency=max_concurrency)
+        end = fake.clock.monotonic()
+    return {
+        'total': end - start,
+        'stacks': {name: (status['state'], status['duration']) for name, status in statuses.items()},
+        'calls': dict(fake.calls),
+        'api_calls': sum(fake.calls.values()),
+        'throttled': dict(fake.throttled),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Provisioning benchmark on FakeAWS.')
+    parser.add_argument('--speedup', type=float, default=200.0)
+    parser.add_argument('--throttle', type=float, default=None, help='requests per second per service')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--trace', help='write a Chrome trace of the run to this file')
+    parser.add_argument('--rate-limit', action='store_true', help='enable the client-side rate limiter')
+    parser.add_argument('--stacks', type=int, default=None, help='provision this many tenant stacks at once')
+    args = parser.parse_args()
+
+    if args.stacks:
+        limits = {s: (args.throttle, max(1.0, args.throttle)) for s in THROTTLED_SERVICES} if args.throttle else None
+        report = run_all(args.stacks, fake=FakeAWS(speedup=args.speedup, throttle=limits),
+                         rate_limits={} if args.rate_limit else None)
+        print(json.dumps(report, indent=2) if args.json else
+              'total: %.1fs (simulated), %d api calls, %d throttled, states: %s' % (
+                  report['total'], report['api_calls'], sum(report['throttled'].values()),
+                  sorted({state for state, _ in report['stacks'].values()})))
+        return
+
+    report = run(speedup=args.speedup, throttle=args.throttle, rate_limits={} if args.rate_limit else None)
+    recorder = report.pop('timeline')
+    if args.trace:
+        recorder.export(args.trace)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print('total: %.1fs (simulated)' % report['total'])
+    print('critical path:')
+    waiting = recorder.waiting()
+    for name, s, e in report['critical_path']:
+        print('  %7.1f %7.1f  %s%s' % (s, e, name, ' (waited %.1fs)' % waiting[name] if waiting.get(name) else ''))
+    print('api calls: %d' % report['api_calls'])
+    for op, n in sorted(report['calls'].items(), key=lambda kv: -kv[1]):
+        throttled = report['throttled'].get(op)
+        print('  %4d  %s%s' % (n, op, ' (%d throttled)' % throttled if throttled else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Record/replay of the AWS calls of a test at BaseClient._make_api_call.
+
+    with cassette.use('provision'):
+        stack.provision(store)
+
+Replay, the default, answers every call from iac/tests/cassettes/provision.jsonl by region, service, operation and
+normalized parameters, and raises CassetteMiss for a call that was not recorded, so a test never reaches the network.
+Calls with the same key get their recorded responses in order and the last one repeats, a poll sees the resource go
+through its states. Waits run on a VirtualClock, a replayed test never sleeps.
+
+IAC_CASSETTE_MODE=record runs the calls for real with the credentials of the environment, or against FakeAWS with
+IAC_CASSETTE_SOURCE=fake, and rewrites the cassette:
+
+    IAC_CASSETTE_MODE=record IAC_CASSETTE_SOURCE=fake python -m pytest iac/tests/test_replay.py
+"""
+import contextlib
+import datetime
+import json
+import os
+import threading
+from unittest import mock
+
+import botocore.client
+from botocore import UNSIGNED
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+import iac
+from iac import clients, waiter
+
+REPLAY = 'replay'
+RECORD = 'record'
+
+CASSETTE_DIR = os.path.join(os.path.dirname(__file__), 'cassettes')
+
+# Parameters left out of the keys, they change on every run.
+VOLATILE_PARAMS = ('ClientToken', 'clientToken')
+# Parameters masked in the cassettes.
+SECRET_PARAMS = ('MasterUserPassword',)
+
+
+class CassetteMiss(Exception):
+    pass
+
+
+class VirtualClock(object):
+    """
+    Time that only moves when a waiter sleeps, sleeps and timed waits return at once.
+    """
+
+    def __init__(self):
+        self._now = 0.0
+        self._lock = threading.Lock()
+
+    def monotonic(self):
+        with self._lock:
+            return self._now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self._now += max(0.0, seconds)
+
+    def wait(self, condition, seconds):
+        if seconds is None:
+            # Nothing is due, only a notify can bring work.
+            condition.wait()
+        else:
+            self.sleep(seconds)
+
+
+def normalize(params):
+    """
+    :return: the parameters without the volatile ones, with masked secrets and sorted lists of strings
+    """
+    if isinstance(params, dict):
+        return {k: '***' if k in SECRET_PARAMS else normalize(v) for k, v in params.items()
+                if k not in VOLATILE_PARAMS}
+    if isinstance(params, (list, tuple)):
+        items = [normalize(v) for v in params]
+        return sorted(items) if all(isinstance(v, str) for v in items) else items
+    return params
+
+
+def _key(region, service, operation, params):
+    return json.dumps([region, service, operation, normalize(params)], sort_keys=True, default=str)
+
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if list(value) == ['$datetime']:
+            return datetime.datetime.fromisoformat(value['$datetime'])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+class Cassette(object):
+
+    def __init__(self, path, mode=REPLAY):
+        """
+        :param path: str, JSON lines file, one call per line
+        :param mode: REPLAY or RECORD
+        """
+        self.path = path
+        self.mode = mode
+        self.interactions = []
+        self._replies = {}
+        self._played = {}
+        self._lock = threading.Lock()
+        if mode == REPLAY:
+            if not os.path.exists(path):
+                raise CassetteMiss('No cassette [%s], record it with IAC_CASSETTE_MODE=record.' % path)
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.interactions.append(entry)
+                    key = _key(entry['region'], entry['service'], entry['operation'], entry['params'])
+                    self._replies.setdefault(key, []).append(entry)
+
+    def play(self, client, operation_name, api_params):
+        """
+        :return: the recorded response of the call, raises its recorded error
+        """
+        meta = client.meta
+        key = _key(meta.region_name, meta.service_model.service_name, operation_name, api_params)
+        with self._lock:
+            replies = self._replies.get(key)
+            if not replies:
+                raise CassetteMiss('Call not in cassette [%s]: %s' % (self.path, key))
+            played = self._played.get(key, 0)
+            self._played[key] = min(played + 1, len(replies) - 1)
+            entry = replies[played]
+        if 'error' in entry:
+            error = {'Error': dict(entry['error']), 'ResponseMetadata': {'HTTPStatusCode': entry['status']}}
+            raise client.exceptions.from_code(entry['error']['Code'])(error, operation_name)
+        response = _decode(entry['response'])
+        response['ResponseMetadata'] = {'HTTPStatusCode': 200}
+        return response
+
+    def record(self, make_api_call, client, operation_name, api_params):
+        """
+        Run the call with make_api_call and keep its response or its error.
+        """
+        meta = client.meta
+        entry = {'region': meta.region_name, 'service': meta.service_model.service_name, 'operation': operation_name,
+                 'params': _encode(normalize(api_params))}
+        try:
+            response = make_api_call(client, operation_name, api_params)
+        except ClientError as e:
+            entry['error'] = {'Code': e.response['Error'].get('Code'), 'Message': e.response['Error'].get('Message')}
+            entry['status'] = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 400)
+            self._append(entry)
+            raise
+        entry['response'] = _encode({k: v for k, v in response.items() if k != 'ResponseMetadata'})
+        self._append(entry)
+        return response
+
+    def _append(self, entry):
+        with self._lock:
+            self.interactions.append(entry)
+
+    def save(self):
+        """
+        Write the calls, a reply repeating the previous one of its key is dropped, like the polls of a resource
+        in the same state.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        last = {}
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for entry in self.interactions:
+                line = json.dumps(entry, sort_keys=True, separators=(',', ':'))
+                key = _key(entry['region'], entry['service'], entry['operation'], entry['params'])
+                if last.get(key) != line:
+                    f.write(line + '\n')
+                    last[key] = line
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def _replay_provider():
+    """
+    Clients that never sign nor send, shared by every replay so that a test does not pay for loading service models.
+    """
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = clients.ClientProvider(config=iac.CONFIG.merge(Config(signature_version=UNSIGNED)))
+        return _provider
+
+
+@contextlib.contextmanager
+def use(name, mode=None):
+    """
+    Replay, or record, the AWS calls of the block, see the module doc.
+    :param name: str, cassette file name without extension
+    :param mode: REPLAY or RECORD, defaults to IAC_CASSETTE_MODE, else REPLAY
+    :return: Cassette
+    """
+    mode = mode or os.environ.get('IAC_CASSETTE_MODE') or REPLAY
+    cassette = Cassette(os.path.join(CASSETTE_DIR, name + '.jsonl'), mode)
+    make_api_call = botocore.client.BaseClient._make_api_call
+
+    def _make_api_call(client, operation_name, api_params):
+        if mode == RECORD:
+            return cassette.record(make_api_call, client, operation_name, api_params)
+        return cassette.play(client, operation_name, api_params)
+
+    with contextlib.ExitStack() as stack:
+        if mode == RECORD and os.environ.get('IAC_CASSETTE_SOURCE') == 'fake':
+            from iac.tests import fake_aws
+
+            stack.enter_context(fake_aws.FakeAWS(speedup=1000).patch())
+        elif mode == REPLAY:
+            stack.enter_context(mock.patch.object(clients, '_provider', _replay_provider()))
+            stack.enter_context(mock.patch.object(waiter, 'clock', VirtualClock()))
+        stack.enter_context(mock.patch.object(botocore.client.BaseClient, '_make_api_call', _make_api_call))
+        yield cassette
+    if mode == RECORD:
+        cassette.save()
@@ -0,0 +1,752 @@
+"""
+A local, latency-simulating stand-in for the EC2/STS/RDS/ECR/ECS/ELBv2/CodeDeploy operations iac calls.
+
+FakeAWS answers at the botocore, and aiobotocore, endpoint level, so parameter validation, retries, throttling
+back-off and client events all run as they do against AWS. Resources move through their real states (DB creating ->
+available, LB provisioning -> active, service DRAINING -> INACTIVE, deployment InProgress -> Succeeded) on a
+simulated clock that runs `speedup` times faster than wall time and that the waiters share.
+"""
+import asyncio
+import collections
+import contextlib
+import importlib.util
+import itertools
+import json
+import threading
+import time
+from unittest import mock
+
+from botocore import UNSIGNED
+from botocore.awsrequest import AWSResponse
+from botocore.config import Config
+
+import iac
+from iac import clients, waiter
+
+ACCOUNT = '123456789012'
+SERVICES = ('ec2', 'sts', 'rds', 'ecr', 'ecs', 'elbv2', 'codedeploy')
+REGION = 'ap-east-1'
+
+# Simulated seconds per API call.
+DEFAULT_LATENCY = {
+    'default': 0.15,
+    'CreateDBInstance': 1.0,
+    'CreateLoadBalancer': 0.8,
+    'CreateService': 1.5,
+}
+
+# Simulated seconds a resource spends in its transitional state.
+DEFAULT_DURATIONS = {
+    'db_instance_create': 420,
+    'db_instance_delete': 300,
+    'load_balancer_create': 150,
+    'service_drain': 60,
+    'code_deploy_deployment': 180,
+}
+
+# Fields UpdateService takes for a service under the CODE_DEPLOY deployment controller.
+CODE_DEPLOY_UPDATABLE_FIELDS = ('desiredCount', 'deploymentConfiguration', 'healthCheckGracePeriodSeconds',
+                                'placementConstraints', 'placementStrategy', 'enableECSManagedTags', 'propagateTags')
+
+
+class ScaledClock(object):
+    """
+    Simulated time running `speedup` times faster than wall time.
+    """
+
+    def __init__(self, speedup=1.0):
+        self.speedup = speedup
+        self._start = time.monotonic()
+
+    def monotonic(self):
+        return (time.monotonic() - self._start) * self.speedup
+
+    def sleep(self, seconds):
+        time.sleep(max(0.0, seconds) / self.speedup)
+
+    def wait(self, condition, seconds):
+        condition.wait(None if seconds is None else max(0.0, seconds) / self.speedup)
+
+
+class _Raw(object):
+
+    def stream(self, **kwargs):
+        return iter([b''])
+
+
+class _AioRaw(object):
+
+    async def read(self):
+        return b''
+
+
+class _Error(Exception):
+
+    def __init__(self, code, message='', status=400):
+        super(_Error, self).__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+class _TokenBucket(object):
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = None
+
+    def take(self, now):
+        if self.updated is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class FakeAWS(object):
+
+    def __init__(self, speedup=1000.0, latency=None, durations=None, throttle=None, region=REGION):
+        """
+        :param speedup: float, simulated seconds per wall second
+        :param latency: {operation name | 'default': simulated seconds}
+        :param durations: {transition: simulated seconds}, see DEFAULT_DURATIONS
+        :param throttle: {service: (requests per second, burst)}, throttled calls fail with Throttling, per region
+        :param region: str, region of the resources of this fake, the other regions get a fake of their own
+        """
+        self.region = region
+        self.regions = {region: self}
+        self._throttle = throttle
+        self.clock = ScaledClock(speedup)
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.durations = dict(DEFAULT_DURATIONS, **(durations or {}))
+        self._buckets = {service: _TokenBucket(*limit) for service, limit in (throttle or {}).items()}
+        self.calls = collections.Counter()
+        self.throttled = collections.Counter()
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+        self.vpc = {'VpcId': 'vpc-1', 'IsDefault': True}
+        self.subnets = [{'SubnetId': 'subnet-%d' % i, 'VpcId': 'vpc-1', 'DefaultForAz': True} for i in (1, 2, 3)]
+        self.security_groups = [{'GroupId': 'sg-1', 'GroupName': 'default', 'VpcId': 'vpc-1'}]
+        self.db_subnet_groups = {}
+        self.db_instances = {}
+        self.repositories = {}
+        self.clusters = {}
+        self.task_definitions = {}
+        self.services = {}
+        self.load_balancers = {}
+        self.target_groups = {}
+        self.listeners = {}
+        self.rules = {}
+        self.applications = {}
+        self.deployment_groups = {}
+        self.deployments = {}
+
+    @contextlib.contextmanager
+    def patch(self):
+        """
+        Route every iac client to the fake and run the waiters on the simulated clock.
+        """
+        provider = clients.ClientProvider(config=iac.CONFIG.merge(Config(signature_version=UNSIGNED)),
+                                          max_workers=clients.get_provider().max_workers)
+        provider.hooks.append(self._hook)
+
+        def _do_get_response(endpoint, request, operation_model, context):
+            return self._respond(request, operation_model, context)
+
+        async def _do_get_response_async(endpoint, request, operation_model, context):
+            from aiobotocore.awsrequest import AioAWSResponse
+
+            # The simulated latency sleeps off the event loop, like a request in flight.
+            (response, parsed), error = await asyncio.get_running_loop().run_in_executor(
+                None, self._respond, request, operation_model, context)
+            return (AioAWSResponse(response.url, response.status_code, {}, _AioRaw()), parsed), error
+
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(mock.patch.object(clients, '_provider', provider))
+            stack.enter_context(mock.patch.object(waiter, 'clock', self.clock))
+            stack.enter_context(mock.patch('botocore.endpoint.time', self.clock))
+            stack.enter_context(mock.patch('botocore.endpoint.Endpoint._do_get_response', _do_get_response))
+            if importlib.util.find_spec('aiobotocore'):
+                stack.enter_context(mock.patch('aiobotocore.endpoint.AioEndpoint._do_get_response',
+                                               _do_get_response_async))
+            # Loading service models takes real milliseconds that the speedup would turn into simulated minutes.
+            for service in SERVICES:
+                provider.get(service)
+            yield self
+
+    def _hook(self, client):
+        def _save_params(params, context, **kwargs):
+            context['fake_aws_params'] = dict(params)
+
+        client.meta.events.register('before-parameter-build', _save_params)
+
+    def _for_region(self, region):
+        """
+        :return: FakeAWS holding the resources of the region, sharing the clock and the call counters
+        """
+        with self._lock:
+            fake = self.regions.get(region)
+            if fake is None:
+                fake = FakeAWS(latency=self.latency, durations=self.durations, throttle=self._throttle, region=region)
+                fake.clock, fake.calls, fake.throttled, fake._lock = self.clock, self.calls, self.throttled, self._lock
+                fake.regions = self.regions
+                self.regions[region] = fake
+            return fake
+
+    def _respond(self, request, operation_model, context):
+        region = context.get('client_region') or self.region
+        if region != self.region:
+            return self._for_region(region)._respond(request, operation_model, context)
+        name = operation_model.name
+        service = operation_model.service_model.endpoint_prefix
+        params = context.get('fake_aws_params', {})
+        with self._lock:
+            self.calls[name] += 1
+            bucket = self._buckets.get(service)
+            throttled = bucket is not None and not bucket.take(self.clock.monotonic())
+            if throttled:
+                self.throttled[name] += 1
+        self.clock.sleep(self.latency.get(name, self.latency['default']))
+        try:
+            if throttled:
+                raise _Error('Throttling', 'Rate exceeded')
+            handler = getattr(self, '_' + name, None)
+            if handler is None:
+                raise _Error('UnsupportedOperation', 'FakeAWS does not implement %s.' % name)
+            with self._lock:
+                status, parsed = 200, handler(params) or {}
+        except _Error as e:
+            status, parsed = e.status, {'Error': {'Code': _error_code(operation_model, e.code), 'Message': e.message}}
+        parsed['ResponseMetadata'] = {'HTTPStatusCode': status, 'HTTPHeaders': {}, 'RequestId': 'fake'}
+        return (AWSResponse(request.url, status, {}, _Raw()), parsed), None
+
+    def _now(self):
+        return self.clock.monotonic()
+
+    def _arn(self, service, resource):
+        return 'arn:aws:%s:%s:%s:%s' % (service, self.region, ACCOUNT, resource)
+
+    # EC2 / STS
+
+    def _GetCallerIdentity(self, params):
+        return {'Account': ACCOUNT, 'Arn': 'arn:aws:iam::%s:user/fake' % ACCOUNT, 'UserId': 'fake'}
+
+    def _DescribeVpcs(self, params):
+        return _page([dict(self.vpc)], params, 'Vpcs')
+
+    def _DescribeSubnets(self, params):
+        return _page([dict(s) for s in self.subnets if _matches(s, params)], params, 'Subnets')
+
+    def _DescribeSecurityGroups(self, params):
+        names = params.get('GroupNames')
+        groups = [dict(g) for g in self.security_groups
+                  if (not names or g['GroupName'] in names) and _matches(g, params)]
+        return _page(groups, params, 'SecurityGroups')
+
+    # RDS
+
+    def _CreateDBSubnetGroup(self, params):
+        name = params['DBSubnetGroupName']
+        if name in self.db_subnet_groups:
+            raise _Error('DBSubnetGroupAlreadyExistsFault')
+        self.db_subnet_groups[name] = {'DBSubnetGroupName': name, 'VpcId': self.vpc['VpcId'],
+                                       'Subnets': [{'SubnetIdentifier': s} for s in params['SubnetIds']]}
+        return {'DBSubnetGroup': self.db_subnet_groups[name]}
+
+    def _DescribeDBSubnetGroups(self, params):
+        name = params.get('DBSubnetGroupName')
+        if name and name not in self.db_subnet_groups:
+            raise _Error('DBSubnetGroupNotFoundFault', status=404)
+        return {'DBSubnetGroups': [g for n, g in self.db_subnet_groups.items() if not name or n == name]}
+
+    def _DeleteDBSubnetGroup(self, params):
+        name = params['DBSubnetGroupName']
+        if any(self.db_instances[i]['params'].get('DBSubnetGroupName') == name for i in self._live_db_instances()):
+            raise _Error('InvalidDBSubnetGroupStateFault', 'The DB subnet group is in use.')
+        if self.db_subnet_groups.pop(name, None) is None:
+            raise _Error('DBSubnetGroupNotFoundFault', status=404)
+
+    def _CreateDBInstance(self, params):
+        ident = params['DBInstanceIdentifier']
+        if ident in self.db_instances:
+            raise _Error('DBInstanceAlreadyExistsFault')
+        self.db_instances[ident] = {
+            'params': params,
+            'created_at': self._now(),
+            'deleted_at': None,
+        }
+        return {'DBInstance': self._db_instance(ident)}
+
+    def _db_instance(self, ident):
+        db = self.db_instances[ident]
+        params = db['params']
+        if db['deleted_at'] is not None:
+            status = 'deleting'
+        elif self._now() - db['created_at'] < self.durations['db_instance_create']:
+            status = 'creating'
+        else:
+            status = 'available'
+        instance = {
+            'DBInstanceIdentifier': ident,
+            'DBInstanceArn': self._arn('rds', 'db:%s' % ident),
+            'DBInstanceClass': params['DBInstanceClass'],
+            'Engine': params['Engine'],
+            'DBInstanceStatus': status,
+            'MasterUsername': params['MasterUsername'],
+            'DBName': params['DBName'],
+            'AllocatedStorage': params['AllocatedStorage'],
+            'MultiAZ': params.get('MultiAZ', False),
+            'DBSubnetGroup': {'DBSubnetGroupName': params.get('DBSubnetGroupName')},
+            'VpcSecurityGroups': [{'VpcSecurityGroupId': g, 'Status': 'active'}
+                                  for g in params.get('VpcSecurityGroupIds', [])],
+        }
+        if status == 'available':
+            instance['Endpoint'] = {'Address': '%s.fake.%s.rds.amazonaws.com' % (ident, self.region),
+                                    'Port': params.get('Port', 3306)}
+        return instance
+
+    def _live_db_instances(self):
+        for ident, db in list(self.db_instances.items()):
+            if db['deleted_at'] is not None and self._now() - db['deleted_at'] >= self.durations['db_instance_delete']:
+                del self.db_instances[ident]
+        return list(self.db_instances)
+
+    def _DescribeDBInstances(self, params):
+        idents = self._live_db_instances()
+        if params.get('DBInstanceIdentifier'):
+            if params['DBInstanceIdentifier'] not in idents:
+                raise _Error('DBInstanceNotFoundFault', status=404)
+            idents = [params['DBInstanceIdentifier']]
+        for f in params.get('Filters', []):
+            if f['Name'] == 'db-instance-id':
+                idents = [i for i in idents if i in f['Values']]
+        return {'DBInstances': [self._db_instance(i) for i in idents]}
+
+    def _DeleteDBInstance(self, params):
+        ident = params['DBInstanceIdentifier']
+        if ident not in self._live_db_instances():
+            raise _Error('DBInstanceNotFoundFault', status=404)
+        if self.db_instances[ident]['deleted_at'] is not None:
+            raise _Error('InvalidDBInstanceStateFault', 'The DB instance is already being deleted.')
+        self.db_instances[ident]['deleted_at'] = self._now()
+        return {'DBInstance': self._db_instance(ident)}
+
+    # ECR
+
+    def _CreateRepository(self, params):
+        name = params['repositoryName']
+        if name in self.repositories:
+            raise _Error('RepositoryAlreadyExistsException')
+        self.repositories[name] = {
+            'repositoryName': name,
+            'repositoryArn': self._arn('ecr', 'repository/%s' % name),
+            'repositoryUri': '%s.dkr.ecr.%s.amazonaws.com/%s' % (ACCOUNT, self.region, name),
+            'imageTagMutability': params.get('imageTagMutability', 'MUTABLE'),
+        }
+        return {'repository': self.repositories[name]}
+
+    def _DescribeRepositories(self, params):
+        names = params.get('repositoryNames')
+        missing = [n for n in names or [] if n not in self.repositories]
+        if missing:
+            raise _Error('RepositoryNotFoundException', status=404)
+        return {'repositories': [r for n, r in self.repositories.items() if not names or n in names]}
+
+    def _DeleteRepository(self, params):
+        repo = self.repositories.pop(params['repositoryName'], None)
+        if repo is None:
+            raise _Error('RepositoryNotFoundException', status=404)
+        return {'repository': repo}
+
+    # ECS
+
+    def _cluster_name(self, cluster):
+        name = cluster.split('/')[-1]
+        if name not in self.clusters or self.clusters[name]['status'] != 'ACTIVE':
+            raise _Error('ClusterNotFoundException', status=404)
+        return name
+
+    def _CreateCluster(self, params):
+        name = params['clusterName']
+        self.clusters[name] = {'clusterName': name, 'clusterArn': self._arn('ecs', 'cluster/%s' % name),
+                               'status': 'ACTIVE'}
+        return {'cluster': self.clusters[name]}
+
+    def _DescribeClusters(self, params):
+        found = [self.clusters[c.split('/')[-1]] for c in params.get('clusters', [])
+                 if c.split('/')[-1] in self.clusters]
+        return {'clusters': found, 'failures': []}
+
+    def _ListClusters(self, params):
+        return {'clusterArns': [c['clusterArn'] for c in self.clusters.values() if c['status'] == 'ACTIVE']}
+
+    def _DeleteCluster(self, params):
+        name = self._cluster_name(params['cluster'])
+        if any(s['status'] != 'INACTIVE' for (c, _), s in self._services().items() if c == name):
+            raise _Error('ClusterContainsServicesException')
+        self.clusters[name]['status'] = 'INACTIVE'
+        return {'cluster': self.clusters[name]}
+
+    def _RegisterTaskDefinition(self, params):
+        family = params['family']
+        revisions = self.task_definitions.setdefault(family, [])
+        revision = len(revisions) + 1
+        task_def = dict(params, revision=revision, status='ACTIVE',
+                        taskDefinitionArn=self._arn('ecs', 'task-definition/%s:%d' % (family, revision)))
+        task_def.pop('tags', None)
+        revisions.append({'taskDefinition': task_def, 'tags': params.get('tags', [])})
+        return {'taskDefinition': task_def, 'tags': params.get('tags', [])}
+
+    def _task_definition(self, ref):
+        ref = ref.split('/')[-1]
+        family, _, revision = ref.partition(':')
+        active = [r for r in self.task_definitions.get(family, []) if r['taskDefinition']['status'] == 'ACTIVE']
+        if revision:
+            active = [r for r in self.task_definitions.get(family, [])
+                      if r['taskDefinition']['revision'] == int(revision)]
+        if not active:
+            raise _Error('ClientException', 'Unable to describe task definition.')
+        return active[-1]
+
+    def _DescribeTaskDefinition(self, params):
+        found = self._task_definition(params['taskDefinition'])
+        response = {'taskDefinition': found['taskDefinition']}
+        if 'TAGS' in params.get('include', []):
+            response['tags'] = found['tags']
+        return response
+
+    def _ListTaskDefinitions(self, params):
+        family = params.get('familyPrefix')
+        status = params.get('status', 'ACTIVE')
+        return {'taskDefinitionArns': [r['taskDefinition']['taskDefinitionArn']
+                                       for f, revisions in self.task_definitions.items() if not family or f == family
+                                       for r in revisions if r['taskDefinition']['status'] == status]}
+
+    def _DeregisterTaskDefinition(self, params):
+        found = self._task_definition(params['taskDefinition'])
+        found['taskDefinition']['status'] = 'INACTIVE'
+        return {'taskDefinition': found['taskDefinition']}
+
+    def _services(self):
+        for s in self.services.values():
+            if s['status'] == 'DRAINING' and self._now() - s['deleted_at'] >= self.durations['service_drain']:
+                s['status'] = 'INACTIVE'
+        return self.services
+
+    def _service(self, s):
+        return {k: v for k, v in s.items() if k != 'deleted_at'}
+
+    def _CreateService(self, params):
+        cluster = self._cluster_name(params['cluster'])
+        key = (cluster, params['serviceName'])
+        if key in self._services() and self.services[key]['status'] != 'INACTIVE':
+            raise _Error('InvalidParameterException', 'Creation of service was not idempotent.')
+        service = dict(params, status='ACTIVE', deleted_at=None,
+                       serviceArn=self._arn('ecs', 'service/%s/%s' % key),
+                       clusterArn=self.clusters[cluster]['clusterArn'],
+                       taskDefinition=self._task_definition(params['taskDefinition'])['taskDefinition'][
+                           'taskDefinitionArn'])
+        service.pop('cluster')
+        self.services[key] = service
+        return {'service': self._service(service)}
+
+    def _DescribeServices(self, params):
+        cluster = self._cluster_name(params['cluster'])
+        found, failures = [], []
+        for name in params['services']:
+            service = self._services().get((cluster, name.split('/')[-1]))
+            if service is None:
+                failures.append({'arn': name, 'reason': 'MISSING'})
+            else:
+                found.append(self._service(service))
+        return {'services': found, 'failures': failures}
+
+    def _ListServices(self, params):
+        cluster = self._cluster_name(params.get('cluster', 'default'))
+        return {'serviceArns': [s['serviceArn'] for (c, _), s in self._services().items()
+                                if c == cluster and s['status'] != 'INACTIVE']}
+
+    def _UpdateService(self, params):
+        cluster = self._cluster_name(params['cluster'])
+        service = self._services().get((cluster, params['service']))
+        if service is None or service['status'] != 'ACTIVE':
+            raise _Error('ServiceNotActiveException')
+        changes = {k: v for k, v in params.items() if k not in ('cluster', 'service', 'forceNewDeployment')}
+        if service['deploymentController']['type'] == 'CODE_DEPLOY' and set(changes) - set(
+                CODE_DEPLOY_UPDATABLE_FIELDS):
+            raise _Error('InvalidParameterException', 'Unable to update %s on services with a CODE_DEPLOY deployment '
+                         'controller. Use AWS CodeDeploy to trigger a new deployment.'
+                         % sorted(set(changes) - set(CODE_DEPLOY_UPDATABLE_FIELDS)))
+        if 'taskDefinition' in changes:
+            changes['taskDefinition'] = self._task_definition(changes['taskDefinition'])['taskDefinition'][
+                'taskDefinitionArn']
+        service.update(changes)
+        return {'service': self._service(service)}
+
+    def _DeleteService(self, params):
+        cluster = self._cluster_name(params['cluster'])
+        service = self._services().get((cluster, params['service']))
+        if service is None or service['status'] == 'INACTIVE':
+            raise _Error('ServiceNotFoundException', status=404)
+        service['status'] = 'DRAINING'
+        service['deleted_at'] = self._now()
+        return {'service': self._service(service)}
+
+    # CodeDeploy
+
+    def _CreateApplication(self, params):
+        name = params['applicationName']
+        if name in self.applications:
+            raise _Error('ApplicationAlreadyExistsException')
+        self.applications[name] = dict(params, applicationId='app-%d' % next(self._ids))
+        return {'applicationId': self.applications[name]['applicationId']}
+
+    def _DeleteApplication(self, params):
+        self.applications.pop(params['applicationName'], None)
+        for key in [k for k in self.deployment_groups if k[0] == params['applicationName']]:
+            del self.deployment_groups[key]
+
+    def _deployment_group(self, params):
+        if params['applicationName'] not in self.applications:
+            raise _Error('ApplicationDoesNotExistException')
+        group = self.deployment_groups.get((params['applicationName'], params['deploymentGroupName']))
+        if group is None:
+            raise _Error('DeploymentGroupDoesNotExistException')
+        return group
+
+    def _GetDeploymentGroup(self, params):
+        return {'deploymentGroupInfo': dict(self._deployment_group(params))}
+
+    def _CreateDeploymentGroup(self, params):
+        if params['applicationName'] not in self.applications:
+            raise _Error('ApplicationDoesNotExistException')
+        key = (params['applicationName'], params['deploymentGroupName'])
+        if key in self.deployment_groups:
+            raise _Error('DeploymentGroupAlreadyExistsException')
+        for ecs_service in params['ecsServices']:
+            service = self._services().get((ecs_service['clusterName'], ecs_service['serviceName']))
+            if service is None or service['status'] != 'ACTIVE':
+                raise _Error('InvalidECSServiceException')
+        self.deployment_groups[key] = dict(params, deploymentGroupId='dg-%d' % next(self._ids))
+        return {'deploymentGroupId': self.deployment_groups[key]['deploymentGroupId']}
+
+    def _CreateDeployment(self, params):
+        group = self._deployment_group(params)
+        app_spec = json.loads(params['revision']['appSpecContent']['content'])
+        properties = app_spec['Resources'][0]['TargetService']['Properties']
+        ecs_service = group['ecsServices'][0]
+        service = self._services()[(ecs_service['clusterName'], ecs_service['serviceName'])]
+        awsvpc = properties['NetworkConfiguration']['AwsvpcConfiguration']
+        service.update(
+            taskDefinition=self._task_definition(properties['TaskDefinition'])['taskDefinition']['taskDefinitionArn'],
+            platformVersion=properties['PlatformVersion'],
+            networkConfiguration={'awsvpcConfiguration': {'subnets': awsvpc['Subnets'],
+                                                          'securityGroups': awsvpc['SecurityGroups'],
+                                                          'assignPublicIp': awsvpc['AssignPublicIp']}})
+        # The production traffic moves to the other target group of the pair.
+        for pair in group['loadBalancerInfo']['targetGroupPairInfoList']:
+            blue, green = (self.target_groups[tg['name']]['TargetGroupArn'] for tg in pair['targetGroups'])
+            swap = {blue: green, green: blue}
+            for arn in pair['prodTrafficRoute']['listenerArns']:
+                listener = self.listeners[arn]
+                listener['DefaultActions'] = _swap_target_groups(listener['DefaultActions'], swap)
+                for rule in self.rules.values():
+                    if rule['ListenerArn'] == arn:
+                        rule['Actions'] = _swap_target_groups(rule['Actions'], swap)
+        deployment_id = 'd-%d' % next(self._ids)
+        self.deployments[deployment_id] = {'deploymentId': deployment_id,
+                                           'applicationName': params['applicationName'],
+                                           'deploymentGroupName': params['deploymentGroupName'],
+                                           'created_at': self._now()}
+        return {'deploymentId': deployment_id}
+
+    def _BatchGetDeployments(self, params):
+        found = []
+        for deployment_id in params['deploymentIds']:
+            deployment = self.deployments.get(deployment_id)
+            if deployment is not None:
+                deployment = dict(deployment)
+                running = self._now() - deployment.pop('created_at') < self.durations['code_deploy_deployment']
+                deployment['status'] = 'InProgress' if running else 'Succeeded'
+                found.append(deployment)
+        return {'deploymentsInfo': found}
+
+    # ELBv2
+
+    def _CreateLoadBalancer(self, params):
+        name = params['Name']
+        if name in self.load_balancers:
+            raise _Error('DuplicateLoadBalancerNameException')
+        self.load_balancers[name] = {
+            'LoadBalancerName': name,
+            'LoadBalancerArn': self._arn('elasticloadbalancing', 'loadbalancer/app/%s/%d' % (name, next(self._ids))),
+            'DNSName': '%s.%s.elb.amazonaws.com' % (name, self.region),
+            'Type': params.get('Type', 'application'),
+            'Scheme': params.get('Scheme', 'internet-facing'),
+            'VpcId': self.vpc['VpcId'],
+            'created_at': self._now(),
+        }
+        return {'LoadBalancers': [self._load_balancer(self.load_balancers[name])]}
+
+    def _load_balancer(self, lb):
+        lb = dict(lb)
+        provisioning = self._now() - lb.pop('created_at') < self.durations['load_balancer_create']
+        lb['State'] = {'Code': 'provisioning' if provisioning else 'active'}
+        return lb
+
+    def _DescribeLoadBalancers(self, params):
+        lbs = list(self.load_balancers.values())
+        if params.get('Names'):
+            if any(n not in self.load_balancers for n in params['Names']):
+                raise _Error('LoadBalancerNotFoundException', status=400)
+            lbs = [self.load_balancers[n] for n in params['Names']]
+        if params.get('LoadBalancerArns'):
+            lbs = [lb for lb in lbs if lb['LoadBalancerArn'] in params['LoadBalancerArns']]
+        return _page([self._load_balancer(lb) for lb in lbs], params, 'LoadBalancers', 'Marker', 'PageSize',
+                     'NextMarker')
+
+    def _DeleteLoadBalancer(self, params):
+        for name, lb in list(self.load_balancers.items()):
+            if lb['LoadBalancerArn'] == params['LoadBalancerArn']:
+                del self.load_balancers[name]
+                for arn, listener in list(self.listeners.items()):
+                    if listener['LoadBalancerArn'] == lb['LoadBalancerArn']:
+                        del self.listeners[arn]
+
+    def _CreateTargetGroup(self, params):
+        name = params['Name']
+        if name in self.target_groups:
+            raise _Error('DuplicateTargetGroupNameException')
+        self.target_groups[name] = {
+            'TargetGroupName': name,
+            'TargetGroupArn': self._arn('elasticloadbalancing', 'targetgroup/%s/%d' % (name, next(self._ids))),
+            'Protocol': params.get('Protocol'),
+            'Port': params.get('Port'),
+            'VpcId': params.get('VpcId'),
+            'TargetType': params.get('TargetType'),
+            'LoadBalancerArns': [],
+        }
+        return {'TargetGroups': [dict(self.target_groups[name])]}
+
+    def _DescribeTargetGroups(self, params):
+        tgs = list(self.target_groups.values())
+        if params.get('Names'):
+            if any(n not in self.target_groups for n in params['Names']):
+                raise _Error('TargetGroupNotFoundException', status=400)
+            tgs = [self.target_groups[n] for n in params['Names']]
+        if params.get('TargetGroupArns'):
+            tgs = [tg for tg in tgs if tg['TargetGroupArn'] in params['TargetGroupArns']]
+        return _page([dict(tg) for tg in tgs], params, 'TargetGroups', 'Marker', 'PageSize', 'NextMarker')
+
+    def _DeleteTargetGroup(self, params):
+        for name, tg in list(self.target_groups.items()):
+            if tg['TargetGroupArn'] == params['TargetGroupArn']:
+                if any(l['DefaultActions'][0].get('TargetGroupArn') == tg['TargetGroupArn']
+                       for l in self.listeners.values()):
+                    raise _Error('ResourceInUseException')
+                if any(a.get('TargetGroupArn') == tg['TargetGroupArn'] for r in self.rules.values()
+                       for a in r['Actions']):
+                    raise _Error('ResourceInUseException')
+                if any(lb.get('targetGroupArn') == tg['TargetGroupArn'] for s in self._services().values()
+                       if s['status'] != 'INACTIVE' for lb in s.get('loadBalancers', [])):
+                    raise _Error('ResourceInUseException')
+                del self.target_groups[name]
+
+    def _CreateListener(self, params):
+        for listener in self.listeners.values():
+            if listener['LoadBalancerArn'] == params['LoadBalancerArn'] and listener['Port'] == params['Port']:
+                raise _Error('DuplicateListenerException')
+        arn = params['LoadBalancerArn'].replace(':loadbalancer/', ':listener/') + '/%d' % next(self._ids)
+        self.listeners[arn] = dict(params, ListenerArn=arn)
+        return {'Listeners': [dict(self.listeners[arn])]}
+
+    def _DescribeListeners(self, params):
+        listeners = [l for l in self.listeners.values()
+                     if l['LoadBalancerArn'] == params.get('LoadBalancerArn', l['LoadBalancerArn'])
+                     and l['ListenerArn'] in params.get('ListenerArns', [l['ListenerArn']])]
+        return {'Listeners': [dict(l) for l in listeners]}
+
+    def _DeleteListener(self, params):
+        if self.listeners.pop(params['ListenerArn'], None) is None:
+            raise _Error('ListenerNotFoundException', status=400)
+        for arn, rule in list(self.rules.items()):
+            if rule['ListenerArn'] == params['ListenerArn']:
+                del self.rules[arn]
+
+    def _CreateRule(self, params):
+        if params['ListenerArn'] not in self.listeners:
+            raise _Error('ListenerNotFoundException', status=400)
+        for rule in self.rules.values():
+            if rule['ListenerArn'] == params['ListenerArn'] and rule['Priority'] == str(params['Priority']):
+                raise _Error('PriorityInUseException')
+        arn = params['ListenerArn'].replace(':listener/', ':listener-rule/') + '/%d' % next(self._ids)
+        self.rules[arn] = dict(params, RuleArn=arn, Priority=str(params['Priority']))
+        return {'Rules': [dict(self.rules[arn])]}
+
+    def _DescribeRules(self, params):
+        return {'Rules': [dict(r) for r in self.rules.values() if r['ListenerArn'] == params.get('ListenerArn')]}
+
+    def _ModifyRule(self, params):
+        rule = self.rules.get(params['RuleArn'])
+        if rule is None:
+            raise _Error('RuleNotFoundException', status=400)
+        rule.update({k: v for k, v in params.items() if k != 'RuleArn'})
+        return {'Rules': [dict(rule)]}
+
+
+def _swap_target_groups(actions, swap):
+    """
+    :param swap: {TargetGroupArn: TargetGroupArn}
+    :return: the listener or rule actions forwarding to the swapped target groups
+    """
+    if isinstance(actions, dict):
+        return {k: swap.get(v, v) if k == 'TargetGroupArn' else _swap_target_groups(v, swap)
+                for k, v in actions.items()}
+    if isinstance(actions, list):
+        return [_swap_target_groups(a, swap) for a in actions]
+    return actions
+
+
+# EC2 filter name -> item field.
+FILTER_FIELDS = {'vpc-id': 'VpcId', 'default-for-az': 'DefaultForAz', 'group-name': 'GroupName',
+                 'is-default': 'IsDefault'}
+
+
+def _matches(item, params):
+    """
+    :return: bool, the item passes every EC2 filter of the request
+    """
+    for f in params.get('Filters', []):
+        value = item.get(FILTER_FIELDS[f['Name']])
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        if value not in f['Values']:
+            return False
+    return True
+
+
+def _page(items, params, key, token='NextToken', size='MaxResults', next_token='NextToken'):
+    """
+    :return: response holding the page of the items the request asks for, every item when it sets no page size
+    """
+    start = int(params.get(token) or 0)
+    count = params.get(size) or len(items)
+    response = {key: items[start:start + count]}
+    if start + count < len(items):
+        response[next_token] = str(start + count)
+    return response
+
+
+def _error_code(operation_model, name):
+    """
+    :return: the error code botocore maps to the modeled exception of the given shape name
+    """
+    try:
+        return operation_model.service_model.shape_for(name).error_code or name
+    except Exception:
+        return name
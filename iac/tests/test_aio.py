@@ -0,0 +1,104 @@
+import asyncio
+import threading
+from unittest import TestCase, mock
+
+from iac import aio, clients, ec2, ratelimit, stack, telemetry
+from iac.tests import bench, fake_aws
+
+STACKS = 30
+WORKERS = 4
+
+# Simulated seconds allowed on top of the RDS create.
+SLACK = 150
+
+
+class ThreadSampler(object):
+    """
+    Peak thread count of the process while the block runs.
+    """
+
+    def __enter__(self):
+        self.peak = threading.active_count()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._done.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+
+
+def _lookup(step):
+    try:
+        return (yield step)
+    except KeyError:
+        return 'missing'
+
+
+class TestAio(TestCase):
+
+    def setUp(self):
+        ec2.vpc_cache.invalidate()
+
+    def test_many_stacks_on_a_few_workers(self):
+        fake = fake_aws.FakeAWS(speedup=200)
+        before = threading.active_count()
+        with fake.patch(), ThreadSampler() as sampler:
+            statuses = stack.provision_all_async(bench.stores(STACKS), max_workers=WORKERS, backend=aio.THREADS)
+
+        self.assertEqual({status['state'] for status in statuses.values()}, {'SUCCESS'})
+        for status in statuses.values():
+            self.assertLess(status['duration'], fake_aws.DEFAULT_DURATIONS['db_instance_create'] + SLACK)
+            self.assertTrue(status['results']['SQLALCHEMY_DATABASE_URI'])
+        self.assertEqual(fake.calls['CreateService'], STACKS)
+        self.assertEqual(fake.calls['DescribeVpcs'], 1)
+        # The workers, the shared poller and the sampler, no thread per waiting task.
+        self.assertLessEqual(sampler.peak - before, WORKERS + 2)
+
+    def test_destroy_and_a_failed_stack(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            stack.provision_all_async(bench.stores(2), backend=aio.THREADS)
+            stores = bench.stores(2)
+            del stores['tenant-1']['LBName']
+            statuses = stack.provision_all_async(stores, destroy=True, backend=aio.THREADS)
+
+        self.assertEqual(statuses['tenant-0']['state'], 'SUCCESS')
+        self.assertEqual(statuses['tenant-1']['state'], 'FAILURE')
+        self.assertIn('LBName', statuses['tenant-1']['error'])
+        self.assertEqual(set(fake.load_balancers), {bench.stores(2)['tenant-1']['LBName']})
+        self.assertEqual(fake.services[('my-cluster-0', 'mypoc-svc-0')]['status'], 'INACTIVE')
+
+    def test_aiobotocore_clients_get_the_client_hooks(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            provider = clients.get_provider()
+            limiter = ratelimit.install(provider, {'ecs': {ratelimit.MUTATE: (1.0, 1)}})
+            collector = telemetry.install(provider)
+            with mock.patch.object(provider, 'apply_hooks', wraps=provider.apply_hooks) as apply_hooks:
+                statuses = stack.provision_all_async({'default': dict(bench.STORE)}, backend=aio.AIOBOTOCORE)
+
+        self.assertEqual(statuses['default']['state'], 'SUCCESS')
+        self.assertTrue(any(type(call.args[0]).__module__.startswith('aiobotocore')
+                            for call in apply_hooks.call_args_list))
+        # The ECS creates of a first provisioning are all made by the aiobotocore client.
+        bucket = limiter.bucket('ecs', 'CreateService', fake.region)
+        self.assertIsNotNone(bucket.updated)
+        self.assertLess(bucket.tokens, 1)
+        ops = {(op['operation'], op['task']): op for op in collector.report()['operations']}
+        self.assertEqual(ops[('CreateService', 'create_service')]['calls'], 1)
+        self.assertEqual(ops[('CreateCluster', 'create_cluster')]['calls'], 1)
+
+    def test_a_failed_step_is_raised_in_the_body_under_both_drivers(self):
+        async def _get(key):
+            return {'a': 1}[key]
+
+        self.assertEqual(aio.drive(_lookup(aio.Blocking({'a': 1}.__getitem__, 'a'))), 1)
+        self.assertEqual(aio.drive(_lookup(aio.Blocking({'a': 1}.__getitem__, 'b'))), 'missing')
+        self.assertEqual(asyncio.run(aio.drive_async(_lookup(_get('a')))), 1)
+        self.assertEqual(asyncio.run(aio.drive_async(_lookup(_get('b')))), 'missing')
@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+from iac import ec2
+from iac.tests import bench, fake_aws
+
+# Simulated seconds allowed on top of the RDS create, the longest resource of the topology.
+SLACK = 60
+
+
+class TestBench(TestCase):
+
+    def setUp(self):
+        ec2.vpc_cache.invalidate()
+
+    def test_provision_is_bounded_by_rds(self):
+        report = bench.run(speedup=200)
+
+        rds = fake_aws.DEFAULT_DURATIONS['db_instance_create']
+        self.assertLess(report['total'], rds + SLACK)
+        self.assertIn('iac.rds.wait_db_available', [name for name, _, _ in report['critical_path']])
+        self.assertEqual(report['calls']['CreateService'], 1)
+        self.assertLessEqual(report['calls']['DescribeDBInstances'], 80)
+
+    def test_throttled_run_still_completes(self):
+        limits = {s: (0.5, 1) for s in bench.THROTTLED_SERVICES}
+        fake = fake_aws.FakeAWS(speedup=400, throttle=limits)
+        report = bench.run(fake=fake)
+
+        self.assertTrue(report['throttled'])
+        self.assertEqual(fake.services[('my-cluster', 'mypoc-svc')]['status'], 'ACTIVE')
+
+    def test_many_stacks_take_about_as_long_as_one(self):
+        report = bench.run_all(10, speedup=100)
+
+        rds = fake_aws.DEFAULT_DURATIONS['db_instance_create']
+        self.assertEqual({state for state, _ in report['stacks'].values()}, {'SUCCESS'})
+        self.assertLess(report['total'], rds + 2 * SLACK)
+        # Default VPC discovery is shared by the stacks.
+        self.assertEqual(report['calls']['DescribeVpcs'], 1)
+        self.assertEqual(report['calls']['CreateService'], 10)
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import threading
+from unittest import TestCase, mock
+
+from iac import cache, ec2, utils
+from iac.tests import fake_aws
+
+
+class TestVpcCache(TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def mock_make_api_call(self, operation_name, api_params):
+        self.calls.append(operation_name)
+        if operation_name == 'DescribeVpcs':
+            return {'Vpcs': [{'VpcId': 'VpcId'}]}
+        if operation_name == 'DescribeSubnets':
+            return {'Subnets': [{'SubnetId': 'SubnetId'}]}
+        if operation_name == 'DescribeSecurityGroups':
+            return {'SecurityGroups': [{'GroupId': 'GroupId'}]}
+        if operation_name == 'GetCallerIdentity':
+            return {'Account': '123456789012'}
+        raise AssertionError(operation_name)
+
+    def _load(self):
+        calls = self
+
+        def _make_api_call(client, operation_name, api_params):
+            return calls.mock_make_api_call(operation_name, api_params)
+
+        with mock.patch('botocore.client.BaseClient._make_api_call', new=_make_api_call):
+            return ec2.load_default_vpc_info()
+
+    def test_memory_cache_shared_between_flows(self):
+        with mock.patch.object(ec2, 'vpc_cache', cache.TTLCache('vpc', 60)):
+            self.assertEqual(self._load(), ('VpcId', ['SubnetId'], ['GroupId']))
+            self.assertEqual(self._load(), ('VpcId', ['SubnetId'], ['GroupId']))
+            self.assertEqual(self.calls, ['DescribeVpcs', 'DescribeSubnets', 'DescribeSecurityGroups'])
+
+            ec2.invalidate_default_vpc_info()
+            self._load()
+            self.assertEqual(len(self.calls), 6)
+
+    def test_warm_disk_cache_makes_no_ec2_calls(self):
+        with tempfile.TemporaryDirectory() as d:
+            with mock.patch.object(ec2, 'vpc_cache', cache.TTLCache('vpc', 60, directory=d)):
+                self._load()
+            self.calls.clear()
+            with mock.patch.object(ec2, 'vpc_cache', cache.TTLCache('vpc', 60, directory=d)):
+                self.assertEqual(self._load(), ('VpcId', ['SubnetId'], ['GroupId']))
+            self.assertEqual([c for c in self.calls if c.startswith('Describe')], [])
+
+    def test_caches_sharing_a_directory_write_a_key_at_once(self):
+        with tempfile.TemporaryDirectory() as d:
+            caches = [cache.TTLCache('vpc', 60, directory=d) for _ in range(8)]
+            errors = []
+
+            def _write(vpc_cache):
+                try:
+                    for i in range(50):
+                        vpc_cache.set('ap-east-1', ['VpcId', i])
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=_write, args=(c,)) for c in caches]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(errors, [])
+            self.assertEqual(os.listdir(d), ['vpc-ap-east-1.json'])
+            self.assertEqual(cache.TTLCache('vpc', 60, directory=d).get('ap-east-1'), ['VpcId', 49])
+
+    def test_cold_key_does_not_block_other_keys(self):
+        vpc_cache = cache.TTLCache('vpc', 60)
+        loading, release = threading.Event(), threading.Event()
+
+        def _slow():
+            loading.set()
+            release.wait(5)
+            return 'slow'
+
+        thread = threading.Thread(target=vpc_cache.get_or_load, args=('ap-east-1', _slow))
+        thread.start()
+        self.assertTrue(loading.wait(5))
+        try:
+            self.assertEqual(vpc_cache.get_or_load('us-east-1', lambda: 'fast'), 'fast')
+            self.assertIsNone(vpc_cache.get('ap-east-1'))
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(vpc_cache.get_or_load('ap-east-1', lambda: 'again'), 'slow')
+
+
+class TestDiscovery(TestCase):
+
+    def setUp(self):
+        # A large account: 250 default subnets in the default VPC, thousands of other subnets and groups.
+        self.fake = fake_aws.FakeAWS()
+        self.fake.subnets = [{'SubnetId': 'subnet-%d' % i, 'VpcId': 'vpc-1', 'DefaultForAz': True} for i in range(250)]
+        self.fake.subnets += [{'SubnetId': 'subnet-x%d' % i, 'VpcId': 'vpc-%d' % (i % 500 + 2), 'DefaultForAz': False}
+                              for i in range(5000)]
+        self.fake.security_groups += [{'GroupId': 'sg-x%d' % i, 'GroupName': 'default' if i % 2 else 'app-%d' % i,
+                                       'VpcId': 'vpc-%d' % (i + 2)} for i in range(2000)]
+
+    def test_every_page_is_read_with_filters_pushed_down(self):
+        with self.fake.patch():
+            subnets = ec2.get_default_subnet_ids('vpc-1')
+            groups = ec2.get_default_security_group_ids('vpc-1')
+
+        self.assertEqual(len(subnets), 250)
+        self.assertEqual(self.fake.calls['DescribeSubnets'], 3)
+        self.assertEqual(groups, ['sg-1'])
+        self.assertEqual(self.fake.calls['DescribeSecurityGroups'], 1)
+
+    def test_first_match_stops_paginating(self):
+        with self.fake.patch():
+            subnet = next(utils.paginate(ec2.client, 'describe_subnets', 'Subnets', page_size=ec2.PAGE_SIZE,
+                                         Filters=[{'Name': 'vpc-id', 'Values': ['vpc-1']}]))
+
+        self.assertEqual(subnet['SubnetId'], 'subnet-0')
+        self.assertEqual(self.fake.calls['DescribeSubnets'], 1)
@@ -0,0 +1,93 @@
+import copy
+from unittest import TestCase, mock
+
+from iac import codedeploy, ecs
+from iac.tests import fake_aws
+
+TASK_DEF_V1 = 'arn:aws:ecs:ap-east-1:123456789012:task-definition/mypoc-task-def:1'
+TASK_DEF_V2 = 'arn:aws:ecs:ap-east-1:123456789012:task-definition/mypoc-task-def:2'
+
+
+class TestDeployService(TestCase):
+
+    def setUp(self):
+        spec = ecs.service_spec('my-cluster', 'mypoc-svc', TASK_DEF_V1, ['SubnetId'], ['GroupId'], 'TargetGroupArn')
+        self.service = dict(spec, status='ACTIVE')
+        self.deployment_status = 'Succeeded'
+        self.calls = []
+
+    def _execute(self, taskDefinition, **kwargs):
+        def _make_api_call(client, operation_name, api_params):
+            self.calls.append(operation_name)
+            if operation_name == 'DescribeServices':
+                return {'services': [copy.deepcopy(self.service)]}
+            if operation_name == 'DeleteService':
+                self.service['status'] = 'INACTIVE'
+            if operation_name == 'CreateDeployment':
+                return {'deploymentId': 'd-1'}
+            if operation_name == 'BatchGetDeployments':
+                return {'deploymentsInfo': [{'deploymentId': 'd-1', 'status': self.deployment_status}]}
+            return {}
+
+        with mock.patch('botocore.client.BaseClient._make_api_call', new=_make_api_call):
+            ecs.deploy_service('my-cluster', 'mypoc-svc', taskDefinition, ['SubnetId'], ['GroupId'], 'TargetGroupArn',
+                               **kwargs)
+
+    def test_unchanged_service_is_left_alone(self):
+        self._execute(TASK_DEF_V1)
+        self.assertEqual(self.calls, ['DescribeServices'])
+
+    def test_new_task_definition_is_deployed_in_place(self):
+        self._execute(TASK_DEF_V2, codeDeployApplication='app', codeDeployDeploymentGroup='group')
+        self.assertEqual(self.calls, ['DescribeServices', 'CreateDeployment', 'BatchGetDeployments'])
+
+    def test_failed_deployment_raises(self):
+        self.deployment_status = 'Failed'
+        with self.assertRaises(codedeploy.DeploymentFailed):
+            self._execute(TASK_DEF_V2, codeDeployApplication='app', codeDeployDeploymentGroup='group')
+
+    def test_deployment_without_deployment_group_fails_loudly(self):
+        with self.assertRaises(ValueError):
+            self._execute(TASK_DEF_V2)
+        self.assertEqual(self.calls, ['DescribeServices'])
+
+    def test_field_update_service_rejects_under_code_deploy_recreates_service(self):
+        self.service['enableExecuteCommand'] = True
+        self._execute(TASK_DEF_V1)
+        self.assertIn('DeleteService', self.calls)
+        self.assertNotIn('UpdateService', self.calls)
+
+    def test_updatable_field_uses_update_service(self):
+        self.service['desiredCount'] = 3
+        self._execute(TASK_DEF_V1)
+        self.assertEqual(self.calls, ['DescribeServices', 'UpdateService'])
+
+    def test_immutable_field_recreates_service(self):
+        self.service['launchType'] = 'EC2'
+        self._execute(TASK_DEF_V1)
+        self.assertEqual(self.calls[0], 'DescribeServices')
+        self.assertIn('DeleteService', self.calls)
+        self.assertEqual(self.calls[-1], 'CreateService')
+
+
+class TestRegisterTaskDefinition(TestCase):
+
+    def _register(self, uri='mysql+pymysql://admin:pw@db/mypoc', imageTag='v1.0'):
+        return ecs.register_task_definition('mypoc-task-def', uri, '123456789012.dkr.ecr.ap-east-1.amazonaws.com/mypoc',
+                                            imageTag)
+
+    def test_unchanged_content_reuses_the_latest_revision(self):
+        fake = fake_aws.FakeAWS()
+        with fake.patch():
+            first = self._register()
+            second = self._register()
+            changed = self._register(imageTag='v1.1')
+            back = self._register()
+
+        self.assertEqual(first, second)
+        self.assertTrue(first.endswith('mypoc-task-def:1'))
+        self.assertTrue(changed.endswith('mypoc-task-def:2'))
+        # Only the latest revision is compared, going back to an older content registers again.
+        self.assertTrue(back.endswith('mypoc-task-def:3'))
+        self.assertEqual(fake.calls['RegisterTaskDefinition'], 3)
+        self.assertEqual(fake.task_definitions['mypoc-task-def'][0]['tags'][0]['key'], ecs.CONTENT_HASH_TAG)
@@ -0,0 +1,41 @@
+import re
+import subprocess
+import sys
+from unittest import TestCase
+
+# Cumulative import time budget of one iac module, in microseconds.
+IMPORT_BUDGET_US = 100000
+
+
+def import_time_us(module):
+    """
+    :return: cumulative import time of the module as reported by python -X importtime, in microseconds
+    """
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+                         capture_output=True, text=True, check=True).stderr
+    times = re.findall(r'import time:\s+\d+ \|\s+(\d+) \| %s$' % re.escape(module), out, re.MULTILINE)
+    return int(times[-1])
+
+
+def imported_modules(module):
+    out = subprocess.run([sys.executable, '-c', 'import sys, %s; print(" ".join(sys.modules))' % module],
+                         capture_output=True, text=True, check=True).stdout
+    return set(out.split())
+
+
+class TestImportTime(TestCase):
+
+    def test_import_has_no_heavy_dependencies(self):
+        for module in ('iac', 'iac.rds', 'iac.ec2', 'iac.elbv2', 'iac.ecr', 'iac.ecs', 'iac.stack'):
+            loaded = imported_modules(module)
+            for heavy in ('boto3', 'botocore', 'taskflow'):
+                self.assertNotIn(heavy, loaded, '%s imports %s' % (module, heavy))
+
+    def test_import_budget(self):
+        for module in ('iac.rds', 'iac.ecs', 'iac.stack'):
+            self.assertLess(import_time_us(module), IMPORT_BUDGET_US, module)
+
+
+if __name__ == '__main__':
+    for m in ('iac', 'iac.rds', 'iac.ec2', 'iac.elbv2', 'iac.ecr', 'iac.ecs', 'iac.stack'):
+        print('%-10s %8.1f ms' % (m, import_time_us(m) / 1000))
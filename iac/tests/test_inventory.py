@@ -0,0 +1,53 @@
+from collections import Counter
+from unittest import TestCase
+
+from iac import ec2, inventory, rds, stack
+from iac.tests import bench, fake_aws
+
+
+class TestInventory(TestCase):
+
+    def setUp(self):
+        ec2.vpc_cache.invalidate()
+
+    def test_second_run_skips_creates_and_describes(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            stack.provision(dict(bench.STORE))
+            first = Counter(fake.calls)
+            results = stack.provision(dict(bench.STORE))
+        calls = Counter(fake.calls) - first
+
+        self.assertTrue(results['SQLALCHEMY_DATABASE_URI'])
+        for name in ('CreateDBSubnetGroup', 'CreateDBInstance', 'CreateRepository', 'CreateCluster',
+                     'CreateLoadBalancer', 'CreateTargetGroup', 'CreateListener', 'CreateService', 'UpdateService'):
+            self.assertEqual(calls[name], 0, name)
+        # The bulk loads only, the tasks look everything up in the snapshot.
+        self.assertEqual(calls['DescribeDBInstances'], 1)
+        self.assertEqual(calls['DescribeServices'], 1)
+        self.assertEqual(calls['DescribeLoadBalancers'], 1)
+        self.assertEqual(calls['DescribeTargetGroups'], 1)
+
+    def test_index_by_name_and_arn(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            stack.provision(dict(bench.STORE))
+            with inventory.snapshot() as snapshot:
+                lb = inventory.find(inventory.LOAD_BALANCER, bench.STORE['LBName'])
+                service = inventory.find(inventory.SERVICE, (bench.STORE['clusterName'], bench.STORE['serviceName']))
+            self.assertIsNone(inventory.current())
+
+        self.assertIs(snapshot.get_arn(lb['LoadBalancerArn']), lb)
+        self.assertIsNotNone(snapshot.get(inventory.LISTENER, (lb['LoadBalancerArn'], 80)))
+        self.assertEqual(service['status'], 'ACTIVE')
+        self.assertIsNone(snapshot.get(inventory.REPOSITORY, 'missing'))
+
+    def test_deleting_db_instance_is_recreated(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            stack.provision(dict(bench.STORE))
+            rds.delete_db_instance(bench.STORE['DBInstanceIdentifier'])
+            results = stack.provision(dict(bench.STORE))
+
+        self.assertTrue(results['SQLALCHEMY_DATABASE_URI'])
+        self.assertEqual(fake.calls['CreateDBInstance'], 2)
@@ -0,0 +1,53 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+from iac import logs, utils
+
+
+class TestLogs(TestCase):
+
+    def setUp(self):
+        root = logging.getLogger()
+        self.saved = root.level, list(root.handlers)
+
+    def tearDown(self):
+        logs.shutdown_logging()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        level, handlers = self.saved
+        root.setLevel(level)
+        for handler in handlers:
+            root.addHandler(handler)
+
+    def test_json_lines_written_by_the_listener(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'iac.log')
+            logs.setup_logging(level='INFO', fmt='json', log_file=path)
+
+            def work():
+                with utils.in_task('create_repo', 'ap-east-1'):
+                    logging.getLogger('iac.ecr').info('Repository [%s] created successfully.', 'mypoc')
+                    logging.getLogger('iac.ecr').debug('dropped')
+                    logging.getLogger('botocore.endpoint').info('dropped')
+
+            worker = threading.Thread(target=work, name='iac-worker_0')
+            worker.start()
+            worker.join()
+            self.assertEqual(logging.getLogger('botocore').getEffectiveLevel(), logging.WARNING)
+            logs.shutdown_logging()
+            with open(path, encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f]
+
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['message'], 'Repository [mypoc] created successfully.')
+        self.assertEqual(entries[0]['thread'], 'iac-worker_0')
+        self.assertEqual((entries[0]['task'], entries[0]['region']), ('create_repo', 'ap-east-1'))
+
+    def test_unknown_format(self):
+        with self.assertRaisesRegex(ValueError, 'xml'):
+            logs.setup_logging(fmt='xml', log_file='')
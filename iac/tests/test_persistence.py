@@ -0,0 +1,49 @@
+import tempfile
+from unittest import TestCase
+
+from taskflow import task
+from taskflow.patterns import linear_flow
+
+from iac import persistence
+
+
+class TestPersistence(TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.failing = True
+
+    def _flow(self):
+        def load_vpc():
+            self.calls.append('load_vpc')
+            return 'VpcId'
+
+        def create_listener(VpcId):
+            self.calls.append('create_listener')
+            if self.failing:
+                raise RuntimeError('network error')
+            return 'ListenerArn'
+
+        return linear_flow.Flow('provision').add(
+            task.FunctorTask(execute=load_vpc, provides='VpcId'),
+            task.FunctorTask(execute=create_listener, provides='ListenerArn'),
+        )
+
+    def test_rerun_resumes_from_failure_point(self):
+        with tempfile.TemporaryDirectory() as d:
+            uri = 'dir://' + d
+            with self.assertRaises(RuntimeError):
+                persistence.load(self._flow(), {}, 'my-stack', backend_uri=uri).run()
+            self.assertEqual(self.calls, ['load_vpc', 'create_listener'])
+
+            self.calls.clear()
+            self.failing = False
+            engine = persistence.load(self._flow(), {}, 'my-stack', backend_uri=uri)
+            engine.run()
+            self.assertEqual(self.calls, ['create_listener'])
+            self.assertEqual(engine.storage.fetch('VpcId'), 'VpcId')
+
+            # A finished run is not resumed, the next one starts over.
+            self.calls.clear()
+            persistence.load(self._flow(), {}, 'my-stack', backend_uri=uri).run()
+            self.assertEqual(self.calls, ['load_vpc', 'create_listener'])
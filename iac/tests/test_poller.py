@@ -0,0 +1,97 @@
+import threading
+from unittest import TestCase, mock
+
+from botocore.exceptions import ClientError
+
+from iac import poller, waiter
+
+
+class VirtualClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def wait(self, condition, seconds):
+        if seconds is None:
+            condition.wait()
+        else:
+            self.now += seconds
+
+
+class TestPoller(TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock()
+        patcher = mock.patch.object(waiter, 'clock', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _describe(self, keys):
+        with self.lock:
+            self.calls.append(list(keys))
+        return {k: {'status': 'available' if self.clock.now >= 30 else 'creating'} for k in keys}
+
+    def test_batches_waits_of_one_kind(self):
+        p = poller.Poller()
+        p.register_kind('fake', self._describe, batch_size=3)
+        profile = waiter.BackoffProfile(initial=5, maximum=5, jitter=False, deadline=100)
+        with p._cond:
+            fs = [p.submit('fake', 'db-%d' % i, lambda item: item['status'] == 'available', profile=profile)
+                  for i in range(5)]
+        for f in fs:
+            self.assertEqual(f.result(timeout=5), {'status': 'available'})
+
+        # 5 keys in batches of 3 -> 2 calls per tick, 7 ticks from 0s to 30s.
+        self.assertEqual(len(self.calls), 14)
+        self.assertEqual(max(len(c) for c in self.calls), 3)
+
+    def test_timeout_fails_the_future(self):
+        p = poller.Poller()
+        p.register_kind('fake', self._describe)
+        profile = waiter.BackoffProfile(initial=5, maximum=5, jitter=False, deadline=10)
+        f = p.submit('fake', 'db', lambda item: item['status'] == 'available', profile=profile,
+                     state=lambda item: item['status'])
+
+        with self.assertRaises(waiter.WaiterTimeout) as ctx:
+            f.result(timeout=5)
+        self.assertEqual(ctx.exception.last_state, 'creating')
+
+    def test_throttled_batch_is_polled_again(self):
+        failures = ['Throttling']
+
+        def _describe(keys):
+            if failures:
+                raise ClientError({'Error': {'Code': failures.pop(), 'Message': 'Rate exceeded'}}, 'DescribeFake')
+            return self._describe(keys)
+
+        p = poller.Poller()
+        p.register_kind('fake', _describe)
+        profile = waiter.BackoffProfile(initial=5, maximum=5, jitter=False, deadline=100)
+        f = p.submit('fake', 'db', lambda item: item['status'] == 'available', profile=profile)
+        self.assertEqual(f.result(timeout=5), {'status': 'available'})
+
+        failures.append('AccessDenied')
+        f = p.submit('fake', 'db', lambda item: item['status'] == 'available', profile=profile)
+        with self.assertRaises(ClientError):
+            f.result(timeout=5)
+
+    def test_failed_timeout_state_does_not_stop_the_poller(self):
+        p = poller.Poller()
+        p.register_kind('fake', self._describe)
+        profile = waiter.BackoffProfile(initial=5, maximum=5, jitter=False, deadline=10)
+        f = p.submit('fake', 'db', lambda item: item['status'] == 'available', profile=profile,
+                     state=lambda item: item['missing'])
+        with self.assertRaises(KeyError):
+            f.result(timeout=5)
+
+        f = p.submit('fake', 'db', lambda item: item['status'] == 'available',
+                     profile=waiter.BackoffProfile(initial=5, maximum=5, jitter=False, deadline=100))
+        self.assertEqual(f.result(timeout=5), {'status': 'available'})
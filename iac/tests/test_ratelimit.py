@@ -0,0 +1,75 @@
+from unittest import TestCase, mock
+
+from iac import ec2, ratelimit, waiter
+from iac.tests import bench, fake_aws
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+
+
+class TestTokenBucket(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(waiter, 'clock', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_rate(self):
+        bucket = ratelimit.TokenBucket(rate=2, burst=3)
+
+        self.assertEqual([bucket.acquire() for _ in range(5)], [0.0, 0.0, 0.0, 0.5, 1.0])
+        self.clock.now = 1.0
+        self.assertEqual(bucket.acquire(), 0.5)
+
+    def test_throttling_halves_the_rate_and_successes_restore_it(self):
+        bucket = ratelimit.TokenBucket(rate=10, burst=10)
+
+        bucket.throttled()
+        bucket.throttled()
+        self.assertEqual(bucket.rate, 2.5)
+        self.assertEqual(bucket.acquire(), 0.4)
+        for _ in range(20):
+            bucket.succeeded()
+        self.assertEqual(bucket.rate, 10)
+
+    def test_families_have_their_own_buckets(self):
+        limiter = ratelimit.RateLimiter({'ecs': {ratelimit.DESCRIBE: (1, 1)}})
+
+        self.assertIsNot(limiter.bucket('ecs', 'DescribeServices'), limiter.bucket('ecs', 'CreateService'))
+        self.assertIs(limiter.bucket('ecs', 'DescribeServices'), limiter.bucket('ecs', 'ListServices'))
+        self.assertEqual(limiter.bucket('ecs', 'DescribeServices').max_rate, 1)
+        self.assertEqual(limiter.bucket('ecs', 'CreateService').max_rate,
+                         ratelimit.DEFAULT_LIMITS['default'][ratelimit.MUTATE][0])
+
+    def test_parse_limits(self):
+        self.assertEqual(ratelimit.parse_limits('ecs.describe=20/50, default.mutate=2.5/5'),
+                         {'ecs': {'describe': (20.0, 50)}, 'default': {'mutate': (2.5, 5)}})
+        with self.assertRaises(ValueError):
+            ratelimit.parse_limits('ecs.create=1/1')
+
+
+class TestRateLimitedRun(TestCase):
+
+    def _run(self, rate_limits):
+        ec2.vpc_cache.invalidate()
+        limits = {s: (1, 1) for s in bench.THROTTLED_SERVICES}
+        return bench.run_all(8, fake=fake_aws.FakeAWS(speedup=200, throttle=limits), rate_limits=rate_limits)
+
+    def test_limiter_cuts_throttling_of_a_large_run(self):
+        unlimited = self._run(None)
+        limited = self._run({})
+
+        self.assertEqual({state for state, _ in limited['stacks'].values()}, {'SUCCESS'})
+        self.assertLess(sum(limited['throttled'].values()), sum(unlimited['throttled'].values()) * 0.75)
+        self.assertLess(limited['api_calls'], unlimited['api_calls'])
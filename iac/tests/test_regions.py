@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+from iac import ec2, regions
+from iac.tests import bench, fake_aws
+
+REGIONS = ('ap-east-1', 'us-west-2', 'eu-central-1')
+
+# Simulated seconds allowed on top of the RDS create of one region.
+SLACK = 120
+
+
+class TestRegions(TestCase):
+
+    def setUp(self):
+        ec2.vpc_cache.invalidate()
+
+    def test_regions_run_in_parallel_with_their_own_resources(self):
+        # Three regions of threads, at a higher speedup the wall-clock jitter alone eats the slack.
+        fake = fake_aws.FakeAWS(speedup=100)
+        with fake.patch():
+            report = regions.provision_regions(REGIONS, {'default': dict(bench.STORE)})
+
+        rds = fake_aws.DEFAULT_DURATIONS['db_instance_create']
+        self.assertLess(report['duration'], rds + SLACK)
+        for region in REGIONS:
+            status = report['regions'][region]['default']
+            self.assertEqual(status['state'], 'SUCCESS')
+            self.assertIn('.%s.rds.amazonaws.com' % region, status['results']['SQLALCHEMY_DATABASE_URI'])
+            self.assertIn('.dkr.ecr.%s.' % region, status['results']['repositoryUri'])
+            self.assertIn(('my-cluster', 'mypoc-svc'), fake.regions[region].services)
+            revisions = fake.regions[region].task_definitions['mypoc-task-def']
+            container = revisions[-1]['taskDefinition']['containerDefinitions'][0]
+            self.assertEqual(container['logConfiguration']['options']['awslogs-region'], region)
+            self.assertTrue(container['image'].startswith(status['results']['repositoryUri']))
+        # One default VPC discovery per region.
+        self.assertEqual(fake.calls['DescribeVpcs'], len(REGIONS))
+
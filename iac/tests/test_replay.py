@@ -0,0 +1,40 @@
+"""
+The flows of main.py replayed from cassettes, see iac.tests.cassette.
+"""
+from unittest import TestCase
+
+from iac import aio, ec2, stack
+from iac.tests import bench, cassette
+
+
+class TestReplay(TestCase):
+
+    def setUp(self):
+        ec2.vpc_cache.invalidate()
+
+    def test_provision(self):
+        with cassette.use('provision'):
+            results = stack.provision(dict(bench.STORE))
+
+        self.assertTrue(results['SQLALCHEMY_DATABASE_URI'].startswith('mysql+pymysql://admin:'))
+        self.assertTrue(results['taskDefinitionArn'].startswith('arn:aws:ecs:'))
+
+    def test_provision_then_destroy(self):
+        with cassette.use('destroy') as tape:
+            stack.provision(dict(bench.STORE))
+            stack.destroy(dict(bench.STORE))
+
+        operations = {i['operation'] for i in tape.interactions}
+        for operation in ('DeleteService', 'DeleteLoadBalancer', 'DeleteDBInstance', 'DeleteDBSubnetGroup',
+                          'DeleteRepository', 'DeleteCluster'):
+            self.assertIn(operation, operations)
+
+    def test_provision_async(self):
+        with cassette.use('provision_async'):
+            statuses = stack.provision_all_async({'default': dict(bench.STORE)}, backend=aio.THREADS)
+
+        self.assertEqual(statuses['default']['state'], 'SUCCESS', statuses['default'].get('error'))
+
+    def test_unrecorded_call_fails(self):
+        with cassette.use('provision'), self.assertRaises(cassette.CassetteMiss):
+            stack.provision(dict(bench.STORE, repositoryName='not-recorded'))
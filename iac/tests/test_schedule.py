@@ -0,0 +1,81 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase, mock
+
+from iac import ec2, schedule, stack
+from iac.tests import bench, fake_aws
+
+
+class TestSchedule(TestCase):
+
+    def test_free_slot_goes_to_the_longest_path(self):
+        slots = schedule.PrioritySlots(1)
+        slots.acquire()
+        order = []
+
+        def run(priority):
+            slots.acquire(priority)
+            order.append(priority)
+            slots.release()
+
+        threads = [threading.Thread(target=run, args=(p,)) for p in (1.0, 3.0, 2.0)]
+        for t in threads:
+            t.start()
+        while len(slots._waiting) < len(threads):
+            time.sleep(0.001)
+        slots.release()
+        for t in threads:
+            t.join()
+        self.assertEqual(order, [3.0, 2.0, 1.0])
+
+    def test_priorities_follow_recorded_durations(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = schedule.DurationStore(os.path.join(directory, 'durations.json'))
+            store.record('iac.rds.wait_db_available', 100.0)
+            store.record('iac.rds.wait_db_available', 300.0)
+            store.record('iac.elbv2.create_load_balancer', 5.0)
+            store.save()
+            store = schedule.DurationStore(store.path)
+        self.assertEqual(store.get('iac.rds.wait_db_available'), 200.0)
+
+        priorities = schedule.priorities(stack.flow_provision(), store)
+        # gen_db_uri, register_task_def, create_service and the deployment group follow it, 1s each without history.
+        self.assertEqual(priorities['iac.rds.wait_db_available'], 204.0)
+        self.assertGreater(priorities['iac.rds.create_db_subnet_group'], priorities['iac.elbv2.create_load_balancer'])
+        self.assertGreater(priorities['iac.elbv2.create_load_balancer'], priorities['create_repo'])
+        self.assertEqual(max(priorities, key=priorities.get), 'iac.ec2.load_default_vpc_info')
+
+    def test_runs_record_durations(self):
+        ec2.vpc_cache.invalidate()
+        store = schedule.DurationStore()
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch(), mock.patch.object(schedule, 'durations', store):
+            statuses = stack.provision_all(bench.stores(2), max_concurrency=2)
+
+        self.assertEqual({status['state'] for status in statuses.values()}, {'SUCCESS'})
+        self.assertGreater(store.get('iac.rds.wait_db_available'),
+                           fake_aws.DEFAULT_DURATIONS['db_instance_create'] / 2)
+        # One call, without the time it spent queued for a slot. A real millisecond is 0.4 simulated seconds here.
+        self.assertLess(store.get('create_repo'), store.get('iac.rds.wait_db_available') / 5)
+
+    def test_single_stack_takes_its_slots_by_priority(self):
+        ec2.vpc_cache.invalidate()
+        store = schedule.DurationStore()
+        expected = schedule.priorities(stack.flow_provision(), store)
+        acquired = []
+        acquire = schedule.PrioritySlots.acquire
+
+        def _acquire(slots, priority=0.0):
+            acquired.append(priority)
+            return acquire(slots, priority)
+
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch(), mock.patch.object(schedule, 'durations', store), \
+                mock.patch.object(schedule.PrioritySlots, 'acquire', _acquire):
+            stack.provision(dict(bench.STORE))
+
+        self.assertGreaterEqual(len(acquired), len(expected))
+        self.assertEqual(set(acquired) - set(expected.values()), set())
+        self.assertIn(expected['iac.ec2.load_default_vpc_info'], acquired)
@@ -0,0 +1,86 @@
+from collections import Counter
+from unittest import TestCase, mock
+
+from iac import aio, ec2, settings, stack
+from iac.tests import bench, fake_aws
+
+SERVICES = 12
+
+
+def services_store(count=SERVICES):
+    """
+    :return: bench.STORE with count services sharing its cluster and ALB
+    """
+    store = {k: v for k, v in bench.STORE.items()
+             if k not in ('family', 'serviceName', 'TargetGroupName', 'GreenTargetGroupName', 'TargetGroupPort',
+                          'codeDeployDeploymentGroup')}
+    store['services'] = [{'serviceName': 'svc-%d' % i, 'family': 'svc-%d-task-def' % i,
+                          'TargetGroupName': 'svc-%d-tg' % i, 'GreenTargetGroupName': 'svc-%d-tg-green' % i,
+                          'TargetGroupPort': 8080, 'codeDeployDeploymentGroup': 'svc-%d-deployment-group' % i,
+                          'pathPattern': '/svc-%d/*' % i, 'priority': i + 1,
+                          'containerName': 'svc-%d' % i, 'containerPort': 8080}
+                         for i in range(count)]
+    return store
+
+
+class TestServices(TestCase):
+
+    def setUp(self):
+        ec2.vpc_cache.invalidate()
+
+    def test_services_share_the_cluster_and_the_alb(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            results = stack.provision(services_store())
+
+        for name in ('CreateLoadBalancer', 'CreateListener', 'CreateCluster', 'CreateDBInstance'):
+            self.assertEqual(fake.calls[name], 1, name)
+        for name in ('CreateRule', 'RegisterTaskDefinition', 'CreateService', 'CreateDeploymentGroup'):
+            self.assertEqual(fake.calls[name], SERVICES, name)
+        # Blue and green.
+        self.assertEqual(fake.calls['CreateTargetGroup'], 2 * SERVICES)
+        self.assertEqual(fake.calls['CreateApplication'], 1)
+        self.assertEqual(len(fake.rules), SERVICES)
+        listener = next(iter(fake.listeners.values()))
+        self.assertEqual(listener['DefaultActions'][0]['Type'], 'fixed-response')
+        service = fake.services[('my-cluster', 'svc-3')]
+        self.assertEqual(service['loadBalancers'], [{'targetGroupArn': results['TargetGroupArn[svc-3]'],
+                                                     'containerName': 'svc-3', 'containerPort': 8080}])
+        task_def = fake.task_definitions['svc-3-task-def'][0]['taskDefinition']
+        self.assertEqual(task_def['containerDefinitions'][0]['portMappings'][0]['containerPort'], 8080)
+
+    def test_rerun_describes_services_ten_at_a_time(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            stack.provision(services_store())
+            first = Counter(fake.calls)
+            stack.provision(services_store())
+            with mock.patch.object(settings, 'INVENTORY', False):
+                second = Counter(fake.calls)
+                stack.provision(services_store())
+        with_inventory = Counter(second) - first
+        without_inventory = Counter(fake.calls) - second
+
+        self.assertEqual(with_inventory['DescribeServices'], 2)
+        self.assertLess(without_inventory['DescribeServices'], SERVICES)
+        for name in ('CreateService', 'UpdateService', 'ModifyRule'):
+            self.assertEqual(with_inventory[name] + without_inventory[name], 0, name)
+        self.assertEqual(with_inventory['CreateTargetGroup'], 0)
+
+    def test_destroy_deletes_every_service(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            stack.provision(services_store())
+            stack.destroy(services_store())
+
+        self.assertEqual({s['status'] for s in fake.services.values()}, {'INACTIVE'})
+        self.assertEqual((fake.target_groups, fake.load_balancers, fake.rules), ({}, {}, {}))
+
+    def test_asyncio_backend(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            statuses = stack.provision_all_async({'default': services_store(3)}, backend=aio.THREADS)
+
+        self.assertEqual(statuses['default']['state'], 'SUCCESS', statuses['default'].get('error'))
+        self.assertEqual(fake.calls['CreateRule'], 3)
+        self.assertEqual(fake.calls['CreateService'], 3)
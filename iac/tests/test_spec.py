@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+from unittest import TestCase, skipUnless
+
+from taskflow import engines, task
+
+from iac import spec
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+CALLS = []
+
+
+def make_db(DBName):
+    CALLS.append(('make_db', DBName))
+    return 'db://%s' % DBName
+
+
+def make_queue(QueueName, retention=4):
+    CALLS.append(('make_queue', QueueName, retention))
+
+
+class MakeApp(task.Task):
+
+    def execute(self, uri, QueueName):
+        CALLS.append(('make_app', uri, QueueName))
+        return 'app'
+
+
+SPEC = {
+    'name': 'test',
+    'tasks': [
+        {'task': 'iac.tests.test_spec.make_db', 'provides': 'DBUri'},
+        {'task': 'iac.tests.test_spec.make_queue', 'provides': 'queue_created'},
+        {'name': 'app', 'task': 'iac.tests.test_spec.MakeApp', 'requires': ['queue_created'],
+         'rebind': {'uri': 'DBUri'}, 'provides': 'App'},
+    ],
+}
+
+
+EACH_SPEC = {
+    'name': 'test_each',
+    'collections': {'queues': 'QueueName'},
+    'tasks': [
+        {'task': 'iac.tests.test_spec.make_db', 'provides': 'DBUri'},
+        {'task': 'iac.tests.test_spec.make_queue', 'each': 'queues', 'provides': 'queue_created'},
+        {'name': 'app', 'task': 'iac.tests.test_spec.MakeApp', 'each': 'queues', 'requires': ['queue_created'],
+         'rebind': {'uri': 'DBUri'}, 'provides': 'App'},
+        {'name': 'done', 'task': 'iac.tests.test_spec.make_db', 'requires': ['App'], 'rebind': {'DBName': 'DBUri'}},
+    ],
+}
+
+
+class TestSpec(TestCase):
+
+    def setUp(self):
+        del CALLS[:]
+
+    def test_edges_come_from_symbols_only(self):
+        flow = spec.build(SPEC)
+
+        links = {(a.name, b.name) for a, b, _ in flow.iter_links()}
+        self.assertEqual(links, {('iac.tests.test_spec.make_db', 'app'), ('iac.tests.test_spec.make_queue', 'app')})
+        engine = engines.load(flow, store={'DBName': 'mydb', 'QueueName': 'q'})
+        engine.run()
+        # The ordering-only symbol is not passed to the task, optional arguments keep their default.
+        self.assertEqual(CALLS[-1], ('make_app', 'db://mydb', 'q'))
+        self.assertIn(('make_queue', 'q', 4), CALLS)
+        self.assertEqual(engine.storage.fetch('App'), 'app')
+
+    def test_invalid_specs(self):
+        duplicate = dict(SPEC, tasks=SPEC['tasks'] + [{'task': 'iac.tests.test_spec.make_db', 'name': 'db2',
+                                                       'provides': 'DBUri'}])
+        with self.assertRaisesRegex(ValueError, 'DBUri'):
+            spec.build(duplicate)
+        with self.assertRaisesRegex(ValueError, 'unknown task'):
+            spec.build({'tasks': [{'task': 'iac.tests.test_spec.missing'}]})
+        with self.assertRaisesRegex(ValueError, 'invalid task entry'):
+            spec.build({'tasks': [{'task': 'iac.tests.test_spec.make_db', 'after': 'x'}]})
+
+    def test_each_entry_runs_per_item(self):
+        store = {'DBName': 'mydb', 'queues': [{'QueueName': 'a'}, {'QueueName': 'b', 'retention': 7}]}
+        flow = spec.build(EACH_SPEC, store)
+
+        links = {(a.name, b.name) for a, b, _ in flow.iter_links()}
+        self.assertIn(('iac.tests.test_spec.make_queue[a]', 'app[a]'), links)
+        self.assertNotIn(('iac.tests.test_spec.make_queue[a]', 'app[b]'), links)
+        self.assertTrue({('app[a]', 'done'), ('app[b]', 'done')} <= links)
+        engine = engines.load(flow, store=store)
+        engine.run()
+        self.assertIn(('make_queue', 'a', 4), CALLS)
+        self.assertIn(('make_queue', 'b', 7), CALLS)
+        self.assertEqual(engine.storage.fetch('App[b]'), 'app')
+        with self.assertRaisesRegex(ValueError, 'no \\[queues\\]'):
+            spec.build(EACH_SPEC, {'DBName': 'mydb'})
+        with self.assertRaisesRegex(ValueError, 'its own \\[QueueName\\]'):
+            spec.build(EACH_SPEC, {'queues': [{'QueueName': 'a'}, {'QueueName': 'a'}]})
+
+    @skipUnless(yaml, 'PyYAML is not installed')
+    def test_json_and_yaml_specs_are_equivalent(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {}
+            for ext, dump in (('.json', json.dump), ('.yaml', yaml.safe_dump)):
+                paths[ext] = os.path.join(directory, 'stack' + ext)
+                with open(paths[ext], 'w', encoding='utf-8') as f:
+                    dump(SPEC, f)
+            self.assertEqual(spec.read(paths['.json']), spec.read(paths['.yaml']))
@@ -0,0 +1,110 @@
+from collections import Counter
+from unittest import TestCase
+
+import networkx as nx
+from taskflow import engines
+
+from iac import ec2, stack
+from iac.tests import bench, fake_aws
+
+
+class TestStack(TestCase):
+
+    def test_only_task_definition_waits_for_db(self):
+        engine = engines.load(stack.flow_provision(), engine='parallel')
+        engine.compile()
+        graph = engine.compilation.execution_graph
+        after_db = {n.name for n in nx.descendants(graph, _node(graph, 'iac.rds.wait_db_available'))}
+
+        self.assertIn('register_task_def', after_db)
+        self.assertIn('create_service', after_db)
+        for name in ('create_repo', 'create_cluster', 'iac.elbv2.create_load_balancer',
+                     'iac.elbv2.create_target_group', 'iac.elbv2.create_listener'):
+            self.assertNotIn(name, after_db)
+
+
+def _node(graph, name):
+    return next(n for n in graph.nodes if n.name == name)
+
+
+class TestProvisionAll(TestCase):
+
+    def setUp(self):
+        ec2.vpc_cache.invalidate()
+
+    def test_a_failed_stack_does_not_stop_the_others(self):
+        stores = bench.stores(3)
+        del stores['tenant-1']['LBName']
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            statuses = stack.provision_all(stores, max_concurrency=2)
+
+        self.assertEqual(statuses['tenant-1']['state'], 'FAILURE')
+        self.assertIn('LBName', statuses['tenant-1']['error'])
+        for name in ('tenant-0', 'tenant-2'):
+            self.assertEqual(statuses[name]['state'], 'SUCCESS')
+            self.assertTrue(statuses[name]['results']['SQLALCHEMY_DATABASE_URI'])
+        self.assertEqual(fake.calls['CreateService'], 2)
+
+
+class TestRedeploy(TestCase):
+
+    def setUp(self):
+        ec2.vpc_cache.invalidate()
+
+    def test_new_image_rolls_the_service_through_code_deploy(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            first = stack.provision(dict(bench.STORE))
+            calls = Counter(fake.calls)
+            second = stack.provision(dict(bench.STORE, imageTag='v2.0'))
+        calls = Counter(fake.calls) - calls
+
+        self.assertEqual(calls['CreateDeployment'], 1)
+        for name in ('DeleteService', 'CreateService', 'UpdateService', 'CreateDeploymentGroup'):
+            self.assertEqual(calls[name], 0, name)
+        self.assertEqual(fake.services[('my-cluster', 'mypoc-svc')]['taskDefinition'], second['taskDefinitionArn'])
+        self.assertNotEqual(second['taskDefinitionArn'], first['taskDefinitionArn'])
+        # The production traffic moved to the green target group.
+        listener = fake.listeners[second['ListenerArn']]
+        self.assertEqual(listener['DefaultActions'][0]['TargetGroupArn'], second['GreenTargetGroupArn'])
+
+
+class TestDestroy(TestCase):
+
+    def setUp(self):
+        ec2.vpc_cache.invalidate()
+
+    def test_destroy_deletes_everything_in_the_time_of_the_db_deletion(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            stack.provision(dict(bench.STORE))
+            started = fake.clock.monotonic()
+            stack.destroy(dict(bench.STORE))
+            elapsed = fake.clock.monotonic() - started
+            # A second teardown finds nothing to delete.
+            stack.destroy(dict(bench.STORE))
+
+        self.assertLess(elapsed, fake_aws.DEFAULT_DURATIONS['db_instance_delete'] + 60)
+        self.assertFalse(fake.db_instances)
+        self.assertFalse(fake.db_subnet_groups)
+        self.assertFalse(fake.repositories)
+        self.assertFalse(fake.load_balancers)
+        self.assertFalse(fake.target_groups)
+        self.assertFalse(fake.listeners)
+        self.assertFalse(fake.applications)
+        self.assertEqual(fake.clusters['my-cluster']['status'], 'INACTIVE')
+        self.assertEqual(fake.services[('my-cluster', 'mypoc-svc')]['status'], 'INACTIVE')
+        self.assertEqual({r['taskDefinition']['status'] for r in fake.task_definitions['mypoc-task-def']},
+                         {'INACTIVE'})
+
+    def test_service_goes_before_the_alb_and_the_cluster(self):
+        engine = engines.load(stack.flow_destroy(), engine='parallel')
+        engine.compile()
+        graph = engine.compilation.execution_graph
+        after_svc = {n.name for n in nx.descendants(graph, _node(graph, 'iac.ecs.wait_service_deleted'))}
+
+        self.assertTrue({'iac.elbv2.delete_listeners', 'iac.elbv2.delete_target_group', 'iac.ecs.delete_cluster',
+                         'iac.ecs.deregister_task_definitions'} <= after_svc)
+        for name in ('iac.rds.delete_db_instance', 'iac.ecr.delete_repository'):
+            self.assertNotIn(name, after_svc)
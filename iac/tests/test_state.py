@@ -0,0 +1,114 @@
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from unittest import TestCase, mock
+
+from iac import clients, ec2, settings, stack, state
+from iac.tests import bench, fake_aws
+
+
+class TestState(TestCase):
+
+    def setUp(self):
+        ec2.vpc_cache.invalidate()
+        for patcher in (mock.patch.object(state, 'store', state.StateStore()),
+                        mock.patch.object(settings, 'DRIFT_CHECK', False)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_unchanged_run_makes_no_call(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            first = stack.provision(dict(bench.STORE))
+            calls = sum(fake.calls.values())
+            started = time.monotonic()
+            second = stack.provision(dict(bench.STORE))
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(sum(fake.calls.values()), calls)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(second['SQLALCHEMY_DATABASE_URI'], first['SQLALCHEMY_DATABASE_URI'])
+        self.assertEqual(second['LoadBalancerArn'], first['LoadBalancerArn'])
+
+    def test_default_vpc_discovery_is_never_skipped(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            stack.provision(dict(bench.STORE))
+            first = Counter(fake.calls)
+            # Expired, or invalidated, the cached discovery runs again.
+            ec2.vpc_cache.invalidate()
+            stack.provision(dict(bench.STORE))
+        calls = Counter(fake.calls) - first
+
+        self.assertEqual(calls['DescribeVpcs'], 1)
+        # Same VPC, the tasks after it are still skipped.
+        self.assertEqual(sum(calls.values()), calls['DescribeVpcs'] + calls['DescribeSubnets'] +
+                         calls['DescribeSecurityGroups'])
+
+    def test_changed_input_reruns_its_subtree(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            stack.provision(dict(bench.STORE))
+            first = Counter(fake.calls)
+            stack.provision(dict(bench.STORE, imageTag='v2.0'))
+        calls = Counter(fake.calls) - first
+
+        self.assertEqual(calls['RegisterTaskDefinition'], 1)
+        self.assertEqual(calls['CreateDeployment'], 1)
+        # The tasks before the task definition are skipped, the bulk inventory load aside.
+        for name in ('DescribeVpcs', 'DescribeSubnets', 'CreateDBInstance', 'CreateLoadBalancer', 'CreateListener'):
+            self.assertEqual(calls[name], 0, name)
+        self.assertEqual(calls['DescribeDBInstances'], 1)
+
+    def test_drift_check_recreates_a_deleted_resource(self):
+        fake = fake_aws.FakeAWS(speedup=400)
+        with fake.patch():
+            stack.provision(dict(bench.STORE))
+            # Deleted behind the back of the state.
+            clients.get('ecr').delete_repository(repositoryName=bench.STORE['repositoryName'])
+            first = Counter(fake.calls)
+            stack.provision(dict(bench.STORE))
+            self.assertEqual(fake.calls['CreateRepository'], first['CreateRepository'])
+            with mock.patch.object(settings, 'DRIFT_CHECK', True):
+                stack.provision(dict(bench.STORE))
+        calls = Counter(fake.calls) - first
+
+        self.assertEqual(calls['CreateRepository'], 1)
+        for name in ('CreateDBInstance', 'CreateLoadBalancer', 'CreateService', 'UpdateService'):
+            self.assertEqual(calls[name], 0, name)
+
+    def test_saved_state_is_reloaded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'state.json')
+            store = state.StateStore(path)
+            store.put('ap-east-1/default', 'create_repo', 'abc', 'uri')
+            store.save()
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+            self.assertEqual(state.StateStore(path).get('ap-east-1/default', 'create_repo'),
+                             {'fingerprint': 'abc', 'outputs': 'uri'})
+
+    def test_concurrent_saves(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'state.json')
+            store = state.StateStore(path)
+            errors = []
+
+            def _save(region):
+                try:
+                    for i in range(20):
+                        store.put('%s/default' % region, 'create_repo', str(i), 'uri')
+                        store.save()
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=_save, args=('region-%d' % i,)) for i in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            self.assertEqual(errors, [])
+            self.assertEqual(os.listdir(directory), ['state.json'])
+            self.assertEqual(state.StateStore(path).get('region-3/default', 'create_repo')['fingerprint'], '19')
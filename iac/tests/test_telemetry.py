@@ -0,0 +1,37 @@
+import json
+import tempfile
+from unittest import TestCase
+
+from iac import clients, ec2, stack, telemetry
+from iac.tests import bench, fake_aws
+
+
+class TestTelemetry(TestCase):
+
+    def setUp(self):
+        ec2.vpc_cache.invalidate()
+
+    def test_calls_are_recorded_per_operation_and_task(self):
+        limits = {'ecs': (0.05, 1)}
+        fake = fake_aws.FakeAWS(speedup=400, throttle=limits)
+        with fake.patch():
+            collector = telemetry.install(clients.get_provider())
+            stack.provision(dict(bench.STORE))
+
+        report = collector.report()
+        ops = {(op['operation'], op['task']): op for op in report['operations']}
+        self.assertEqual(ops[('CreateService', 'create_service')]['calls'], 1)
+        self.assertIn(('CreateCluster', 'create_cluster'), ops)
+        self.assertEqual(report['totals']['calls'], sum(fake.calls.values()) - sum(fake.throttled.values()))
+        self.assertEqual(report['totals']['throttles'], sum(fake.throttled.values()))
+        self.assertGreater(report['totals']['throttles'], 0)
+        self.assertEqual(report['totals']['retries'], report['totals']['throttles'])
+
+        with tempfile.TemporaryDirectory() as d:
+            json_path, prom_path = collector.export(d)
+            with open(json_path) as f:
+                self.assertEqual(json.load(f)['totals']['calls'], report['totals']['calls'])
+            with open(prom_path) as f:
+                prom = f.read()
+        self.assertIn('# TYPE iac_api_calls_total counter', prom)
+        self.assertIn('iac_api_calls_total{service="ecs",operation="CreateService",task="create_service"} 1', prom)
@@ -0,0 +1,88 @@
+from unittest import TestCase
+
+from taskflow import engines, retry, task
+from taskflow.patterns import graph_flow, linear_flow
+
+from iac import timeline
+
+
+class StepClock(object):
+    """
+    Time only moves when a task advances it.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+class TestTimeline(TestCase):
+
+    def setUp(self):
+        self.clock = StepClock()
+        self.attempts = 0
+
+    def _sleep(self, seconds):
+        def execute(**kwargs):
+            self.clock.now += seconds
+            return seconds
+
+        return execute
+
+    def _flaky(self, VpcId):
+        self.clock.now += 1
+        self.attempts += 1
+        if self.attempts == 1:
+            raise RuntimeError('throttled')
+
+    def _run(self):
+        db = task.FunctorTask(execute=self._sleep(10), name='db', requires='VpcId')
+        alb = linear_flow.Flow('alb', retry=retry.Times(2, name='alb_retry')).add(
+            task.FunctorTask(execute=self._flaky, name='lb', requires='VpcId'))
+        svc = task.FunctorTask(execute=self._sleep(1), name='svc')
+        flow = graph_flow.Flow('provision').add(
+            task.FunctorTask(execute=self._sleep(1), name='vpc', provides='VpcId'),
+            db, alb, svc,
+        )
+        flow.link(db, svc)
+        flow.link(alb, svc)
+        engine = engines.load(flow, engine='serial')
+        recorder = timeline.TimelineListener(engine, self.clock)
+        recorder.register()
+        engine.run()
+        return recorder
+
+    def test_intervals_and_retries(self):
+        recorder = self._run()
+
+        kinds = [kind for kind, _, _ in recorder.intervals['lb']]
+        self.assertEqual(kinds, ['run', 'revert', 'retry'])
+        self.assertEqual(recorder.runs()['vpc'], (0.0, 1.0))
+        self.assertEqual(recorder.finished, 14.0)
+
+    def test_critical_path_goes_through_the_last_finished_predecessor(self):
+        recorder = self._run()
+        runs = recorder.runs()
+
+        names = [name for name, _, _ in recorder.critical_path()]
+        self.assertEqual(names[0], 'vpc')
+        self.assertEqual(names[-1], 'svc')
+        self.assertEqual(names[-2], max(('db', 'lb'), key=lambda n: runs[n][1]))
+        # The service starts as soon as its last predecessor is done.
+        self.assertEqual(recorder.waiting()['svc'], 0.0)
+
+    def test_chrome_trace(self):
+        trace = self._run().chrome_trace()
+
+        events = trace['traceEvents']
+        self.assertTrue(all(e['ph'] == 'X' for e in events))
+        svc = [e for e in events if e['name'] == 'svc']
+        self.assertEqual(svc[0]['cat'], 'critical')
+        self.assertEqual(svc[0]['dur'], 1000000)
+        # Overlapping intervals never share a lane.
+        for a in events:
+            for b in events:
+                if a is not b and a['tid'] == b['tid']:
+                    self.assertTrue(a['ts'] + a['dur'] <= b['ts'] or b['ts'] + b['dur'] <= a['ts'])
@@ -0,0 +1,50 @@
+from unittest import TestCase, mock
+
+from iac import waiter
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestWaiter(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(waiter, 'clock', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_polls_tightly_near_expected_completion(self):
+        profile = waiter.BackoffProfile(initial=5, maximum=30, expected=300, window=0.2, tight=2, deadline=3600)
+        waiter.wait_until(lambda: self.clock.now, lambda now: now >= 301, profile)
+
+        self.assertLessEqual(self.clock.now, 303)
+        tight = [s for s in self.clock.sleeps if s <= 2]
+        self.assertTrue(tight)
+
+    def test_timeout_reports_last_state(self):
+        profile = waiter.BackoffProfile(initial=1, maximum=4, deadline=20)
+        with self.assertRaises(waiter.WaiterTimeout) as ctx:
+            waiter.wait_until(lambda: {'status': 'creating'}, lambda r: False, profile,
+                              resource='DBInstance [my-db]', state=lambda r: r['status'])
+
+        self.assertEqual(ctx.exception.last_state, 'creating')
+        self.assertEqual(self.clock.now, 20)
+        self.assertIn('DBInstance [my-db]', str(ctx.exception))
+
+    def test_delay_stays_at_maximum_on_long_waits(self):
+        profile = waiter.BackoffProfile(initial=0.5, maximum=30, jitter=False)
+        self.assertEqual(profile.delay(5, 10), 16)
+        self.assertEqual(profile.delay(6, 10), 30)
+        self.assertEqual(profile.delay(5000, 86400), 30)
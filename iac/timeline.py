@@ -0,0 +1,193 @@
+"""
+Task timeline of a taskflow run: when every atom ran, waited, retried and reverted, the critical path through
+the executed graph, and a Chrome trace (chrome://tracing, ui.perfetto.dev) of the whole run.
+
+    engine = stack.load(store)
+    recorder = timeline.TimelineListener(engine)
+    recorder.register()
+    engine.run()
+    recorder.export('trace.json')
+"""
+import json
+
+from taskflow import states
+from taskflow.engines.action_engine import compiler
+from taskflow.listeners import base
+
+from iac import waiter
+
+_ATOM_STATES = [states.RUNNING, states.SUCCESS, states.FAILURE, states.REVERTING, states.REVERTED,
+                states.REVERT_FAILURE]
+
+
+class TimelineListener(base.Listener):
+    """
+    Records the intervals of every atom on a clock, in seconds since the flow started:
+    - run: an execution, retry when it is not the first one
+    - revert: a revert
+    - waiting: between the end of the last predecessor and the first execution
+    """
+
+    def __init__(self, engine, clock=None):
+        """
+        :param clock: object with monotonic(), defaults to waiter.clock
+        """
+        super(TimelineListener, self).__init__(engine, task_listen_for=_ATOM_STATES,
+                                               flow_listen_for=[states.RUNNING, states.SUCCESS, states.FAILURE,
+                                                                states.REVERTED],
+                                               retry_listen_for=_ATOM_STATES + [states.RETRYING])
+        self.clock = clock or waiter.clock
+        self.started = None
+        self.finished = None
+        # {atom name: [[kind, start, end]]}, end is None while the interval is open.
+        self.intervals = {}
+
+    def _now(self):
+        now = self.clock.monotonic()
+        if self.started is None:
+            self.started = now
+        return now - self.started
+
+    def _flow_receiver(self, state, details):
+        if state == states.RUNNING:
+            if self.started is None:
+                self.started = self.clock.monotonic()
+        else:
+            self.finished = self._now()
+
+    def _task_receiver(self, state, details):
+        self._record(details['task_name'], state)
+
+    def _retry_receiver(self, state, details):
+        self._record(details['retry_name'], state)
+
+    def _record(self, name, state):
+        now = self._now()
+        spans = self.intervals.setdefault(name, [])
+        if state == states.RUNNING:
+            runs = sum(1 for kind, _, _ in spans if kind in ('run', 'retry'))
+            spans.append(['retry' if runs else 'run', now, None])
+        elif state == states.REVERTING:
+            spans.append(['revert', now, None])
+        elif spans and spans[-1][2] is None:
+            spans[-1][2] = now
+
+    def runs(self):
+        """
+        :return: {atom name: (start of the first execution, end of the last one)}, finished atoms only
+        """
+        result = {}
+        for name, spans in self.intervals.items():
+            runs = [(s, e) for kind, s, e in spans if kind in ('run', 'retry') and e is not None]
+            if runs:
+                result[name] = (runs[0][0], runs[-1][1])
+        return result
+
+    def waiting(self):
+        """
+        :return: {atom name: seconds between its last predecessor finishing and its first execution}
+        """
+        graph = self._engine.compilation.execution_graph
+        runs = self.runs()
+        result = {}
+        for node in graph.nodes:
+            if node.name not in runs:
+                continue
+            ends = [runs[p.name][1] for p in atom_predecessors(graph, node) if p.name in runs]
+            ready = max(ends) if ends else 0.0
+            result[node.name] = max(0.0, runs[node.name][0] - ready)
+        return result
+
+    def critical_path(self):
+        """
+        :return: [(atom name, start, end)]
+        """
+        return critical_path(self._engine, self.runs())
+
+    def report(self):
+        """
+        :return: dict, JSON-serializable
+        """
+        waiting = self.waiting()
+        return {
+            'total': self.finished if self.finished is not None else self._now(),
+            'critical_path': [{'name': name, 'start': s, 'end': e, 'waiting': waiting.get(name, 0.0)}
+                              for name, s, e in self.critical_path()],
+            'atoms': {name: [tuple(span) for span in spans] for name, spans in sorted(self.intervals.items())},
+        }
+
+    def chrome_trace(self):
+        """
+        Gantt view of the run, one row per concurrent lane, the critical path in its own category.
+        :return: dict, Chrome trace event format
+        """
+        critical = {name for name, _, _ in self.critical_path()}
+        waiting = self.waiting()
+        runs = self.runs()
+        spans = []
+        for name, atom_spans in self.intervals.items():
+            for kind, s, e in atom_spans:
+                spans.append((s, e if e is not None else s, name, kind))
+            if waiting.get(name):
+                start = runs[name][0]
+                spans.append((start - waiting[name], start, name, 'waiting'))
+        events = []
+        lanes = []
+        for s, e, name, kind in sorted(spans, key=lambda span: (span[0], span[1])):
+            lane = next((i for i, end in enumerate(lanes) if end <= s), None)
+            if lane is None:
+                lane = len(lanes)
+                lanes.append(e)
+            lanes[lane] = e
+            events.append({
+                'name': name,
+                'cat': 'critical' if kind in ('run', 'retry') and name in critical else kind,
+                'ph': 'X',
+                'ts': int(s * 1e6),
+                'dur': int((e - s) * 1e6),
+                'pid': 1,
+                'tid': lane,
+                'args': {'kind': kind},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+
+def critical_path(engine, runs):
+    """
+    Walk back from the last atom to finish, always through the predecessor that finished last.
+    :param runs: {atom name: (start, end)}
+    :return: [(atom name, start, end)]
+    """
+    if not runs:
+        return []
+    graph = engine.compilation.execution_graph
+    atoms = {n.name: n for n in graph.nodes if n.name in runs}
+    name = max(runs, key=lambda n: runs[n][1])
+    path = []
+    while name is not None:
+        path.append((name,) + tuple(runs[name]))
+        preds = [p.name for p in atom_predecessors(graph, atoms[name]) if p.name in runs]
+        name = max(preds, key=lambda n: runs[n][1]) if preds else None
+    return path[::-1]
+
+
+def atom_predecessors(graph, node):
+    """
+    :return: set of the task and retry nodes the node waits on, through the flow nodes in between
+    """
+    found, todo, seen = set(), list(graph.predecessors(node)), set()
+    while todo:
+        n = todo.pop()
+        if n in seen:
+            continue
+        seen.add(n)
+        if graph.nodes[n]['kind'] in (compiler.TASK, compiler.RETRY):
+            found.add(n)
+        else:
+            todo.extend(graph.predecessors(n))
+    return found
@@ -1,19 +1,207 @@
-import time
+import contextlib
+import importlib
+import os
+import tempfile
+import threading
+
+from iac import waiter
+
+
+class LazyModule(object):
+    """
+    Module stand-in importing the real module on first attribute access.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_import(name):
+    """
+    Keep heavy dependencies (botocore, taskflow) off the import path of iac modules.
+    :param name: str, absolute module name
+    :return: LazyModule
+    """
+    return LazyModule(name)
+
+
+_task_context = threading.local()
+
+
+def current_task():
+    """
+    :return: str, name of the taskflow task executing in this thread, None outside of tasks
+    """
+    return getattr(_task_context, 'name', None)
+
+
+def iter_atoms(flow):
+    """
+    :return: generator of the atoms of the flow and of its subflows
+    """
+    for node, _ in flow.iter_nodes():
+        if hasattr(node, 'iter_nodes'):
+            yield from iter_atoms(node)
+        else:
+            yield node
+
+
+def paginate(client, operation, key, page_size=None, **params):
+    """
+    Stream the items of a paginated call, a page is only fetched once the items of the previous one are consumed,
+    so stopping early, like next() on the first match, saves the remaining calls.
+    :param client: botocore client
+    :param operation: str, like 'describe_subnets'
+    :param key: str, list of the items in each page, like 'Subnets'
+    :param page_size: int, items per call, the service default when None
+    :param params: call arguments, filters included
+    :return: generator of the items
+    """
+    if page_size is not None:
+        params['PaginationConfig'] = {'PageSize': page_size}
+    for page in client.get_paginator(operation).paginate(**params):
+        yield from page.get(key, [])
+
+
+def write_atomic(path, data):
+    """
+    Replace the file with data at once, readers never see a partial file. The file is readable by the owner only.
+    :param path: str
+    :param data: str
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # A file of its own per write, writers of several threads or processes do not share it.
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def current_region():
+    """
+    :return: str, region the current thread works in, None for the default region of iac.CONFIG
+    """
+    return getattr(_task_context, 'region', None)
+
+
+@contextlib.contextmanager
+def in_region(region):
+    """
+    Make the lazy clients used in the block resolve to the given region.
+    """
+    previous = current_region()
+    _task_context.region = region
+    try:
+        yield
+    finally:
+        _task_context.region = previous
+
+
+@contextlib.contextmanager
+def in_task(name, region=None):
+    """
+    Publish the name and the region of a task running outside of tag_tasks, like the coroutines of iac.aio, to the
+    calls made in the block.
+    """
+    previous = current_task(), current_region()
+    _task_context.name, _task_context.region = name, region
+    try:
+        yield
+    finally:
+        _task_context.name, _task_context.region = previous
+
+
+def tag_tasks(flow, slots=None, region=None, priorities=None):
+    """
+    Make the tasks of the flow publish their name through current_task while they execute or revert.
+    :param slots: threading.Semaphore, a slot is held by each task while it executes, see idle
+    :param region: str, region the tasks work in, see current_region
+    :param priorities: {atom name: priority}, passed to the acquire of slots, see schedule.PrioritySlots
+    :return: flow
+    """
+    for atom in iter_atoms(flow):
+        if hasattr(atom, 'pre_execute') and not getattr(atom, '_iac_tagged', False):
+            priority = priorities.get(atom.name, 0.0) if priorities is not None else None
+            atom.pre_execute = _entering(atom.name, slots, region, priority, atom.pre_execute)
+            atom.post_execute = _leaving(atom.post_execute)
+            atom.pre_revert = _entering(atom.name, slots, region, priority, atom.pre_revert)
+            atom.post_revert = _leaving(atom.post_revert)
+            atom._iac_tagged = True
+    return flow
+
+
+def _acquire(slots, priority):
+    if priority is None:
+        slots.acquire()
+    else:
+        slots.acquire(priority)
+
+
+def _entering(name, slots, region, priority, func):
+    def wrapper():
+        if slots is not None:
+            _acquire(slots, priority)
+        _task_context.name = name
+        _task_context.slots = slots
+        _task_context.region = region
+        _task_context.priority = priority
+        return func()
+
+    return wrapper
+
+
+def _leaving(func):
+    def wrapper():
+        slots = getattr(_task_context, 'slots', None)
+        _task_context.name = _task_context.slots = _task_context.region = _task_context.priority = None
+        if slots is not None:
+            slots.release()
+        return func()
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def idle():
+    """
+    Give the slot of the current task back while it blocks on a resource, so waiting tasks do not count against
+    the concurrency of tag_tasks.
+    """
+    slots = getattr(_task_context, 'slots', None)
+    if slots is None:
+        yield
+        return
+    _task_context.slots = None
+    slots.release()
+    try:
+        yield
+    finally:
+        _acquire(slots, getattr(_task_context, 'priority', None))
+        _task_context.slots = slots
 
 
 def blocked_until(executor, condition, sleep_time=10, timeout=300):
     """
-    Block until the condition return True
+    Block until the condition return True, polling on a fixed interval.
+    Prefer waiter.wait_until with a resource profile.
     :param executor: t function
     :param condition: t -> bool
     :param sleep_time: int
     :param timeout: int
     :return: t
     """
-    start = time.time()
-    while time.time() - start < timeout:
-        res = executor()
-        if condition(res):
-            return res
-        time.sleep(sleep_time)
-    raise Exception('BlockedUntil timeout.')
+    profile = waiter.BackoffProfile(initial=sleep_time, maximum=sleep_time, multiplier=1, deadline=timeout,
+                                    jitter=False)
+    with idle():
+        return waiter.wait_until(executor, condition, profile)
@@ -0,0 +1,129 @@
+import logging
+import math
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SystemClock(object):
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, condition, seconds):
+        """
+        Wait on a held threading.Condition for at most the given seconds, None waits until notified.
+        """
+        condition.wait(seconds)
+
+
+# Every waiter reads time through this object, replace it to run waits in scaled or virtual time.
+clock = SystemClock()
+
+
+class WaiterTimeout(Exception):
+
+    def __init__(self, resource, elapsed, last_state):
+        super(WaiterTimeout, self).__init__('Waiting for %s timed out after %.1fs, last state: [%s].'
+                                            % (resource, elapsed, last_state))
+        self.resource = resource
+        self.elapsed = elapsed
+        self.last_state = last_state
+
+
+class BackoffProfile(object):
+    """
+    Poll schedule of one resource type.
+
+    Delays grow exponentially with jitter from `initial` to `maximum`. Inside the window around `expected`
+    (the usual completion time in seconds) the delay drops to `tight`, so readiness is noticed seconds after it
+    happens. The last poll always happens at `deadline`.
+    """
+
+    def __init__(self, initial=1.0, maximum=30.0, multiplier=2.0, expected=None, window=0.3, tight=2.0,
+                 deadline=300.0, jitter=True):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.expected = expected
+        self.window = window
+        self.tight = tight
+        self.deadline = deadline
+        self.jitter = jitter
+
+    def delay(self, attempt, elapsed):
+        """
+        :param attempt: int, number of polls done so far
+        :param elapsed: float, seconds since the wait started
+        :return: float, seconds to sleep before the next poll
+        """
+        if self.expected is not None:
+            window_start = self.expected * (1 - self.window)
+            window_end = self.expected * (1 + self.window)
+            if window_start <= elapsed <= window_end:
+                return self._jittered(self.tight)
+        if self.multiplier > 1 and self.initial > 0:
+            # Past the attempt that reaches maximum the power only grows, a long wait would overflow it.
+            attempt = min(attempt, max(0, math.ceil(math.log(self.maximum / self.initial, self.multiplier))))
+        delay = min(self.maximum, self.initial * self.multiplier ** attempt)
+        delay = self._jittered(delay)
+        if self.expected is not None and elapsed < window_start:
+            delay = min(delay, window_start - elapsed)
+        return delay
+
+    def _jittered(self, delay):
+        if not self.jitter:
+            return delay
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+PROFILES = {
+    'default': BackoffProfile(),
+    'rds.db_instance': BackoffProfile(initial=5, maximum=30, expected=420, window=0.5, tight=5, deadline=3600),
+    'rds.db_instance_delete': BackoffProfile(initial=5, maximum=30, expected=300, window=0.5, tight=5, deadline=3600),
+    'elbv2.load_balancer': BackoffProfile(initial=2, maximum=15, expected=150, tight=3, deadline=900),
+    'ecs.service': BackoffProfile(initial=2, maximum=15, expected=60, window=0.5, tight=3, deadline=900),
+    'codedeploy.deployment': BackoffProfile(initial=5, maximum=30, expected=180, window=0.5, tight=5, deadline=3600),
+}
+
+
+def get_profile(profile):
+    """
+    :param profile: str | BackoffProfile
+    :return: BackoffProfile
+    """
+    if isinstance(profile, BackoffProfile):
+        return profile
+    return PROFILES.get(profile) or PROFILES['default']
+
+
+def wait_until(executor, condition, profile='default', resource=None, state=None, deadline=None):
+    """
+    Block until the condition return True
+    :param executor: () -> t
+    :param condition: t -> bool
+    :param profile: str | BackoffProfile
+    :param resource: str, name used in the timeout error
+    :param state: t -> object, extracts the state reported by the timeout error
+    :param deadline: float, seconds, overrides the deadline of the profile
+    :return: t
+    """
+    profile = get_profile(profile)
+    deadline = profile.deadline if deadline is None else deadline
+    start = clock.monotonic()
+    attempt = 0
+    while True:
+        res = executor()
+        if condition(res):
+            return res
+        elapsed = clock.monotonic() - start
+        if elapsed >= deadline:
+            raise WaiterTimeout(resource or 'resource', elapsed, state(res) if state else res)
+        delay = min(profile.delay(attempt, elapsed), deadline - elapsed)
+        logger.debug('Polling %s again in %.1fs.', resource or 'resource', delay)
+        clock.sleep(delay)
+        attempt += 1
@@ -1,15 +1,27 @@
-import taskflow
-from taskflow import engines, task
-from taskflow.patterns import unordered_flow, linear_flow, graph_flow
+import argparse
+import contextlib
+import json
+import os
+import sys
 
-from iac.ec2 import flow_load_default_vpc_info
-from iac.ecr import ECRRepositoryCreate
-from iac.ecs import ECSClusterCreate, ECSRegisterTaskDefinition, ECSServiceCreate
-from iac.elbv2 import create_target_group, create_load_balancer, create_listener
-from iac.rds import flow_create_db_instance, gen_db_uri
+from iac import inventory, logs, ratelimit, regions, schedule, settings, stack, state, telemetry, timeline
 
 if __name__ == '__main__':
-    db_store = {
+    parser = argparse.ArgumentParser(description='Provision or destroy the stack.')
+    parser.add_argument('--stacks',
+                        help='JSON file of {stack name: store overrides}, every stack is provisioned at once')
+    parser.add_argument('--regions', help='comma separated regions, the stacks are provisioned in every region at once')
+    parser.add_argument('--processes', action='store_true', help='one worker process per region')
+    parser.add_argument('--destroy', action='store_true', help='delete the resources of the stacks instead')
+    parser.add_argument('--asyncio', action='store_true', help='run the stacks as coroutines of one event loop')
+    args = parser.parse_args()
+    if args.processes and not args.regions:
+        parser.error('--processes needs --regions')
+    if args.asyncio and args.regions:
+        parser.error('--asyncio can not be combined with --regions')
+    logs.setup_logging()
+
+    store = {
         'DBInstanceIdentifier': 'my-db',
         'DBName': 'mypoc',
         'AllocatedStorage': 20,
@@ -17,52 +29,61 @@ if __name__ == '__main__':
         'MasterUserPassword': 'Admin123',
         'DBSubnetGroupName': 'my-db-subnet-group',
         'MultiAZ': False,
-    }
-    taskflow.engines.run(flow_create_db_instance(),
-                         executor='threaded',
-                         engine='serial',
-                         max_workers=1,
-                         store=db_store)
 
-    fargate_store = {
         'repositoryName': 'mypoc',
         'clusterName': 'my-cluster',
         'family': 'mypoc-task-def',
         'serviceName': 'mypoc-svc',
-        'DBInstanceIdentifier': 'my-db',
-        'MasterUserPassword': 'Admin123',
 
         'TargetGroupName': 'mypoc-target-group',
+        'GreenTargetGroupName': 'mypoc-target-group-green',
         'TargetGroupPort': 80,
         'LBName': 'mypoc-alb',
-    }
-    flow_fargate_init = unordered_flow.Flow('fargate_init')
-    flow_fargate_init.add(
-        flow_load_default_vpc_info(),
-        ECRRepositoryCreate('create_repo'),
-        ECSClusterCreate('create_cluster'),
-    )
-    flow_task_define = linear_flow.Flow('task_define').add(
-        task.FunctorTask(execute=gen_db_uri, provides='SQLALCHEMY_DATABASE_URI'),
-        ECSRegisterTaskDefinition('register_task_def'),
-    )
-    flow_create_alb = linear_flow.Flow('create_alb').add(
-        task.FunctorTask(execute=create_target_group, provides='TargetGroupArn'),
-        task.FunctorTask(execute=create_load_balancer, provides='LoadBalancerArn',
-                         rebind=['LBName', 'SubnetIds', 'VpcSecurityGroupIds']),
-        task.FunctorTask(execute=create_listener),
-    )
-
-    task_create_svc = ECSServiceCreate('create_service',
-                                       rebind=['clusterName', 'serviceName', 'family'])
-    flow_create_fargate = graph_flow.Flow('create_fargate').add(
-        flow_fargate_init,
-        flow_task_define,
-        flow_create_alb,
-        task_create_svc,
-    )
-    flow_create_fargate.link(flow_fargate_init, flow_create_alb)
-    flow_create_fargate.link(flow_create_alb, task_create_svc)
-    flow_create_fargate.link(flow_task_define, task_create_svc)
 
-    taskflow.engines.run(flow_create_fargate, engine='parallel', store=fargate_store)
+        'codeDeployApplication': 'mypoc',
+        'codeDeployDeploymentGroup': 'mypoc-deployment-group',
+    }
+    if settings.RATE_LIMITS != 'off':
+        ratelimit.install()
+    collector = telemetry.install() if settings.TELEMETRY_DIR else None
+    schedule.install()
+    if settings.STATE_FILE:
+        state.install()
+    if args.stacks or args.regions or args.asyncio:
+        stores = {'default': store}
+        if args.stacks:
+            with open(args.stacks, encoding='utf-8') as f:
+                stores = {name: dict(store, **overrides) for name, overrides in json.load(f).items()}
+        try:
+            if args.regions:
+                report = regions.provision_regions(args.regions.split(','), stores, processes=args.processes,
+                                                   destroy=args.destroy)
+                statuses = {'%s/%s' % (region, name): status
+                            for region, region_statuses in report['regions'].items()
+                            for name, status in region_statuses.items()}
+            elif args.asyncio:
+                statuses = stack.provision_all_async(stores, destroy=args.destroy)
+            else:
+                statuses = stack.provision_all(stores, destroy=args.destroy)
+        finally:
+            if collector is not None:
+                collector.export(settings.TELEMETRY_DIR)
+        for name, status in statuses.items():
+            print('%s\t%s\t%.0fs\t%s' % (name, status['state'], status['duration'], status.get('error', '')))
+        sys.exit(0 if all(status['state'] == 'SUCCESS' for status in statuses.values()) else 1)
+    elif collector is None:
+        if args.destroy:
+            stack.destroy(store)
+        else:
+            stack.provision(store)
+    else:
+        engine = stack.load(store, destroy=args.destroy)
+        recorder = timeline.TimelineListener(engine)
+        recorder.register()
+        try:
+            with inventory.snapshot(lazy=True) if not args.destroy else contextlib.nullcontext():
+                engine.run()
+        finally:
+            stack.save()
+            collector.export(settings.TELEMETRY_DIR)
+            recorder.export(os.path.join(settings.TELEMETRY_DIR, 'iac-trace.json'))